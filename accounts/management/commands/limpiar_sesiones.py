@@ -0,0 +1,56 @@
+"""
+Comando de gestión para eliminar las sesiones caducadas
+Ubicación: accounts/management/commands/limpiar_sesiones.py
+
+Alternativa a clearsessions que borra por lotes, en transacciones cortas, para no
+bloquear la base de datos (SQLite) mientras el sistema atiende peticiones.
+Pensado para ejecutarse desde cron.
+
+Uso:
+    python manage.py limpiar_sesiones
+    python manage.py limpiar_sesiones --lote 5000
+    python manage.py limpiar_sesiones --dry-run
+"""
+
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = 'Elimina por lotes las sesiones caducadas de la base de datos'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=1000,
+            help='Sesiones eliminadas por transacción',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Muestra cuántas sesiones se eliminarían sin hacer cambios',
+        )
+
+    def handle(self, *args, **options):
+        ahora = timezone.now()
+        caducadas = Session.objects.filter(expire_date__lt=ahora)
+
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING('Modo DRY-RUN: No se harán cambios\n'))
+            self.stdout.write(f'Se eliminarían {caducadas.count()} sesiones caducadas')
+            return
+
+        eliminadas = 0
+        while True:
+            with transaction.atomic():
+                claves = list(caducadas.values_list('session_key', flat=True)[:options['lote']])
+                if not claves:
+                    break
+                eliminadas += Session.objects.filter(session_key__in=claves).delete()[0]
+            self.stdout.write(f'⟳ {eliminadas} sesiones eliminadas...')
+
+        # Las copias en caché de cached_db caducan solas con su propio timeout
+        self.stdout.write(self.style.SUCCESS(f'✓ Sesiones caducadas eliminadas: {eliminadas}'))
@@ -0,0 +1,36 @@
+"""
+Comando de gestión para guardar la última actividad anotada de los usuarios
+Ubicación: accounts/management/commands/volcar_actividad.py
+
+ActividadUsuarioService anota la actividad en la caché compartida; este comando
+la guarda en la base de datos con un único bulk_update.
+Pensado para ejecutarse desde cron (por ejemplo, cada minuto).
+
+Uso:
+    python manage.py volcar_actividad
+    python manage.py volcar_actividad --dry-run
+"""
+
+from django.core.management.base import BaseCommand
+
+from accounts.services import ActividadUsuarioService
+
+
+class Command(BaseCommand):
+    help = 'Guarda en la base de datos la última actividad anotada de los usuarios'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Muestra cuántas actividades se guardarían sin hacer cambios',
+        )
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING('Modo DRY-RUN: No se harán cambios\n'))
+            self.stdout.write(f'Se guardaría la actividad de {ActividadUsuarioService.total_pendientes()} usuarios')
+            return
+
+        guardadas = ActividadUsuarioService.volcar()
+        self.stdout.write(self.style.SUCCESS(f'✓ Actividad guardada de {guardadas} usuarios'))
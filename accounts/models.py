@@ -402,6 +402,10 @@ class Usuario(AbstractUser):
         self.es_vip = False
         self.save(update_fields=['es_vip', 'updated_at'])
 
+    def get_reclamos_duplicados(self):
+        """Tickets del cliente marcados como posibles reclamos duplicados (revisión de fraude)"""
+        return self.tickets_creados.filter(posible_duplicado=True)
+
     def aplicar_restriccion(self, motivo, admin_user):
         """Aplica restricciones al cliente por fraude o abuso (solo Administrador)"""
         if not admin_user.puede_aplicar_restricciones_cliente():
@@ -521,9 +525,16 @@ class Usuario(AbstractUser):
         return True
 
     def actualizar_ultima_actividad(self):
-        """Actualiza el timestamp de última actividad del usuario"""
-        self.ultima_actividad = timezone.now()
-        self.save(update_fields=['ultima_actividad'])
+        """
+        Actualiza el timestamp de última actividad del usuario. La escritura se limita
+        y agrupa con ActividadUsuarioService: la base de datos se actualiza en el
+        siguiente volcado (volcar_actividad), no en el momento
+        """
+        from .services import ActividadUsuarioService
+
+        ahora = timezone.now()
+        ActividadUsuarioService.registrar(self.pk, ahora)
+        self.ultima_actividad = ahora
 
     def get_dashboard_url(self):
         """Retorna la URL del dashboard correspondiente según el rol del usuario"""
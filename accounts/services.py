@@ -0,0 +1,120 @@
+"""
+Servicios para la gestión de usuarios
+"""
+
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError
+from django.utils import timezone
+
+from core.cache import INTERVALO_ESPERA, TTL_CANDADO
+from .models import Usuario
+
+logger = logging.getLogger(__name__)
+
+
+class ActividadUsuarioService:
+    """
+    Registro de la última actividad de los usuarios sin una escritura por petición.
+    Como mucho se anota una actividad por usuario cada ACTIVITY_THROTTLE_MINUTES
+    (limitado con cache.add) y la anotación queda en la caché compartida, no en la
+    memoria del proceso: un worker terminado a la fuerza no pierde nada. El comando
+    volcar_actividad las guarda todas con un único bulk_update por intervalo
+    """
+
+    CLAVE_INDICE = 'actividad:indice'
+    CLAVE_CANDADO = 'actividad:indice:candado'
+    # Vida de una anotación si el volcado deja de ejecutarse
+    TTL_PENDIENTE = 24 * 60 * 60
+
+    @staticmethod
+    def _clave_pendiente(usuario_id):
+        return f'actividad:pendiente:{usuario_id}'
+
+    @classmethod
+    def _bloquear_indice(cls):
+        """Candado del índice de pendientes; retorna False si no se obtiene a tiempo"""
+        limite = time.monotonic() + settings.TICKET_SETTINGS.get('CACHE_LOCK_WAIT_SECONDS', 2)
+        while not cache.add(cls.CLAVE_CANDADO, 1, timeout=TTL_CANDADO):
+            if time.monotonic() >= limite:
+                return False
+            time.sleep(INTERVALO_ESPERA)
+        return True
+
+    @classmethod
+    def _anotar(cls, momentos):
+        """
+        Guarda en la caché las actividades {usuario_id: momento} y las apunta en el índice
+        Si ya había una anotación pendiente prevalece la más reciente
+        Retorna False si no se obtuvo el candado
+        """
+        if not cls._bloquear_indice():
+            return False
+        try:
+            claves = {cls._clave_pendiente(usuario_id): momento for usuario_id, momento in momentos.items()}
+            existentes = cache.get_many([*claves, cls.CLAVE_INDICE])
+            indice = existentes.pop(cls.CLAVE_INDICE, set()) | set(momentos)
+            for clave, momento in existentes.items():
+                claves[clave] = max(claves[clave], momento)
+            cache.set_many({**claves, cls.CLAVE_INDICE: indice}, timeout=cls.TTL_PENDIENTE)
+        finally:
+            cache.delete(cls.CLAVE_CANDADO)
+        return True
+
+    @classmethod
+    def registrar(cls, usuario_id, momento=None):
+        """
+        Anota la actividad del usuario. Retorna False si ya se anotó una dentro
+        del intervalo de limitación y esta se descarta
+        """
+        if not settings.TICKET_SETTINGS.get('ACTIVITY_TRACKING_ENABLED', True):
+            return False
+        # El id llega como UUID (modelo) o como texto (sesión)
+        usuario_id = str(usuario_id)
+        limite = settings.TICKET_SETTINGS.get('ACTIVITY_THROTTLE_MINUTES', 5) * 60
+        if not cache.add(f'actividad:{usuario_id}', 1, timeout=limite):
+            return False
+
+        momento = momento or timezone.now()
+        if not cls._anotar({usuario_id: momento}):
+            # Sin candado no se puede apuntar en el índice: se escribe directamente
+            Usuario.objects.filter(id=usuario_id).update(ultima_actividad=momento)
+        return True
+
+    @classmethod
+    def total_pendientes(cls):
+        """Número de usuarios con actividad anotada y aún no guardada"""
+        return len(cache.get(cls.CLAVE_INDICE) or ())
+
+    @classmethod
+    def volcar(cls):
+        """Guarda las actividades pendientes con un solo bulk_update. Retorna cuántas guardó"""
+        if not cls._bloquear_indice():
+            logger.warning("Índice de actividad bloqueado; el volcado queda para el siguiente intervalo")
+            return 0
+        try:
+            usuarios = {cls._clave_pendiente(usuario_id): usuario_id for usuario_id in cache.get(cls.CLAVE_INDICE) or ()}
+            momentos = cache.get_many(list(usuarios))
+            cache.delete_many([cls.CLAVE_INDICE, *usuarios])
+        finally:
+            cache.delete(cls.CLAVE_CANDADO)
+
+        pendientes = {usuarios[clave]: momento for clave, momento in momentos.items()}
+        if not pendientes:
+            return 0
+
+        try:
+            # bulk_update no dispara señales: la última actividad no invalida ninguna caché
+            Usuario.objects.bulk_update(
+                [Usuario(id=usuario_id, ultima_actividad=momento) for usuario_id, momento in pendientes.items()],
+                ['ultima_actividad'],
+                batch_size=500,
+            )
+        except DatabaseError:
+            logger.exception(f"Error al guardar la actividad de {len(pendientes)} usuarios; se reintentará")
+            cls._anotar(pendientes)
+            return 0
+        return len(pendientes)
@@ -1,3 +1,80 @@
-from django.test import TestCase
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
 
-# Create your tests here.
\ No newline at end of file
+from .models import Usuario
+from .services import ActividadUsuarioService
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class ActividadUsuarioTest(TestCase):
+    """La actividad se anota en la caché y se guarda con un UPDATE por volcado"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuarios = [
+            Usuario.objects.create_user(f'actividad_{numero}', password='x', rol='cliente')
+            for numero in range(5)
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def test_registrar_no_escribe_en_la_base_de_datos(self):
+        with self.assertNumQueries(0):
+            self.assertTrue(ActividadUsuarioService.registrar(self.usuarios[0].id))
+            # Dentro del intervalo de limitación se descarta
+            self.assertFalse(ActividadUsuarioService.registrar(self.usuarios[0].id))
+        self.assertEqual(ActividadUsuarioService.total_pendientes(), 1)
+
+    def test_un_update_por_volcado(self):
+        for usuario in self.usuarios:
+            ActividadUsuarioService.registrar(usuario.id)
+
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertEqual(ActividadUsuarioService.volcar(), len(self.usuarios))
+        updates = [consulta for consulta in consultas if consulta['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 1)
+
+        self.assertFalse(Usuario.objects.filter(ultima_actividad__isnull=True).exists())
+        self.assertEqual(ActividadUsuarioService.total_pendientes(), 0)
+        with self.assertNumQueries(0):
+            self.assertEqual(ActividadUsuarioService.volcar(), 0)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class DashboardDatosTest(TestCase):
+    """Los indicadores del dashboard se sirven en JSON desde una vista asíncrona"""
+
+    @classmethod
+    def setUpTestData(cls):
+        from tickets.models import Categoria, Ticket
+
+        cls.cliente = Usuario.objects.create_user('cliente_dashboard', password='x', rol='cliente')
+        categoria = Categoria.objects.create(nombre='Categoría dashboard')
+        for numero, estado in enumerate(('abierto', 'resuelto', 'cerrado')):
+            Ticket.objects.create(
+                numero_factura=f'F-DASH-{numero}', asunto='Asunto', descripcion='Descripción',
+                categoria=categoria, cliente=cls.cliente, estado=estado,
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    async def test_indicadores_del_cliente(self):
+        await self.async_client.aforce_login(self.cliente)
+
+        respuesta = await self.async_client.get(reverse('accounts:dashboard_datos'))
+
+        datos = respuesta.json()
+        self.assertEqual(datos['rol'], 'cliente')
+        self.assertEqual(datos['total_tickets'], 3)
+        self.assertEqual(datos['tickets_resueltos'], 1)
+        self.assertIn('generado', datos)
+
+    async def test_requiere_sesion(self):
+        respuesta = await self.async_client.get(reverse('accounts:dashboard_datos'))
+
+        self.assertEqual(respuesta.status_code, 302)
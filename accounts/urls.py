@@ -16,6 +16,7 @@ urlpatterns = [
     path('dashboard/tecnico/', views.dashboard_tecnico, name='dashboard_tecnico'),
     path('dashboard/empleado/', views.dashboard_empleado, name='dashboard_empleado'),  # Legacy
     path('dashboard/superadmin/', views.dashboard_superadmin, name='dashboard_superadmin'),
+    path('dashboard/datos/', views.dashboard_datos, name='dashboard_datos'),
 
     # Gestión de perfil
     path('perfil/', views.perfil_usuario, name='perfil_usuario'),
@@ -1,3 +1,4 @@
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import authenticate, login, logout
@@ -10,7 +11,7 @@ from django.utils import timezone
 from .models import Usuario
 from .forms import RegistroUsuarioForm, PerfilUsuarioForm, LoginForm
 from tickets.models import Ticket
-from tickets.services import MetricasService, BalanceadorCarga
+from tickets.services import DashboardService
 
 
 def registro_usuario(request):
@@ -74,16 +75,10 @@ def dashboard_cliente(request):
         messages.error(request, 'No tiene permisos para acceder a esta página.')
         return redirect('accounts:iniciar_sesion')
 
-    # Obtener estadísticas del cliente
-    tickets_cliente = Ticket.objects.del_cliente(request.user)
-
+    # Indicadores en caché; el listado de recientes se consulta siempre (usa índice)
     context = {
-        'total_tickets': tickets_cliente.count(),
-        'tickets_abiertos': tickets_cliente.filter(estado__in=['abierto', 'en_revision', 'aceptado', 'en_reparacion']).count(),
-        'tickets_resueltos': tickets_cliente.filter(estado='resuelto').count(),
-        'tickets_cerrados': tickets_cliente.filter(estado='cerrado').count(),
-        'tickets_recientes': tickets_cliente.order_by('-created_at')[:5],
-        'tickets_vencidos': sum(1 for ticket in tickets_cliente if ticket.esta_vencido()),
+        **DashboardService.indicadores_cliente(request.user),
+        'tickets_recientes': Ticket.objects.del_cliente(request.user).order_by('-created_at')[:5],
     }
 
     return render(request, 'accounts/dashboard_cliente.html', context)
@@ -96,18 +91,15 @@ def dashboard_soporte(request):
         messages.error(request, 'No tiene permisos para acceder a esta página.')
         return redirect('accounts:iniciar_sesion')
 
-    # Obtener estadísticas del agente
+    # Indicadores personales en caché por agente; sin asignar y carga del equipo,
+    # compartidos por todos los agentes
     tickets_asignados = Ticket.objects.asignados_a(request.user)
-    tickets_sin_asignar = Ticket.objects.sin_asignar()
 
     context = {
-        'tickets_asignados': tickets_asignados.count(),
-        'tickets_activos': tickets_asignados.exclude(estado__in=['cerrado', 'rechazado']).count(),
-        'tickets_sin_asignar': tickets_sin_asignar.count(),
-        'tickets_vencidos': sum(1 for ticket in tickets_asignados if ticket.esta_vencido()),
+        **DashboardService.indicadores_soporte(request.user),
+        **DashboardService.resumen_equipo(),
         'tickets_recientes': tickets_asignados.order_by('-created_at')[:10],
         'tickets_urgentes': tickets_asignados.filter(prioridad__in=['alta', 'critica']).order_by('-created_at')[:5],
-        'estadisticas_carga': BalanceadorCarga.obtener_estadisticas_carga(),
     }
 
     return render(request, 'accounts/dashboard_soporte.html', context)
@@ -120,12 +112,12 @@ def dashboard_tecnico(request):
         messages.error(request, 'No tiene permisos para acceder a esta página.')
         return redirect('accounts:iniciar_sesion')
 
-    # Obtener estadísticas del técnico
     tickets_tecnicos = Ticket.objects.filter(tecnico=request.user)
+    indicadores = DashboardService.indicadores_tecnico(request.user)
 
     context = {
-        'tickets_en_reparacion': tickets_tecnicos.filter(estado='en_reparacion').count(),
-        'tickets_completados': tickets_tecnicos.filter(estado='resuelto').count(),
+        'tickets_en_reparacion': indicadores['tickets_en_reparacion'],
+        'tickets_completados': indicadores['tickets_completados'],
         'tickets_recientes': tickets_tecnicos.order_by('-updated_at')[:10],
         'tickets_urgentes': tickets_tecnicos.filter(
             prioridad__in=['alta', 'critica'],
@@ -156,22 +148,31 @@ def dashboard_superadmin(request):
     if not request.user.es_superadmin():
         return HttpResponseForbidden("No tienes permisos para acceder a esta página.")
 
-    from tickets.models import Ticket
-
     context = {
+        **DashboardService.resumen_global(),
         'usuario': request.user,
-        'total_usuarios': Usuario.objects.count(),
-        'total_clientes': Usuario.objects.clientes().count(),
-        'total_empleados': Usuario.objects.empleados().count(),
-        'total_tickets': Ticket.objects.count(),
-        'tickets_abiertos': Ticket.objects.abiertos().count(),
-        'tickets_resueltos': Ticket.objects.resueltos().count(),
-        'tickets_recientes': Ticket.objects.all().order_by('-created_at')[:5],
+        'tickets_recientes': Ticket.objects.select_related('cliente', 'agente').order_by('-created_at')[:5],
     }
 
     return render(request, 'accounts/dashboard_superadmin.html', context)
 
 
+@login_required
+async def dashboard_datos(request):
+    """
+    Indicadores del dashboard del usuario en JSON, para refrescos periódicos
+    Comparte con las vistas HTML la caché de DashboardService
+    """
+    usuario = await request.auser()
+    datos = await sync_to_async(DashboardService.indicadores)(usuario)
+    if datos is None:
+        return JsonResponse({'error': 'Rol sin dashboard'}, status=403)
+
+    datos['rol'] = usuario.rol
+    datos['generado'] = timezone.now().isoformat()
+    return JsonResponse(datos)
+
+
 @login_required
 def perfil_usuario(request):
     """Vista para ver el perfil del usuario"""
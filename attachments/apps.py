@@ -4,4 +4,7 @@ from django.apps import AppConfig
 class AttachmentsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'attachments'
-    verbose_name = 'Gestión de Adjuntos'
\ No newline at end of file
+    verbose_name = 'Gestión de Adjuntos'
+
+    def ready(self):
+        import attachments.signals
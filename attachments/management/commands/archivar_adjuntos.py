@@ -0,0 +1,79 @@
+"""
+Comando de gestión para mover al almacenamiento frío los adjuntos de tickets cerrados
+Ubicación: attachments/management/commands/archivar_adjuntos.py
+
+Uso:
+    python manage.py archivar_adjuntos
+    python manage.py archivar_adjuntos --dias 30
+    python manage.py archivar_adjuntos --dry-run
+"""
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Sum
+
+from attachments.models import Adjunto
+from attachments.services import AlmacenamientoFrioService
+from core.utils import formatear_tamaño_archivo
+
+
+class Command(BaseCommand):
+    help = 'Comprime al almacenamiento frío los adjuntos de tickets cerrados hace más de N días'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dias',
+            type=int,
+            default=settings.TICKET_SETTINGS.get('COLD_STORAGE_AFTER_DAYS', 90),
+            help='Días desde el cierre del ticket',
+        )
+        parser.add_argument(
+            '--limite',
+            type=int,
+            default=0,
+            help='Número máximo de adjuntos a archivar (0 = sin límite)',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Muestra qué se archivaría sin hacer cambios',
+        )
+
+    def handle(self, *args, **options):
+        adjuntos = AlmacenamientoFrioService.adjuntos_archivables(options['dias']).order_by('created_at')
+        if options['limite']:
+            adjuntos = adjuntos[:options['limite']]
+
+        if options['dry_run']:
+            total = adjuntos.aggregate(bytes=Sum('tamaño_bytes'))['bytes'] or 0
+            self.stdout.write(self.style.WARNING('Modo DRY-RUN: No se harán cambios\n'))
+            self.stdout.write(
+                f'Se archivarían {adjuntos.count()} adjuntos ({formatear_tamaño_archivo(total)})'
+            )
+            return
+
+        # Se materializan los IDs para no escribir en la tabla mientras se recorre
+        ids = list(adjuntos.values_list('id', flat=True))
+        archivados = 0
+        bytes_liberados = 0
+        errores = 0
+
+        for inicio in range(0, len(ids), 500):
+            for adjunto in Adjunto.objects.filter(id__in=ids[inicio:inicio + 500]):
+                try:
+                    if AlmacenamientoFrioService.archivar(adjunto):
+                        archivados += 1
+                        bytes_liberados += adjunto.tamaño_bytes
+                except Exception as e:
+                    errores += 1
+                    self.stdout.write(
+                        self.style.ERROR(f'✗ Error: {adjunto.nombre_original[:50]} - {str(e)}')
+                    )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'✓ Adjuntos archivados: {archivados} ({formatear_tamaño_archivo(bytes_liberados)} liberados en local)'
+            )
+        )
+        if errores:
+            self.stdout.write(self.style.ERROR(f'  Errores: {errores}'))
@@ -0,0 +1,59 @@
+"""
+Comando de gestión para generar miniaturas y vistas previas de imágenes adjuntas
+Ubicación: attachments/management/commands/generar_derivados.py
+
+Uso:
+    python manage.py generar_derivados
+    python manage.py generar_derivados --regenerar
+    python manage.py generar_derivados --limite 500
+"""
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from attachments.models import Adjunto
+from attachments.services import DerivadosImagenService
+
+
+class Command(BaseCommand):
+    help = 'Genera los derivados WebP (miniatura y vista previa) de las imágenes adjuntas pendientes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--regenerar',
+            action='store_true',
+            help='Regenera los derivados aunque ya existan',
+        )
+        parser.add_argument(
+            '--limite',
+            type=int,
+            default=0,
+            help='Número máximo de adjuntos a procesar (0 = sin límite)',
+        )
+
+    def handle(self, *args, **options):
+        # Los originales archivados no están en disco local
+        adjuntos = Adjunto.objects.imagenes().filter(almacenamiento='caliente').order_by('created_at')
+        if not options['regenerar']:
+            adjuntos = adjuntos.filter(
+                Q(miniatura__isnull=True) | Q(miniatura='') |
+                Q(vista_previa__isnull=True) | Q(vista_previa='')
+            )
+        if options['limite']:
+            adjuntos = adjuntos[:options['limite']]
+
+        generados = 0
+        errores = 0
+
+        for adjunto in adjuntos.iterator(chunk_size=200):
+            try:
+                if DerivadosImagenService.generar_derivados(adjunto):
+                    generados += 1
+            except Exception as e:
+                errores += 1
+                self.stdout.write(
+                    self.style.ERROR(f'✗ Error: {adjunto.nombre_original[:50]} - {str(e)}')
+                )
+
+        self.stdout.write(self.style.SUCCESS(f'✓ Derivados generados: {generados}'))
+        if errores:
+            self.stdout.write(self.style.ERROR(f'  Errores: {errores}'))
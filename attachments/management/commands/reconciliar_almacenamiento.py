@@ -0,0 +1,236 @@
+"""
+Comando de gestión para reconciliar el almacenamiento de adjuntos con la base de datos
+Ubicación: attachments/management/commands/reconciliar_almacenamiento.py
+
+Uso:
+    python manage.py reconciliar_almacenamiento
+    python manage.py reconciliar_almacenamiento --dry-run
+    python manage.py reconciliar_almacenamiento --gracia-minutos 120
+"""
+
+import os
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+from django.utils import timezone
+
+from attachments.models import Adjunto, AdjuntoMultiple, CargaFragmentada
+from attachments.services import ReconciliacionAlmacenamientoService
+from core.utils import formatear_tamaño_archivo
+
+
+class Command(BaseCommand):
+    help = 'Elimina archivos sin registro, registros sin archivo y datos temporales de subidas caducados'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Muestra qué se eliminaría sin hacer cambios',
+        )
+        parser.add_argument(
+            '--gracia-minutos',
+            type=int,
+            default=settings.TICKET_SETTINGS.get('ORPHAN_GRACE_MINUTES', 60),
+            help='Antigüedad mínima de un archivo sin registro para eliminarlo (subidas en curso)',
+        )
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=500,
+            help='Tamaño de lote para las actualizaciones en la base de datos',
+        )
+
+    def handle(self, *args, **options):
+        self.dry_run = options['dry_run']
+        self.lote = options['lote']
+
+        if not os.path.isdir(settings.MEDIA_ROOT):
+            # Un volumen sin montar haría parecer que faltan todos los archivos
+            raise CommandError(f'MEDIA_ROOT no existe: {settings.MEDIA_ROOT}')
+
+        if self.dry_run:
+            self.stdout.write(self.style.WARNING('Modo DRY-RUN: No se harán cambios\n'))
+
+        self.stdout.write('Comparando almacenamiento y base de datos...\n')
+        resumen = self.reconciliar_archivos(options['gracia_minutos'])
+        resumen['multiples'] = self.purgar_adjuntos_multiples()
+        resumen['cargas'], resumen['temporales'] = self.purgar_cargas_fragmentadas(options['gracia_minutos'])
+
+        if not self.dry_run:
+            self.eliminar_directorios_vacios()
+
+        # Resumen
+        self.stdout.write('\n' + '='*60)
+        self.stdout.write('RESUMEN:')
+        self.stdout.write(
+            f"  Archivos sin registro: {resumen['huerfanos']} "
+            f"({formatear_tamaño_archivo(resumen['bytes_huerfanos'])})"
+        )
+        if resumen['recientes']:
+            self.stdout.write(f"  Omitidos por recientes: {resumen['recientes']}")
+        self.stdout.write(f"  Adjuntos sin archivo: {resumen['sin_archivo']}")
+        self.stdout.write(f"  Derivados sin archivo: {resumen['derivados']}")
+        self.stdout.write(f"  Registros de adjuntos múltiples caducados: {resumen['multiples']}")
+        self.stdout.write(
+            f"  Cargas fragmentadas caducadas: {resumen['cargas']} "
+            f"(temporales huérfanos: {resumen['temporales']})"
+        )
+        self.stdout.write('='*60 + '\n')
+
+        if self.dry_run:
+            self.stdout.write(self.style.WARNING('Ejecuta sin --dry-run para aplicar los cambios'))
+        else:
+            self.stdout.write(self.style.SUCCESS('✓ Reconciliación completada'))
+
+    def reconciliar_archivos(self, gracia_minutos):
+        """Recorre almacenamiento y tabla Adjunto a la vez y corrige las diferencias"""
+        limite_mtime = time.time() - gracia_minutos * 60
+        resumen = {'huerfanos': 0, 'bytes_huerfanos': 0, 'recientes': 0, 'sin_archivo': 0, 'derivados': 0}
+        archivos_vistos = 0
+        sin_archivo = []
+        derivados = {campo: [] for campo in ReconciliacionAlmacenamientoService.CAMPOS[1:]}
+
+        try:
+            for tipo, ruta, detalle in ReconciliacionAlmacenamientoService.comparar():
+                if tipo == 'huerfano':
+                    archivos_vistos += 1
+                    try:
+                        estado = os.stat(detalle)
+                    except FileNotFoundError:
+                        continue
+                    # La ingesta guarda el archivo antes de crear el registro
+                    if estado.st_mtime > limite_mtime:
+                        resumen['recientes'] += 1
+                        continue
+
+                    self.stdout.write(self.style.WARNING(f'⟳ Sin registro: {ruta}'))
+                    resumen['huerfanos'] += 1
+                    resumen['bytes_huerfanos'] += estado.st_size
+                    if not self.dry_run:
+                        try:
+                            os.remove(detalle)
+                        except OSError as e:
+                            self.stdout.write(self.style.ERROR(f'✗ Error: {ruta} - {str(e)}'))
+                else:
+                    campo, adjunto_id = detalle
+                    self.stdout.write(self.style.WARNING(f'⟳ Sin archivo ({campo}): {ruta}'))
+                    if campo == 'archivo':
+                        sin_archivo.append(adjunto_id)
+                    else:
+                        derivados[campo].append(adjunto_id)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        total_registros = Adjunto.objects.count()
+        if sin_archivo and len(sin_archivo) == total_registros and not archivos_vistos:
+            raise CommandError('No se encontró ningún archivo de adjuntos; se aborta para no vaciar la tabla')
+
+        resumen['sin_archivo'] = len(sin_archivo)
+        resumen['derivados'] = sum(len(ids) for ids in derivados.values())
+
+        if not self.dry_run:
+            # Los derivados se pueden regenerar: solo se limpia la referencia
+            for campo, ids in derivados.items():
+                for inicio in range(0, len(ids), self.lote):
+                    Adjunto.objects.filter(id__in=ids[inicio:inicio + self.lote]).update(**{campo: None})
+
+            # Adjunto.delete elimina también los derivados que sigan en disco
+            for inicio in range(0, len(sin_archivo), self.lote):
+                for adjunto in Adjunto.objects.filter(id__in=sin_archivo[inicio:inicio + self.lote]):
+                    adjunto.delete()
+
+        return resumen
+
+    def purgar_adjuntos_multiples(self):
+        """Elimina los registros auxiliares de sesiones caducadas o demasiado antiguos"""
+        ahora = timezone.now()
+        horas = settings.TICKET_SETTINGS.get('MULTI_UPLOAD_EXPIRY_HOURS', 24)
+        sesiones_activas = Session.objects.filter(expire_date__gt=ahora).values('session_key')
+
+        caducados = AdjuntoMultiple.objects.filter(
+            Q(created_at__lt=ahora - timedelta(hours=horas)) | ~Q(session_key__in=sesiones_activas)
+        )
+        if self.dry_run:
+            return caducados.count()
+        return caducados.delete()[0]
+
+    def purgar_cargas_fragmentadas(self, gracia_minutos):
+        """Cancela las cargas abandonadas y elimina los temporales que no pertenecen a ninguna carga pendiente"""
+        horas = settings.TICKET_SETTINGS.get('CHUNKED_UPLOAD_EXPIRY_HOURS', 48)
+        # Una carga 'procesando' sin cambios en horas es una finalización interrumpida
+        caducadas = CargaFragmentada.objects.filter(
+            estado__in=('pendiente', 'procesando'),
+            updated_at__lt=timezone.now() - timedelta(hours=horas),
+        )
+        total_cargas = caducadas.count()
+        if not self.dry_run and total_cargas:
+            caducadas.update(estado='cancelada', updated_at=timezone.now())
+
+        directorio = settings.TICKET_SETTINGS.get('CHUNKED_UPLOAD_DIR')
+        if not directorio or not os.path.isdir(directorio):
+            return total_cargas, 0
+
+        limite_mtime = time.time() - gracia_minutos * 60
+        temporales = {}
+        eliminados = 0
+        with os.scandir(directorio) as entradas:
+            for entrada in entradas:
+                if entrada.name.endswith('.part') and entrada.stat().st_mtime <= limite_mtime:
+                    temporales[entrada.name[:-len('.part')]] = entrada.path
+                if len(temporales) >= self.lote:
+                    eliminados += self._eliminar_temporales_sin_carga(temporales)
+                    temporales = {}
+        eliminados += self._eliminar_temporales_sin_carga(temporales)
+
+        return total_cargas, eliminados
+
+    def _eliminar_temporales_sin_carga(self, temporales):
+        """Elimina los temporales del lote cuya carga ya no está pendiente ni finalizándose"""
+        if not temporales:
+            return 0
+
+        # Los nombres que no sean UUID no corresponden a ninguna carga
+        pendientes = set()
+        ids_validos = []
+        for carga_id in temporales:
+            try:
+                CargaFragmentada._meta.pk.to_python(carga_id)
+                ids_validos.append(carga_id)
+            except ValidationError:
+                pass
+        if ids_validos:
+            pendientes = {
+                str(carga_id) for carga_id in CargaFragmentada.objects.filter(
+                    id__in=ids_validos, estado__in=('pendiente', 'procesando')
+                ).values_list('id', flat=True)
+            }
+
+        eliminados = 0
+        for carga_id, ruta in temporales.items():
+            if carga_id in pendientes:
+                continue
+            eliminados += 1
+            self.stdout.write(self.style.WARNING(f'⟳ Temporal sin carga pendiente: {os.path.basename(ruta)}'))
+            if not self.dry_run:
+                try:
+                    os.remove(ruta)
+                except OSError:
+                    pass
+        return eliminados
+
+    def eliminar_directorios_vacios(self):
+        """Elimina los directorios de adjuntos que quedaron vacíos"""
+        for directorio in ReconciliacionAlmacenamientoService.DIRECTORIOS:
+            raiz = os.path.join(settings.MEDIA_ROOT, directorio)
+            for ruta, _, _ in os.walk(raiz, topdown=False):
+                if ruta != raiz and not os.listdir(ruta):
+                    try:
+                        os.rmdir(ruta)
+                    except OSError:
+                        pass
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-19 11:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attachments', '0002_adjuntomultiple_alter_adjunto_options_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='adjunto',
+            name='miniatura',
+            field=models.FileField(blank=True, editable=False, max_length=255, null=True, upload_to='', verbose_name='Miniatura'),
+        ),
+        migrations.AddField(
+            model_name='adjunto',
+            name='vista_previa',
+            field=models.FileField(blank=True, editable=False, max_length=255, null=True, upload_to='', verbose_name='Vista Previa'),
+        ),
+    ]
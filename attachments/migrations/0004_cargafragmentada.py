@@ -0,0 +1,42 @@
+# Generated by Django 5.2.5 on 2026-10-19 11:09
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attachments', '0003_adjunto_derivados_imagen'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CargaFragmentada',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('objeto_id', models.UUIDField(verbose_name='ID del Objeto')),
+                ('tipo_objeto', models.CharField(choices=[('ticket', 'Ticket'), ('comentario', 'Comentario')], max_length=20, verbose_name='Tipo de Objeto')),
+                ('nombre_original', models.CharField(max_length=255, verbose_name='Nombre Original')),
+                ('descripcion', models.TextField(blank=True, null=True, verbose_name='Descripción')),
+                ('es_publico', models.BooleanField(default=True, verbose_name='Es Público')),
+                ('tamaño_total', models.PositiveBigIntegerField(verbose_name='Tamaño Total')),
+                ('bytes_recibidos', models.PositiveBigIntegerField(default=0, verbose_name='Bytes Recibidos')),
+                ('checksum_esperado', models.CharField(blank=True, max_length=64, null=True, verbose_name='Checksum SHA-256 Esperado')),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('completada', 'Completada'), ('cancelada', 'Cancelada')], default='pendiente', max_length=20, verbose_name='Estado')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de Creación')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Fecha de Actualización')),
+                ('adjunto', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='attachments.adjunto', verbose_name='Adjunto Generado')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cargas_fragmentadas', to=settings.AUTH_USER_MODEL, verbose_name='Usuario')),
+            ],
+            options={
+                'verbose_name': 'Carga Fragmentada',
+                'verbose_name_plural': 'Cargas Fragmentadas',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['estado', 'updated_at'], name='attachments_estado_42564a_idx')],
+            },
+        ),
+    ]
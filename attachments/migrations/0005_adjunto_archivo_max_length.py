@@ -0,0 +1,19 @@
+# Generated by Django 5.2.5 on 2026-10-19 11:10
+
+import attachments.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attachments', '0004_cargafragmentada'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='adjunto',
+            name='archivo',
+            field=models.FileField(max_length=255, upload_to=attachments.models.upload_to_ticket, validators=[attachments.models.validar_extension_archivo], verbose_name='Archivo'),
+        ),
+    ]
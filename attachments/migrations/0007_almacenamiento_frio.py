@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-19 11:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attachments', '0006_validar_contenido_archivo'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='adjunto',
+            name='almacenamiento',
+            field=models.CharField(choices=[('caliente', 'Local'), ('frio', 'Archivo comprimido')], default='caliente', max_length=10, verbose_name='Almacenamiento'),
+        ),
+        migrations.AddField(
+            model_name='adjunto',
+            name='archivado_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Fecha de Archivado'),
+        ),
+    ]
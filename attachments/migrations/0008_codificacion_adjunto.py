@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-19 11:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attachments', '0007_almacenamiento_frio'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='adjunto',
+            name='codificacion',
+            field=models.CharField(blank=True, choices=[('', 'Sin comprimir'), ('gzip', 'gzip')], default='', max_length=10, verbose_name='Codificación'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-19 12:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attachments', '0008_codificacion_adjunto'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='cargafragmentada',
+            name='estado',
+            field=models.CharField(choices=[('pendiente', 'Pendiente'), ('procesando', 'Procesando'), ('completada', 'Completada'), ('cancelada', 'Cancelada')], default='pendiente', max_length=20, verbose_name='Estado'),
+        ),
+    ]
@@ -6,14 +6,17 @@ from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes.fields import GenericForeignKey
 from core.utils import (
     generar_nombre_unico,
-    obtener_tipo_mime,
-    es_imagen,
-    es_video,
-    es_documento,
+    inspeccionar_archivo,
+    categoria_por_extension,
     validar_tamaño_archivo
 )
 from django.core.exceptions import ValidationError  # ← AGREGAR ESTA LÍNEA
 
+# Archivos de relleno que comparten muchos adjuntos (datos sintéticos): no se borran
+# con el adjunto, no se archivan y la reconciliación no los revisa
+DIRECTORIO_COMPARTIDO = 'sinteticos'
+
+
 def upload_to_ticket(instance, filename):
     """
     Función para determinar la ruta de subida de archivos
@@ -25,6 +28,11 @@ def upload_to_ticket(instance, filename):
     if instance.tipo_objeto == 'ticket':
         return f'tickets/{instance.objeto_id}/{nombre_unico}'
     elif instance.tipo_objeto == 'comentario':
+        # Si quien crea el adjunto ya conoce el ticket, evitar la consulta
+        ticket_id = getattr(instance, '_ticket_id', None)
+        if ticket_id:
+            return f'tickets/{ticket_id}/comentarios/{instance.objeto_id}/{nombre_unico}'
+
         # Obtener el ticket del comentario para organizar mejor
         try:
             from tickets.models import Comentario
@@ -60,6 +68,22 @@ def validar_extension_archivo(archivo):
         )
 
 
+def validar_contenido_archivo(archivo):
+    """
+    Valida que el contenido real del archivo (según su firma) sea admisible
+    y coherente con la categoría que indica su extensión
+    """
+    inspeccion = inspeccionar_archivo(archivo)
+
+    if inspeccion.es_prohibido:
+        raise ValidationError('El contenido del archivo no corresponde a un tipo permitido.')
+
+    if not inspeccion.coincide_con_extension and inspeccion.categoria != categoria_por_extension(inspeccion.extension):
+        raise ValidationError(
+            f'El contenido del archivo ({inspeccion.tipo_mime}) no coincide con su extensión {inspeccion.extension}.'
+        )
+
+
 class AdjuntoManager(models.Manager):
     """Manager personalizado para el modelo Adjunto"""
 
@@ -106,6 +130,16 @@ class Adjunto(models.Model):
         ('otro', 'Otro'),
     ]
 
+    ALMACENAMIENTOS = [
+        ('caliente', 'Local'),
+        ('frio', 'Archivo comprimido'),
+    ]
+
+    CODIFICACIONES = [
+        ('', 'Sin comprimir'),
+        ('gzip', 'gzip'),
+    ]
+
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
 
     # Relación genérica para asociar con tickets o comentarios
@@ -114,8 +148,9 @@ class Adjunto(models.Model):
 
     # Información del archivo
     archivo = models.FileField(
+        max_length=255,
         upload_to=upload_to_ticket,
-        validators=[validar_extension_archivo],
+        validators=[validar_extension_archivo, validar_contenido_archivo],
         verbose_name='Archivo'
     )
     nombre_original = models.CharField(max_length=255, verbose_name='Nombre Original')
@@ -124,6 +159,27 @@ class Adjunto(models.Model):
     tamaño_bytes = models.PositiveIntegerField(verbose_name='Tamaño en Bytes')
     checksum = models.CharField(max_length=64, blank=True, null=True, verbose_name='Checksum SHA-256')
 
+    # Derivados WebP generados en segundo plano para imágenes
+    miniatura = models.FileField(max_length=255, blank=True, null=True, editable=False, verbose_name='Miniatura')
+    vista_previa = models.FileField(max_length=255, blank=True, null=True, editable=False, verbose_name='Vista Previa')
+
+    # Nivel de almacenamiento: local o archivo comprimido para tickets cerrados
+    almacenamiento = models.CharField(
+        max_length=10,
+        choices=ALMACENAMIENTOS,
+        default='caliente',
+        verbose_name='Almacenamiento'
+    )
+    archivado_at = models.DateTimeField(blank=True, null=True, verbose_name='Fecha de Archivado')
+    # Compresión en reposo del original; el checksum y el tamaño son los del original
+    codificacion = models.CharField(
+        max_length=10,
+        choices=CODIFICACIONES,
+        blank=True,
+        default='',
+        verbose_name='Codificación'
+    )
+
     # Metadatos adicionales
     descripcion = models.TextField(blank=True, null=True, verbose_name='Descripción')
     es_publico = models.BooleanField(default=True, verbose_name='Es Público')
@@ -160,6 +216,28 @@ class Adjunto(models.Model):
         return f"{self.nombre_original} ({self.get_tipo_archivo_display()})"
 
     def save(self, *args, **kwargs):
+        # Un adjunto archivado no tiene el original en disco local; sus metadatos ya están calculados
+        if self.archivo and not self.esta_archivado():
+            self.completar_metadatos()
+
+        # Los archivos nuevos de tipos comprimibles se guardan comprimidos
+        comprimido = False
+        if self.archivo and not getattr(self.archivo, '_committed', True) and not self.codificacion:
+            from .services import CompresionAdjuntosService
+            comprimido = CompresionAdjuntosService.comprimir_adjunto(self)
+
+        super().save(*args, **kwargs)
+
+        # El temporal comprimido ya está en el almacenamiento
+        if comprimido:
+            self.archivo.close()
+
+    def completar_metadatos(self, inspeccion=None):
+        """
+        Calcula nombre original, tipo, MIME y tamaño a partir del archivo
+        Args:
+            inspeccion: Resultado previo de inspeccionar_archivo para no volver a leer el contenido
+        """
         if self.archivo:
             # Obtener el nombre del archivo de forma segura
             if hasattr(self.archivo, 'name'):
@@ -174,30 +252,29 @@ class Adjunto(models.Model):
             if not self.nombre_original:
                 self.nombre_original = nombre_archivo
 
-            # Determinar tipo de archivo basado en la extensión
-            if es_imagen(nombre_archivo):
-                self.tipo_archivo = 'imagen'
-            elif es_video(nombre_archivo):
-                self.tipo_archivo = 'video'
-            elif es_documento(nombre_archivo):
-                self.tipo_archivo = 'documento'
-            else:
-                self.tipo_archivo = 'otro'
-
-            # Obtener tipo MIME
-            self.tipo_mime = obtener_tipo_mime(nombre_archivo)
-
-            # Guardar tamaño del archivo solo si está disponible
-            if hasattr(self.archivo, 'size') and self.archivo.size:
-                self.tamaño_bytes = self.archivo.size
-            elif hasattr(self.archivo, 'file') and hasattr(self.archivo.file, 'size'):
-                self.tamaño_bytes = self.archivo.file.size
-            elif not self.tamaño_bytes and hasattr(self.archivo, 'path'):
-                # Si el archivo ya está guardado, obtener el tamaño del sistema de archivos
-                try:
-                    self.tamaño_bytes = os.path.getsize(self.archivo.path)
-                except:
-                    self.tamaño_bytes = 0
+            # Determinar tipo de archivo y MIME por la firma del contenido;
+            # los archivos ya guardados solo se clasifican por extensión
+            if inspeccion is None:
+                inspeccion = inspeccionar_archivo(
+                    self.archivo,
+                    leer_contenido=not getattr(self.archivo, '_committed', True),
+                )
+            self.tipo_archivo = inspeccion.categoria
+            self.tipo_mime = inspeccion.tipo_mime
+
+            # Guardar tamaño del archivo solo si está disponible; en los archivos
+            # comprimidos en reposo se conserva el tamaño del original
+            if not self.codificacion:
+                if hasattr(self.archivo, 'size') and self.archivo.size:
+                    self.tamaño_bytes = self.archivo.size
+                elif hasattr(self.archivo, 'file') and hasattr(self.archivo.file, 'size'):
+                    self.tamaño_bytes = self.archivo.file.size
+                elif not self.tamaño_bytes and hasattr(self.archivo, 'path'):
+                    # Si el archivo ya está guardado, obtener el tamaño del sistema de archivos
+                    try:
+                        self.tamaño_bytes = os.path.getsize(self.archivo.path)
+                    except:
+                        self.tamaño_bytes = 0
 
             # Validar tamaño del archivo solo si es un archivo nuevo
             if hasattr(self.archivo, 'size'):
@@ -206,18 +283,48 @@ class Adjunto(models.Model):
                 except ValidationError as e:
                     raise ValidationError(f"Error en el archivo {self.nombre_original}: {str(e)}")
 
-        super().save(*args, **kwargs)
-
     def delete(self, *args, **kwargs):
-        """Elimina el archivo físico al eliminar el registro"""
-        if self.archivo:
+        """Elimina el archivo físico y sus derivados al eliminar el registro"""
+        originales = () if self.tiene_archivo_compartido() else (self.archivo,)
+        rutas = [campo.path for campo in (*originales, self.miniatura, self.vista_previa) if campo]
+        if originales and self.archivo:
+            rutas.append(self.get_ruta_fria())
+        for ruta in rutas:
             try:
-                if os.path.isfile(self.archivo.path):
-                    os.remove(self.archivo.path)
+                if os.path.isfile(ruta):
+                    os.remove(ruta)
             except:
                 pass  # Si no se puede eliminar el archivo, continuar
         super().delete(*args, **kwargs)
 
+    def get_ticket_id(self):
+        """ID del ticket al que pertenece el adjunto (directamente o por su comentario)"""
+        ticket_id = getattr(self, '_ticket_id', None)
+        if ticket_id:
+            return ticket_id
+        if self.tipo_objeto == 'ticket':
+            return self.objeto_id
+        if self.tipo_objeto == 'comentario':
+            from tickets.models import Comentario
+            return Comentario.objects.filter(id=self.objeto_id).values_list('ticket_id', flat=True).first()
+        return None
+
+    def tiene_archivo_compartido(self):
+        """Indica si el original es un archivo de relleno compartido con otros adjuntos"""
+        return bool(self.archivo) and self.archivo.name.startswith(f'{DIRECTORIO_COMPARTIDO}/')
+
+    def esta_archivado(self):
+        """Indica si el original está en el almacenamiento frío"""
+        return self.almacenamiento == 'frio'
+
+    def get_ruta_fria(self):
+        """Ruta del original comprimido en el almacenamiento frío"""
+        from django.conf import settings
+        return os.path.join(
+            settings.TICKET_SETTINGS['COLD_STORAGE_DIR'],
+            *self.archivo.name.split('/')
+        ) + '.gz'
+
     def get_tamaño_legible(self):
         """Retorna el tamaño del archivo en formato legible"""
         from core.utils import formatear_tamaño_archivo
@@ -310,6 +417,32 @@ class Adjunto(models.Model):
         """Retorna la URL para descargar el adjunto"""
         return f"/attachments/descargar/{self.id}/"
 
+    def version_derivado(self, variante):
+        """
+        Hash de contenido del derivado, tomado de su nombre ({base}.{variante}.{hash}.webp)
+        None si no está generado o es de antes de versionar los nombres
+        """
+        derivado = getattr(self, variante)
+        if not derivado:
+            return None
+        partes = os.path.basename(derivado.name).split('.')
+        if len(partes) >= 4 and partes[-3] == variante:
+            return partes[-2]
+        return None
+
+    def _url_derivado(self, variante):
+        url = f"/attachments/derivado/{self.id}/{variante}/"
+        version = self.version_derivado(variante)
+        return f"{url}?v={version}" if version else url
+
+    def get_url_miniatura(self):
+        """Retorna la URL versionada de la miniatura WebP del adjunto"""
+        return self._url_derivado('miniatura')
+
+    def get_url_vista_previa(self):
+        """Retorna la URL versionada de la vista previa WebP del adjunto"""
+        return self._url_derivado('vista_previa')
+
     def get_url_eliminacion(self):
         """Retorna la URL para eliminar el adjunto"""
         return f"/attachments/eliminar/{self.id}/"
@@ -353,4 +486,69 @@ class AdjuntoMultiple(models.Model):
         ordering = ['orden', 'created_at']
 
     def __str__(self):
-        return f"Adjunto múltiple: {self.adjunto.nombre_original}"
\ No newline at end of file
+        return f"Adjunto múltiple: {self.adjunto.nombre_original}"
+
+class CargaFragmentada(models.Model):
+    """
+    Sesión de subida fragmentada y reanudable
+    Los fragmentos se escriben directamente a un archivo temporal en disco
+    y al finalizar se genera el Adjunto correspondiente
+    """
+
+    ESTADOS = [
+        ('pendiente', 'Pendiente'),
+        ('procesando', 'Procesando'),
+        ('completada', 'Completada'),
+        ('cancelada', 'Cancelada'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    usuario = models.ForeignKey(
+        'accounts.Usuario',
+        on_delete=models.CASCADE,
+        verbose_name='Usuario',
+        related_name='cargas_fragmentadas'
+    )
+
+    # Destino del adjunto final
+    objeto_id = models.UUIDField(verbose_name='ID del Objeto')
+    tipo_objeto = models.CharField(max_length=20, choices=Adjunto.TIPOS_OBJETO, verbose_name='Tipo de Objeto')
+
+    nombre_original = models.CharField(max_length=255, verbose_name='Nombre Original')
+    descripcion = models.TextField(blank=True, null=True, verbose_name='Descripción')
+    es_publico = models.BooleanField(default=True, verbose_name='Es Público')
+    tamaño_total = models.PositiveBigIntegerField(verbose_name='Tamaño Total')
+    bytes_recibidos = models.PositiveBigIntegerField(default=0, verbose_name='Bytes Recibidos')
+    checksum_esperado = models.CharField(max_length=64, blank=True, null=True, verbose_name='Checksum SHA-256 Esperado')
+
+    estado = models.CharField(max_length=20, choices=ESTADOS, default='pendiente', verbose_name='Estado')
+    adjunto = models.ForeignKey(
+        Adjunto,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        verbose_name='Adjunto Generado'
+    )
+
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Fecha de Creación')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Fecha de Actualización')
+
+    class Meta:
+        verbose_name = 'Carga Fragmentada'
+        verbose_name_plural = 'Cargas Fragmentadas'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['estado', 'updated_at']),
+        ]
+
+    def __str__(self):
+        return f"Carga de {self.nombre_original} ({self.bytes_recibidos}/{self.tamaño_total} bytes)"
+
+    def get_ruta_temporal(self):
+        """Retorna la ruta del archivo temporal donde se acumulan los fragmentos"""
+        from django.conf import settings
+        return os.path.join(settings.TICKET_SETTINGS['CHUNKED_UPLOAD_DIR'], f'{self.id}.part')
+
+    def esta_completa(self):
+        """Verifica si ya se recibieron todos los bytes"""
+        return self.bytes_recibidos >= self.tamaño_total
@@ -0,0 +1,874 @@
+"""
+Servicios para la gestión de adjuntos
+Incluye la generación de derivados de imagen (miniaturas y vistas previas WebP),
+las subidas fragmentadas reanudables, la ingesta masiva de adjuntos,
+la reconciliación del almacenamiento con la base de datos,
+el almacenamiento frío de adjuntos de tickets cerrados,
+la compresión en reposo de los tipos comprimibles
+y la descarga de todos los adjuntos de un ticket en un ZIP generado al vuelo
+"""
+
+import gzip
+import hashlib
+import heapq
+import logging
+import os
+import shutil
+import tempfile
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from io import BytesIO, RawIOBase
+from operator import itemgetter
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile, File
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F, Q
+from django.db.models.functions import Collate
+from django.utils import timezone
+
+from core.utils import calcular_checksum, inspeccionar_archivo, validar_tamaño_archivo
+from .models import (
+    DIRECTORIO_COMPARTIDO, Adjunto, CargaFragmentada, validar_contenido_archivo, validar_extension_archivo,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class DerivadosImagenService:
+    """Servicio para generar miniaturas y vistas previas WebP de las imágenes adjuntas"""
+
+    VARIANTES_POR_DEFECTO = {
+        'miniatura': (320, 320),
+        'vista_previa': (1280, 1280),
+    }
+
+    # Formatos que Pillow no puede rasterizar (se sirven siempre como original)
+    EXTENSIONES_NO_RASTER = ('.svg',)
+
+    _executor = None
+
+    @staticmethod
+    def obtener_variantes():
+        """Retorna las variantes configuradas con su tamaño máximo"""
+        return settings.TICKET_SETTINGS.get('IMAGE_DERIVATIVES', DerivadosImagenService.VARIANTES_POR_DEFECTO)
+
+    @staticmethod
+    def requiere_derivados(adjunto):
+        """Verifica si el adjunto es una imagen rasterizable"""
+        extension = os.path.splitext(adjunto.archivo.name or '')[1].lower()
+        return adjunto.tipo_archivo == 'imagen' and extension not in DerivadosImagenService.EXTENSIONES_NO_RASTER
+
+    @classmethod
+    def encolar(cls, adjunto_id):
+        """
+        Programa la generación de derivados para después del commit,
+        en un hilo de fondo para no bloquear la petición
+        """
+        if not settings.TICKET_SETTINGS.get('IMAGE_DERIVATIVES_ASYNC', True):
+            return
+
+        transaction.on_commit(lambda: cls._obtener_executor().submit(cls._procesar_en_segundo_plano, adjunto_id))
+
+    @classmethod
+    def _obtener_executor(cls):
+        if cls._executor is None:
+            cls._executor = ThreadPoolExecutor(
+                max_workers=settings.TICKET_SETTINGS.get('IMAGE_DERIVATIVES_WORKERS', 2),
+                thread_name_prefix='derivados',
+            )
+        return cls._executor
+
+    @staticmethod
+    def _procesar_en_segundo_plano(adjunto_id):
+        close_old_connections()
+        try:
+            adjunto = Adjunto.objects.filter(id=adjunto_id).first()
+            if adjunto:
+                DerivadosImagenService.generar_derivados(adjunto)
+        except Exception:
+            logger.exception(f"Error al generar derivados del adjunto {adjunto_id}")
+        finally:
+            close_old_connections()
+
+    @staticmethod
+    def generar_derivados(adjunto):
+        """
+        Genera las variantes WebP del adjunto junto al archivo original
+        Retorna True si se generaron derivados
+        """
+        from PIL import Image, ImageOps
+
+        if not adjunto.archivo or not DerivadosImagenService.requiere_derivados(adjunto):
+            return False
+
+        calidad = settings.TICKET_SETTINGS.get('IMAGE_DERIVATIVES_QUALITY', 80)
+        storage = adjunto.archivo.storage
+        base = os.path.splitext(adjunto.archivo.name)[0]
+        actualizados = {}
+
+        with adjunto.archivo.open('rb') as original:
+            with Image.open(original) as imagen:
+                imagen = ImageOps.exif_transpose(imagen)
+                modo = 'RGBA' if imagen.mode in ('RGBA', 'LA', 'P') else 'RGB'
+                imagen = imagen.convert(modo)
+
+                for variante, tamaño in DerivadosImagenService.obtener_variantes().items():
+                    copia = imagen.copy()
+                    copia.thumbnail(tamaño, Image.Resampling.LANCZOS)
+
+                    buffer = BytesIO()
+                    copia.save(buffer, format='WEBP', quality=calidad, method=4)
+
+                    # El hash del contenido va en el nombre: regenerar produce otro nombre,
+                    # otro ETag y otra URL versionada, así el navegador no sirve la copia anterior
+                    contenido = buffer.getvalue()
+                    version = hashlib.sha256(contenido).hexdigest()[:12]
+                    destino = f"{base}.{variante}.{version}.webp"
+                    anterior = getattr(adjunto, variante)
+                    for nombre_previo in {destino, anterior.name if anterior else None} - {None}:
+                        storage.delete(nombre_previo)
+                    nombre = storage.save(destino, ContentFile(contenido))
+                    actualizados[variante] = nombre
+
+        # update() evita disparar señales y reescribir el resto de columnas
+        Adjunto.objects.filter(id=adjunto.id).update(**actualizados)
+        for variante, nombre in actualizados.items():
+            setattr(adjunto, variante, nombre)
+
+        logger.info(f"Derivados generados para el adjunto {adjunto.id}: {', '.join(actualizados)}")
+        return True
+
+
+class ConflictoOffset(Exception):
+    """El offset del fragmento no coincide con los bytes ya recibidos"""
+
+    def __init__(self, bytes_recibidos):
+        self.bytes_recibidos = bytes_recibidos
+        super().__init__(f'Offset esperado: {bytes_recibidos}')
+
+
+class CargaFragmentadaService:
+    """
+    Servicio para subidas fragmentadas y reanudables (iniciar / agregar fragmento / finalizar / cancelar)
+    Cada fragmento se transmite a disco por bloques: el worker nunca retiene más de un fragmento
+    """
+
+    TAMAÑO_BLOQUE = 64 * 1024
+
+    @staticmethod
+    def tamaño_fragmento():
+        """Retorna el tamaño máximo de fragmento en bytes"""
+        return settings.TICKET_SETTINGS.get('CHUNKED_UPLOAD_CHUNK_MB', 5) * 1024 * 1024
+
+    @staticmethod
+    def iniciar(usuario, tipo_objeto, objeto_id, nombre_original, tamaño_total,
+                checksum=None, descripcion=None, es_publico=True):
+        """
+        Crea la sesión de carga y su archivo temporal vacío
+        Lanza ValidationError si el archivo no es admisible
+        """
+        validar_extension_archivo(File(None, name=nombre_original))
+
+        tamaño_maximo = settings.TICKET_SETTINGS.get('CHUNKED_UPLOAD_MAX_SIZE_MB', 500) * 1024 * 1024
+        if tamaño_total <= 0 or tamaño_total > tamaño_maximo:
+            raise ValidationError(f'El tamaño del archivo debe estar entre 1 byte y {tamaño_maximo // (1024 * 1024)}MB')
+
+        carga = CargaFragmentada.objects.create(
+            usuario=usuario,
+            tipo_objeto=tipo_objeto,
+            objeto_id=objeto_id,
+            nombre_original=os.path.basename(nombre_original),
+            tamaño_total=tamaño_total,
+            checksum_esperado=(checksum or '').lower() or None,
+            descripcion=descripcion,
+            es_publico=es_publico,
+        )
+
+        os.makedirs(os.path.dirname(carga.get_ruta_temporal()), exist_ok=True)
+        open(carga.get_ruta_temporal(), 'wb').close()
+        return carga
+
+    @staticmethod
+    def agregar_fragmento(carga_id, offset, flujo, longitud, checksum_fragmento=None):
+        """
+        Escribe un fragmento en la posición indicada leyendo el flujo por bloques
+        El offset debe coincidir con los bytes ya recibidos; así un reintento
+        tras un corte reanuda desde el último fragmento confirmado
+        Retorna la carga actualizada
+        """
+        if longitud <= 0 or longitud > CargaFragmentadaService.tamaño_fragmento():
+            raise ValidationError('Tamaño de fragmento inválido')
+
+        with transaction.atomic():
+            carga = CargaFragmentada.objects.select_for_update().get(id=carga_id)
+
+            if carga.estado != 'pendiente':
+                raise ValidationError('La carga ya no admite fragmentos')
+            if offset != carga.bytes_recibidos:
+                raise ConflictoOffset(carga.bytes_recibidos)
+            if offset + longitud > carga.tamaño_total:
+                raise ValidationError('El fragmento excede el tamaño declarado')
+
+            hash_fragmento = hashlib.sha256()
+            escritos = 0
+            with open(carga.get_ruta_temporal(), 'r+b') as destino:
+                # Descartar restos de un fragmento anterior interrumpido
+                destino.seek(offset)
+                destino.truncate()
+                while escritos < longitud:
+                    bloque = flujo.read(min(CargaFragmentadaService.TAMAÑO_BLOQUE, longitud - escritos))
+                    if not bloque:
+                        break
+                    destino.write(bloque)
+                    hash_fragmento.update(bloque)
+                    escritos += len(bloque)
+
+            if escritos != longitud:
+                raise ValidationError('El fragmento llegó incompleto')
+            if checksum_fragmento and hash_fragmento.hexdigest() != checksum_fragmento.lower():
+                raise ValidationError('El checksum del fragmento no coincide')
+
+            carga.bytes_recibidos = offset + escritos
+            carga.save(update_fields=['bytes_recibidos', 'updated_at'])
+
+        return carga
+
+    @staticmethod
+    def finalizar(carga_id):
+        """
+        Verifica la integridad del archivo completo y genera el Adjunto
+        La fila solo se bloquea para reservar la carga (estado 'procesando'); el checksum
+        y el paso al almacenamiento se hacen fuera de la transacción
+        Retorna el Adjunto creado
+        """
+        with transaction.atomic():
+            carga = CargaFragmentada.objects.select_for_update().get(id=carga_id)
+
+            if carga.estado == 'completada' and carga.adjunto_id:
+                return carga.adjunto
+            if carga.estado == 'procesando':
+                raise ValidationError('La carga ya se está finalizando')
+            if carga.estado != 'pendiente':
+                raise ValidationError('La carga fue cancelada')
+            if not carga.esta_completa():
+                raise ValidationError(f'Faltan bytes por recibir ({carga.bytes_recibidos}/{carga.tamaño_total})')
+
+            carga.estado = 'procesando'
+            carga.save(update_fields=['estado', 'updated_at'])
+
+        ruta = carga.get_ruta_temporal()
+        try:
+            adjunto = CargaFragmentadaService._crear_adjunto(carga, ruta)
+        except Exception:
+            # Si el temporal ya se movió al almacenamiento la carga no puede reintentarse
+            carga.estado = 'pendiente' if os.path.exists(ruta) else 'cancelada'
+            carga.save(update_fields=['estado', 'updated_at'])
+            raise
+
+        carga.estado = 'completada'
+        carga.adjunto = adjunto
+        carga.save(update_fields=['estado', 'adjunto', 'updated_at'])
+
+        try:
+            os.remove(ruta)
+        except OSError:
+            pass
+
+        logger.info(f"Carga fragmentada {carga.id} finalizada como adjunto {adjunto.id}")
+        return adjunto
+
+    @staticmethod
+    def _crear_adjunto(carga, ruta):
+        """
+        Calcula el checksum del temporal en una única lectura y crea el Adjunto
+        En almacenamiento en disco el temporal se mueve, no se vuelve a copiar
+        """
+        with open(ruta, 'rb') as temporal:
+            archivo = _TemporalCarga(temporal, name=carga.nombre_original)
+            checksum = calcular_checksum(archivo)
+            if carga.checksum_esperado and carga.checksum_esperado != checksum:
+                raise ValidationError('El checksum del archivo no coincide')
+
+            validar_contenido_archivo(archivo)
+            adjunto = Adjunto(
+                objeto_id=carga.objeto_id,
+                tipo_objeto=carga.tipo_objeto,
+                archivo=archivo,
+                nombre_original=carga.nombre_original,
+                descripcion=carga.descripcion,
+                es_publico=carga.es_publico,
+                checksum=checksum,
+                subido_por=carga.usuario,
+            )
+            adjunto.save()
+        return adjunto
+
+    @staticmethod
+    def cancelar(carga_id):
+        """
+        Cancela una carga pendiente y elimina su archivo temporal
+        Lanza ValidationError si la carga ya se está finalizando o se completó
+        Retorna la carga actualizada
+        """
+        with transaction.atomic():
+            carga = CargaFragmentada.objects.select_for_update().get(id=carga_id)
+
+            if carga.estado in ('procesando', 'completada'):
+                raise ValidationError('La carga ya no puede cancelarse')
+            if carga.estado == 'pendiente':
+                carga.estado = 'cancelada'
+                carga.save(update_fields=['estado', 'updated_at'])
+
+        try:
+            os.remove(carga.get_ruta_temporal())
+        except OSError:
+            pass
+        return carga
+
+
+class _TemporalCarga(File):
+    """
+    Temporal de una carga fragmentada: FileSystemStorage mueve los archivos que
+    exponen temporary_file_path en lugar de copiarlos por bloques
+    """
+
+    def temporary_file_path(self):
+        return self.file.name
+
+
+class IngestaAdjuntosService:
+    """
+    Servicio para registrar varios adjuntos a la vez
+    Valida todos los archivos, los escribe al almacenamiento e inserta adjuntos y
+    eventos de auditoría con bulk_create en una sola transacción, de modo que
+    el número de consultas no depende de la cantidad de archivos
+    """
+
+    @staticmethod
+    def validar_archivos(archivos):
+        """
+        Separa los archivos válidos de los inválidos
+        Retorna (validos, errores) donde errores es una lista de (nombre, mensaje)
+        """
+        max_size_mb = settings.TICKET_SETTINGS.get('MAX_FILE_SIZE_MB', 25)
+        validos = []
+        errores = []
+
+        for archivo in archivos:
+            if not archivo or not getattr(archivo, 'name', None):
+                continue
+            try:
+                validar_extension_archivo(archivo)
+                validar_contenido_archivo(archivo)
+                if not validar_tamaño_archivo(archivo, max_size_mb):
+                    raise ValidationError(f'El archivo excede el tamaño máximo de {max_size_mb}MB')
+                validos.append(archivo)
+            except ValidationError as e:
+                errores.append((archivo.name, '; '.join(e.messages)))
+
+        return validos, errores
+
+    @staticmethod
+    def ingerir(archivos, tipo_objeto, objeto_id, ticket_id, usuario, es_publico=True, descripcion=None):
+        """
+        Registra los archivos como adjuntos del ticket o comentario indicado
+        Retorna (adjuntos_creados, errores)
+        """
+        from audit.models import Evento
+        from tickets.services import ContadoresTicketService
+
+        validos, errores = IngestaAdjuntosService.validar_archivos(archivos)
+        if not validos:
+            return [], errores
+
+        campo = Adjunto._meta.get_field('archivo')
+        adjuntos = []
+        guardados = []
+
+        try:
+            for archivo in validos:
+                adjunto = Adjunto(
+                    objeto_id=objeto_id,
+                    tipo_objeto=tipo_objeto,
+                    nombre_original=archivo.name,
+                    descripcion=descripcion,
+                    es_publico=es_publico,
+                    subido_por=usuario,
+                    checksum=calcular_checksum(archivo),
+                )
+                # Evita que upload_to consulte el comentario para ubicar el ticket
+                adjunto._ticket_id = ticket_id
+
+                # La inspección del contenido quedó en caché durante la validación
+                inspeccion = inspeccionar_archivo(archivo)
+                contenido = archivo
+                if CompresionAdjuntosService.debe_comprimirse(inspeccion.tipo_mime, archivo.size):
+                    comprimido = CompresionAdjuntosService.comprimir(archivo)
+                    if comprimido is not None:
+                        contenido = comprimido
+                        adjunto.codificacion = 'gzip'
+                        adjunto.tamaño_bytes = archivo.size
+
+                nombre = campo.storage.save(
+                    campo.generate_filename(adjunto, archivo.name),
+                    contenido,
+                    max_length=campo.max_length,
+                )
+                if contenido is not archivo:
+                    contenido.close()
+                guardados.append(nombre)
+                adjunto.archivo = nombre
+                adjunto.completar_metadatos(inspeccion)
+                adjuntos.append(adjunto)
+
+            with transaction.atomic():
+                Adjunto.objects.bulk_create(adjuntos)
+                Evento.objects.bulk_create([
+                    Evento(
+                        ticket_id=ticket_id,
+                        tipo='adjunto',
+                        descripcion=f'Archivo adjuntado: {adjunto.nombre_original}',
+                        datos_json={
+                            'tipo_archivo': adjunto.tipo_archivo,
+                            'tamaño_bytes': adjunto.tamaño_bytes,
+                            'tipo_objeto': adjunto.tipo_objeto,
+                        },
+                        actor=usuario,
+                    )
+                    for adjunto in adjuntos
+                ])
+                # bulk_create no dispara post_save: contador del ticket en una sola sentencia
+                ContadoresTicketService.registrar_adjuntos(ticket_id, len(adjuntos))
+        except Exception:
+            # No dejar archivos huérfanos si falla la inserción
+            for nombre in guardados:
+                campo.storage.delete(nombre)
+            raise
+
+        # bulk_create no dispara post_save: programar los derivados aquí
+        for adjunto in adjuntos:
+            if DerivadosImagenService.requiere_derivados(adjunto):
+                DerivadosImagenService.encolar(adjunto.id)
+
+        logger.info(f"Ingeridos {len(adjuntos)} adjuntos para {tipo_objeto} {objeto_id}")
+        return adjuntos, errores
+
+
+class ReconciliacionAlmacenamientoService:
+    """
+    Compara el almacenamiento de adjuntos con la tabla Adjunto recorriendo
+    ambos en orden de ruta (merge-join), sin cargar ninguno en memoria
+    """
+
+    # Directorios de MEDIA_ROOT que genera upload_to_ticket
+    DIRECTORIOS = ('adjuntos', 'comentarios', 'tickets')
+    CAMPOS = ('archivo', 'miniatura', 'vista_previa')
+
+    # Colación binaria por motor, para que la BD ordene igual que Python
+    COLACIONES_BINARIAS = {
+        'sqlite': 'BINARY',
+        'mysql': 'utf8mb4_bin',
+        'postgresql': 'C',
+    }
+
+    @staticmethod
+    def recorrer_almacenamiento(raiz=None):
+        """
+        Genera (ruta_relativa, ruta_absoluta) de cada archivo en orden lexicográfico
+        Solo se mantiene en memoria el listado del directorio que se está recorriendo
+        """
+        raiz = str(raiz or settings.MEDIA_ROOT)
+
+        def recorrer(directorio, prefijo):
+            try:
+                with os.scandir(directorio) as entradas:
+                    # Los directorios se ordenan como "nombre/" para respetar el orden de la ruta completa
+                    entradas = sorted(
+                        entradas,
+                        key=lambda e: e.name + '/' if e.is_dir(follow_symlinks=False) else e.name
+                    )
+            except FileNotFoundError:
+                return
+
+            for entrada in entradas:
+                relativa = prefijo + entrada.name
+                if entrada.is_dir(follow_symlinks=False):
+                    yield from recorrer(entrada.path, relativa + '/')
+                elif entrada.is_file(follow_symlinks=False):
+                    yield relativa, entrada.path
+
+        for directorio in ReconciliacionAlmacenamientoService.DIRECTORIOS:
+            yield from recorrer(os.path.join(raiz, directorio), directorio + '/')
+
+    @staticmethod
+    def recorrer_registros(chunk_size=2000):
+        """
+        Genera (ruta, campo, adjunto_id) de cada archivo referenciado, ordenado por ruta
+        Combina los tres campos de archivo con heapq.merge sobre cursores de la BD
+        """
+        colacion = ReconciliacionAlmacenamientoService.COLACIONES_BINARIAS.get(connection.vendor)
+
+        def flujo(campo):
+            orden = Collate(campo, colacion) if colacion else F(campo)
+            registros = Adjunto.objects.all()
+            if campo == 'archivo':
+                # Los originales archivados no están en MEDIA_ROOT y los compartidos
+                # quedan fuera de DIRECTORIOS
+                registros = registros.exclude(almacenamiento='frio').exclude(
+                    archivo__startswith=f'{DIRECTORIO_COMPARTIDO}/'
+                )
+            registros = (
+                registros
+                .exclude(**{f'{campo}__isnull': True})
+                .exclude(**{campo: ''})
+                .order_by(orden)
+                .values_list(campo, 'id')
+            )
+            for ruta, adjunto_id in registros.iterator(chunk_size=chunk_size):
+                yield ruta, campo, adjunto_id
+
+        anterior = ''
+        flujos = [flujo(campo) for campo in ReconciliacionAlmacenamientoService.CAMPOS]
+        for registro in heapq.merge(*flujos, key=itemgetter(0)):
+            if registro[0] < anterior:
+                # Sin un orden binario el merge-join daría falsos huérfanos
+                raise ValueError(
+                    f'La base de datos no devolvió las rutas en orden binario ({anterior!r} > {registro[0]!r})'
+                )
+            anterior = registro[0]
+            yield registro
+
+    @staticmethod
+    def comparar(raiz=None):
+        """
+        Genera las diferencias entre almacenamiento y base de datos:
+        ('huerfano', ruta, ruta_absoluta) para archivos sin registro
+        ('faltante', ruta, (campo, adjunto_id)) para registros sin archivo
+        """
+        archivos = ReconciliacionAlmacenamientoService.recorrer_almacenamiento(raiz)
+        registros = ReconciliacionAlmacenamientoService.recorrer_registros()
+        archivo = next(archivos, None)
+        registro = next(registros, None)
+
+        while archivo is not None or registro is not None:
+            if registro is None or (archivo is not None and archivo[0] < registro[0]):
+                yield 'huerfano', archivo[0], archivo[1]
+                archivo = next(archivos, None)
+            elif archivo is None or registro[0] < archivo[0]:
+                yield 'faltante', registro[0], (registro[1], registro[2])
+                registro = next(registros, None)
+            else:
+                # Un mismo archivo puede estar referenciado por más de un campo
+                ruta = archivo[0]
+                while registro is not None and registro[0] == ruta:
+                    registro = next(registros, None)
+                archivo = next(archivos, None)
+
+
+class _GzipAnidado(gzip.GzipFile):
+    """Descompresión sobre otro flujo que se cierra junto con este"""
+
+    def __init__(self, flujo):
+        super().__init__(fileobj=flujo, mode='rb')
+        self._flujo = flujo
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            self._flujo.close()
+
+
+class AlmacenamientoFrioService:
+    """
+    Mueve los originales de tickets cerrados a un archivo comprimido fuera de MEDIA_ROOT
+    y los devuelve al disco local cuando se vuelven a descargar
+    Los derivados (miniatura y vista previa) permanecen siempre en local
+    """
+
+    TAMAÑO_BLOQUE = 1024 * 1024
+
+    @staticmethod
+    def _copiar_atomico(destino, escribir):
+        """Escribe en un temporal del mismo directorio y lo renombra al destino"""
+        directorio = os.path.dirname(destino)
+        os.makedirs(directorio, exist_ok=True)
+        descriptor, temporal = tempfile.mkstemp(dir=directorio, suffix='.tmp')
+        try:
+            with os.fdopen(descriptor, 'wb') as salida:
+                escribir(salida)
+            os.replace(temporal, destino)
+        except BaseException:
+            try:
+                os.remove(temporal)
+            except OSError:
+                pass
+            raise
+
+    @staticmethod
+    def archivar(adjunto):
+        """
+        Comprime el original al almacenamiento frío y libera el disco local
+        Retorna True si el adjunto se archivó
+        """
+        nivel = settings.TICKET_SETTINGS.get('COLD_STORAGE_COMPRESSLEVEL', 6)
+
+        with transaction.atomic():
+            adjunto = Adjunto.objects.select_for_update().get(id=adjunto.id)
+            if adjunto.esta_archivado() or not adjunto.archivo or adjunto.tiene_archivo_compartido():
+                return False
+
+            origen = adjunto.archivo.path
+
+            def escribir(salida):
+                with open(origen, 'rb') as entrada, gzip.GzipFile(
+                    filename='', mode='wb', fileobj=salida, compresslevel=nivel, mtime=0
+                ) as comprimido:
+                    shutil.copyfileobj(entrada, comprimido, AlmacenamientoFrioService.TAMAÑO_BLOQUE)
+
+            AlmacenamientoFrioService._copiar_atomico(adjunto.get_ruta_fria(), escribir)
+            Adjunto.objects.filter(id=adjunto.id).update(almacenamiento='frio', archivado_at=timezone.now())
+
+        # El original local solo se borra cuando el cambio de nivel ya está confirmado
+        try:
+            os.remove(origen)
+        except OSError:
+            pass
+        return True
+
+    @staticmethod
+    def rehidratar(adjunto):
+        """
+        Descomprime el original al disco local y lo marca de nuevo como local
+        Retorna el adjunto actualizado
+        """
+        with transaction.atomic():
+            adjunto = Adjunto.objects.select_for_update().get(id=adjunto.id)
+            if not adjunto.esta_archivado():
+                return adjunto
+
+            origen = adjunto.get_ruta_fria()
+
+            def escribir(salida):
+                # GzipFile comprueba el CRC al llegar al final del archivo
+                with gzip.open(origen, 'rb') as entrada:
+                    shutil.copyfileobj(entrada, salida, AlmacenamientoFrioService.TAMAÑO_BLOQUE)
+
+            AlmacenamientoFrioService._copiar_atomico(adjunto.archivo.path, escribir)
+            Adjunto.objects.filter(id=adjunto.id).update(almacenamiento='caliente', archivado_at=None)
+            adjunto.almacenamiento = 'caliente'
+            adjunto.archivado_at = None
+
+        try:
+            os.remove(origen)
+        except OSError:
+            pass
+
+        logger.info(f"Adjunto {adjunto.id} recuperado del almacenamiento frío")
+        return adjunto
+
+    @staticmethod
+    def abrir(adjunto):
+        """
+        Abre el contenido original para lectura en el nivel donde esté, sin rehidratarlo
+        Deshace también la compresión en reposo
+        """
+        if not adjunto.esta_archivado():
+            if adjunto.codificacion == 'gzip':
+                return gzip.open(adjunto.archivo.path, 'rb')
+            return open(adjunto.archivo.path, 'rb')
+
+        flujo = gzip.open(adjunto.get_ruta_fria(), 'rb')
+        if adjunto.codificacion == 'gzip':
+            return _GzipAnidado(flujo)
+        return flujo
+
+    @staticmethod
+    def adjuntos_archivables(dias=None):
+        """Adjuntos locales de tickets cerrados hace más de `dias` días"""
+        from tickets.models import Comentario, Ticket
+
+        if dias is None:
+            dias = settings.TICKET_SETTINGS.get('COLD_STORAGE_AFTER_DAYS', 90)
+
+        tickets = Ticket.objects.filter(
+            estado='cerrado',
+            closed_at__lt=timezone.now() - timedelta(days=dias),
+        ).values('id')
+        comentarios = Comentario.objects.filter(ticket__in=tickets).values('id')
+
+        return Adjunto.objects.filter(almacenamiento='caliente').exclude(
+            archivo__startswith=f'{DIRECTORIO_COMPARTIDO}/'
+        ).filter(
+            Q(tipo_objeto='ticket', objeto_id__in=tickets) |
+            Q(tipo_objeto='comentario', objeto_id__in=comentarios)
+        )
+
+
+class CompresionAdjuntosService:
+    """
+    Compresión gzip en reposo de los adjuntos con tipos MIME comprimibles
+    El archivo conserva su nombre; la codificación queda registrada en el Adjunto
+    """
+
+    TAMAÑO_BLOQUE = 64 * 1024
+
+    @staticmethod
+    def debe_comprimirse(tipo_mime, tamaño_bytes):
+        """Indica si un archivo de este tipo y tamaño se guarda comprimido"""
+        config = settings.TICKET_SETTINGS
+        if not config.get('COMPRESS_AT_REST', False):
+            return False
+        if not tipo_mime or (tamaño_bytes or 0) < config.get('COMPRESS_AT_REST_MIN_BYTES', 1024):
+            return False
+        return tipo_mime in config.get('COMPRESSIBLE_MIME_TYPES', ())
+
+    @staticmethod
+    def comprimir(archivo):
+        """
+        Comprime el contenido en un temporal (en memoria si es pequeño)
+        Retorna un File con el contenido comprimido, o None si no compensa
+        """
+        config = settings.TICKET_SETTINGS
+        temporal = tempfile.SpooledTemporaryFile(max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
+        original = 0
+
+        if hasattr(archivo, 'seek'):
+            archivo.seek(0)
+        with gzip.GzipFile(
+            filename='', mode='wb', fileobj=temporal,
+            compresslevel=config.get('COMPRESS_AT_REST_LEVEL', 6), mtime=0
+        ) as comprimido:
+            for bloque in archivo.chunks(CompresionAdjuntosService.TAMAÑO_BLOQUE):
+                original += len(bloque)
+                comprimido.write(bloque)
+        if hasattr(archivo, 'seek'):
+            archivo.seek(0)
+
+        # Solo se guarda comprimido si el ahorro supera el mínimo configurado
+        ahorro = 1 - temporal.tell() / original if original else 0
+        if ahorro < config.get('COMPRESS_AT_REST_MIN_SAVING', 0.1):
+            temporal.close()
+            return None
+
+        temporal.seek(0)
+        return File(temporal, name=getattr(archivo, 'name', None))
+
+    @staticmethod
+    def comprimir_adjunto(adjunto):
+        """
+        Sustituye el archivo pendiente de guardar del adjunto por su versión comprimida
+        Retorna True si se comprimió
+        """
+        if not CompresionAdjuntosService.debe_comprimirse(adjunto.tipo_mime, adjunto.tamaño_bytes):
+            return False
+
+        comprimido = CompresionAdjuntosService.comprimir(adjunto.archivo.file)
+        if comprimido is None:
+            return False
+
+        adjunto.archivo.file = comprimido
+        adjunto.codificacion = 'gzip'
+        return True
+
+
+class _BufferZip(RawIOBase):
+    """
+    Destino no posicionable para ZipFile: acumula lo escrito hasta que se vacía
+    Al no poder hacer seek, zipfile escribe descriptores de datos tras cada archivo
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._partes = []
+
+    def writable(self):
+        return True
+
+    def write(self, datos):
+        self._partes.append(bytes(datos))
+        return len(datos)
+
+    def vaciar(self):
+        datos = b''.join(self._partes)
+        self._partes.clear()
+        return datos
+
+
+class PaqueteZipService:
+    """Genera por partes un ZIP con todos los adjuntos de un ticket, sin archivo temporal"""
+
+    TAMAÑO_BLOQUE = 64 * 1024
+
+    @staticmethod
+    def adjuntos_de_ticket(ticket, usuario):
+        """
+        Adjuntos del ticket y de sus comentarios visibles para el usuario
+        Los clientes solo reciben adjuntos públicos de comentarios públicos
+        """
+        comentarios = ticket.comentarios.all()
+        if usuario.es_cliente():
+            comentarios = comentarios.filter(visibilidad='publico')
+
+        adjuntos = Adjunto.objects.filter(
+            Q(tipo_objeto='ticket', objeto_id=ticket.id) |
+            Q(tipo_objeto='comentario', objeto_id__in=comentarios.values('id'))
+        )
+        if usuario.es_cliente():
+            adjuntos = adjuntos.filter(es_publico=True)
+        return adjuntos.order_by('created_at')
+
+    @staticmethod
+    def nombres_en_zip(adjuntos):
+        """Genera (adjunto, ruta dentro del ZIP) evitando nombres repetidos"""
+        usados = set()
+        for adjunto in adjuntos:
+            nombre = os.path.basename(adjunto.nombre_original.replace('\\', '/')) or str(adjunto.id)
+            if adjunto.tipo_objeto == 'comentario':
+                carpeta = f'comentarios/{str(adjunto.objeto_id)[:8]}/'
+            else:
+                carpeta = ''
+
+            base, extension = os.path.splitext(nombre)
+            ruta = carpeta + nombre
+            contador = 2
+            while ruta.lower() in usados:
+                ruta = f'{carpeta}{base} ({contador}){extension}'
+                contador += 1
+            usados.add(ruta.lower())
+            yield adjunto, ruta
+
+    @staticmethod
+    def generar(adjuntos):
+        """
+        Genera el ZIP por bloques a medida que se leen los archivos
+        Los tipos ya comprimidos se guardan sin volver a comprimir
+        """
+        comprimibles = settings.TICKET_SETTINGS.get('COMPRESSIBLE_MIME_TYPES', ())
+        buffer = _BufferZip()
+
+        with zipfile.ZipFile(buffer, mode='w') as paquete:
+            for adjunto, ruta in PaqueteZipService.nombres_en_zip(adjuntos):
+                try:
+                    flujo = AlmacenamientoFrioService.abrir(adjunto)
+                except OSError:
+                    logger.warning(f"Adjunto {adjunto.id} omitido del ZIP: archivo no encontrado")
+                    continue
+
+                info = zipfile.ZipInfo(ruta, date_time=timezone.localtime(adjunto.created_at).timetuple()[:6])
+                info.compress_type = zipfile.ZIP_DEFLATED if adjunto.tipo_mime in comprimibles else zipfile.ZIP_STORED
+                # Con el tamaño conocido zipfile decide si necesita ZIP64
+                info.file_size = adjunto.tamaño_bytes or 0
+
+                with flujo, paquete.open(info, mode='w') as destino:
+                    for bloque in iter(lambda: flujo.read(PaqueteZipService.TAMAÑO_BLOQUE), b''):
+                        destino.write(bloque)
+                        datos = buffer.vaciar()
+                        if datos:
+                            yield datos
+                yield buffer.vaciar()
+
+        yield buffer.vaciar()
@@ -0,0 +1,13 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from .models import Adjunto
+from .services import DerivadosImagenService
+
+
+@receiver(post_save, sender=Adjunto)
+def programar_derivados_imagen(sender, instance, created, **kwargs):
+    """
+    Programa la generación de miniatura y vista previa cuando se sube una imagen
+    """
+    if created and DerivadosImagenService.requiere_derivados(instance):
+        DerivadosImagenService.encolar(instance.id)
@@ -1,3 +1,532 @@
-from django.test import TestCase
+import gzip
+import hashlib
+import os
+import shutil
+import struct
+import tempfile
+import time
+import zipfile
+from datetime import timedelta
+from io import BytesIO, StringIO
 
-# Create your tests here.
\ No newline at end of file
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from audit.models import Evento
+from core.utils import inspeccionar_archivo
+from tickets.models import Categoria, Comentario, Ticket
+from .models import Adjunto, CargaFragmentada, validar_contenido_archivo
+from .services import (
+    AlmacenamientoFrioService, CargaFragmentadaService, DerivadosImagenService, IngestaAdjuntosService,
+    ReconciliacionAlmacenamientoService,
+)
+
+
+def bmp_minimo():
+    """Cabecera de archivo BMP (14 bytes) y cabecera DIB BITMAPINFOHEADER (40 bytes), 1x1 px"""
+    dib = struct.pack('<IiiHHIIiiII', 40, 1, 1, 1, 24, 0, 4, 2835, 2835, 0, 0)
+    return b'BM' + struct.pack('<IHHI', 58, 0, 0, 54) + dib + b'\x00' * 4
+
+
+def pe_minimo():
+    """Cabecera MZ con e_lfanew apuntando a la firma PE"""
+    cabecera = bytearray(b'MZ' + b'\x00' * 126)
+    cabecera[0x3C:0x40] = struct.pack('<I', 0x80)
+    return bytes(cabecera) + b'PE\x00\x00' + b'\x00' * 20
+
+
+class FirmasContenidoTest(SimpleTestCase):
+    """Las firmas de dos bytes no deben confundir textos normales con binarios"""
+
+    def archivo(self, nombre, contenido):
+        return SimpleUploadedFile(nombre, contenido)
+
+    def test_textos_que_empiezan_como_firmas_binarias(self):
+        for contenido in (b'BMW serie 3, motor averiado', b'MZ-01: pantalla rota', b'#!/bin/sh\necho nota'):
+            with self.subTest(contenido=contenido):
+                archivo = self.archivo('nota.txt', contenido)
+                validar_contenido_archivo(archivo)
+                self.assertEqual(inspeccionar_archivo(archivo).tipo_mime, 'text/plain')
+
+    def test_bmp_real(self):
+        archivo = self.archivo('foto.bmp', bmp_minimo())
+        validar_contenido_archivo(archivo)
+        self.assertTrue(inspeccionar_archivo(archivo).detectado_por_contenido)
+        self.assertEqual(inspeccionar_archivo(archivo).tipo_mime, 'image/bmp')
+
+    def test_ejecutables_prohibidos(self):
+        for nombre, contenido in (('manual.pdf', pe_minimo()), ('nota.txt', b'\x7fELF' + b'\x00' * 60)):
+            with self.subTest(nombre=nombre):
+                with self.assertRaises(ValidationError):
+                    validar_contenido_archivo(self.archivo(nombre, contenido))
+
+    def test_script_con_extension_de_imagen(self):
+        with self.assertRaises(ValidationError):
+            validar_contenido_archivo(self.archivo('foto.jpg', b'#!/bin/sh\nrm -rf /'))
+
+
+def png(ancho, alto, color=(200, 30, 30)):
+    """Imagen PNG sólida generada con Pillow"""
+    from PIL import Image
+
+    buffer = BytesIO()
+    Image.new('RGB', (ancho, alto), color).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+class AdjuntosTestCase(TestCase):
+    """Base con un ticket de cliente y almacenamiento en un directorio temporal"""
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.cliente = User.objects.create_user('cliente_adjuntos', password='x', rol='cliente')
+        cls.agente = User.objects.create_user('agente_adjuntos', password='x', rol='agente')
+        cls.ticket = Ticket.objects.create(
+            numero_factura='F-ADJ-1', asunto='Asunto', descripcion='Descripción',
+            categoria=Categoria.objects.create(nombre='Categoría adjuntos'), cliente=cls.cliente,
+        )
+
+    def setUp(self):
+        self.directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directorio, ignore_errors=True)
+        ticket_settings = {
+            **settings.TICKET_SETTINGS,
+            'CHUNKED_UPLOAD_DIR': os.path.join(self.directorio, 'cargas'),
+            'COLD_STORAGE_DIR': os.path.join(self.directorio, 'frio'),
+            'IMAGE_DERIVATIVES_ASYNC': False,
+            **self.ajustes_ticket(),
+        }
+        ajustes = override_settings(MEDIA_ROOT=os.path.join(self.directorio, 'media'), TICKET_SETTINGS=ticket_settings)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+    def ajustes_ticket(self):
+        """Claves de TICKET_SETTINGS que cada caso quiere sobrescribir"""
+        return {}
+
+    def crear_adjunto(self, nombre, contenido, tipo_objeto='ticket', objeto_id=None, es_publico=True):
+        adjunto = Adjunto(
+            tipo_objeto=tipo_objeto, objeto_id=objeto_id or self.ticket.id,
+            archivo=SimpleUploadedFile(nombre, contenido), subido_por=self.cliente, es_publico=es_publico,
+        )
+        adjunto.save()
+        return adjunto
+
+
+class CargaFragmentadaTest(AdjuntosTestCase):
+    """Finalización y cancelación de subidas fragmentadas"""
+
+    CONTENIDO = b'linea de registro\n' * 100
+
+    def carga_completa(self, checksum=None):
+        carga = CargaFragmentadaService.iniciar(
+            self.cliente, 'ticket', self.ticket.id, 'registro.txt', len(self.CONTENIDO), checksum=checksum,
+        )
+        return CargaFragmentadaService.agregar_fragmento(carga.id, 0, BytesIO(self.CONTENIDO), len(self.CONTENIDO))
+
+    def test_finalizar_mueve_el_temporal_al_adjunto(self):
+        carga = self.carga_completa(checksum=hashlib.sha256(self.CONTENIDO).hexdigest())
+
+        adjunto = CargaFragmentadaService.finalizar(carga.id)
+
+        carga.refresh_from_db()
+        self.assertEqual(carga.estado, 'completada')
+        self.assertEqual(adjunto.checksum, hashlib.sha256(self.CONTENIDO).hexdigest())
+        self.assertFalse(os.path.exists(carga.get_ruta_temporal()))
+        with adjunto.archivo.open('rb') as archivo:
+            self.assertEqual(archivo.read(), self.CONTENIDO)
+
+    def test_checksum_distinto_deja_la_carga_pendiente(self):
+        carga = self.carga_completa(checksum='0' * 64)
+
+        with self.assertRaises(ValidationError):
+            CargaFragmentadaService.finalizar(carga.id)
+
+        carga.refresh_from_db()
+        self.assertEqual(carga.estado, 'pendiente')
+        self.assertTrue(os.path.exists(carga.get_ruta_temporal()))
+
+    def test_cancelar_elimina_los_fragmentos(self):
+        carga = self.carga_completa()
+        self.client.force_login(self.cliente)
+
+        respuesta = self.client.post(reverse('attachments:cancelar_carga', args=[carga.id]))
+
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.json()['estado'], 'cancelada')
+        self.assertFalse(os.path.exists(carga.get_ruta_temporal()))
+        with self.assertRaises(ValidationError):
+            CargaFragmentadaService.finalizar(carga.id)
+
+    def test_no_se_cancela_una_carga_completada(self):
+        carga = self.carga_completa()
+        CargaFragmentadaService.finalizar(carga.id)
+        self.client.force_login(self.cliente)
+
+        respuesta = self.client.post(reverse('attachments:cancelar_carga', args=[carga.id]))
+
+        self.assertEqual(respuesta.status_code, 409)
+        self.assertEqual(CargaFragmentada.objects.get(id=carga.id).estado, 'completada')
+
+
+
+class DerivadosImagenTest(AdjuntosTestCase):
+    """Miniaturas y vistas previas WebP con el hash del contenido en el nombre"""
+
+    def test_genera_variantes_webp_versionadas(self):
+        from PIL import Image
+
+        adjunto = self.crear_adjunto('foto.png', png(1600, 900))
+
+        self.assertTrue(DerivadosImagenService.generar_derivados(adjunto))
+
+        for variante, tamaño in DerivadosImagenService.obtener_variantes().items():
+            with self.subTest(variante=variante):
+                derivado = getattr(adjunto, variante)
+                self.assertIn(f'.{variante}.{adjunto.version_derivado(variante)}.webp', derivado.name)
+                with Image.open(derivado.path) as imagen:
+                    self.assertEqual(imagen.format, 'WEBP')
+                    self.assertLessEqual(imagen.width, tamaño[0])
+        self.assertEqual(Adjunto.objects.get(id=adjunto.id).miniatura.name, adjunto.miniatura.name)
+        self.assertTrue(adjunto.get_url_miniatura().endswith(f"?v={adjunto.version_derivado('miniatura')}"))
+
+    def test_regenerar_sustituye_el_derivado_anterior(self):
+        adjunto = self.crear_adjunto('foto.png', png(400, 400))
+        DerivadosImagenService.generar_derivados(adjunto)
+        anterior = adjunto.miniatura.path
+
+        with adjunto.archivo.open('wb') as archivo:
+            archivo.write(png(400, 400, color=(10, 120, 10)))
+        DerivadosImagenService.generar_derivados(adjunto)
+
+        self.assertNotEqual(adjunto.miniatura.path, anterior)
+        self.assertFalse(os.path.exists(anterior))
+
+    def test_no_genera_derivados_de_otros_tipos(self):
+        adjunto = self.crear_adjunto('nota.txt', b'texto plano')
+
+        self.assertFalse(DerivadosImagenService.generar_derivados(adjunto))
+        self.assertFalse(adjunto.miniatura)
+
+    def test_cache_inmutable_solo_con_la_version_actual(self):
+        adjunto = self.crear_adjunto('foto.png', png(400, 300))
+        DerivadosImagenService.generar_derivados(adjunto)
+        self.client.force_login(self.cliente)
+        url = reverse('attachments:ver_derivado', args=[adjunto.id, 'miniatura'])
+
+        versionada = self.client.get(adjunto.get_url_miniatura())
+        sin_version = self.client.get(url)
+        anterior = self.client.get(f'{url}?v=000000000000')
+
+        self.assertEqual(versionada['Content-Type'], 'image/webp')
+        self.assertIn('immutable', versionada['Cache-Control'])
+        self.assertEqual(b''.join(versionada.streaming_content)[:4], b'RIFF')
+        for respuesta in (sin_version, anterior):
+            self.assertEqual(respuesta['Cache-Control'], 'private, no-cache')
+            respuesta.close()
+
+    def test_etag_coincidente_devuelve_304(self):
+        adjunto = self.crear_adjunto('foto.png', png(400, 300))
+        DerivadosImagenService.generar_derivados(adjunto)
+        self.client.force_login(self.cliente)
+
+        respuesta = self.client.get(
+            adjunto.get_url_miniatura(), HTTP_IF_NONE_MATCH=f'"{os.path.basename(adjunto.miniatura.name)}"',
+        )
+
+        self.assertEqual(respuesta.status_code, 304)
+
+
+class IngestaAdjuntosTest(AdjuntosTestCase):
+    """Ingesta de varios archivos con inserciones masivas"""
+
+    def archivos(self, cantidad):
+        return [SimpleUploadedFile(f'nota_{i}.txt', f'contenido {i}'.encode()) for i in range(cantidad)]
+
+    def ingerir(self, archivos):
+        return IngestaAdjuntosService.ingerir(archivos, 'ticket', self.ticket.id, self.ticket.id, self.cliente)
+
+    def test_registra_adjuntos_eventos_y_contador(self):
+        adjuntos, errores = self.ingerir(self.archivos(3))
+
+        self.assertEqual(errores, [])
+        self.assertEqual(Adjunto.objects.filter(objeto_id=self.ticket.id).count(), 3)
+        self.assertEqual(Evento.objects.filter(ticket_id=self.ticket.id, tipo='adjunto').count(), 3)
+        self.ticket.refresh_from_db()
+        self.assertEqual(self.ticket.num_adjuntos, 3)
+        for adjunto in adjuntos:
+            with adjunto.archivo.open('rb') as archivo:
+                self.assertEqual(archivo.read(), f'contenido {adjunto.nombre_original[5]}'.encode())
+
+    def test_consultas_no_dependen_de_la_cantidad(self):
+        with CaptureQueriesContext(connection) as uno:
+            self.ingerir(self.archivos(1))
+        with CaptureQueriesContext(connection) as cinco:
+            self.ingerir(self.archivos(5))
+
+        self.assertEqual(len(cinco), len(uno))
+
+    def test_archivos_invalidos_se_informan_sin_bloquear_el_resto(self):
+        archivos = self.archivos(2) + [SimpleUploadedFile('programa.pdf', pe_minimo())]
+
+        adjuntos, errores = self.ingerir(archivos)
+
+        self.assertEqual(len(adjuntos), 2)
+        self.assertEqual([nombre for nombre, _ in errores], ['programa.pdf'])
+        self.assertFalse(Adjunto.objects.filter(nombre_original='programa.pdf').exists())
+
+
+class ReconciliacionAlmacenamientoTest(AdjuntosTestCase):
+    """Archivos sin registro y registros sin archivo"""
+
+    def setUp(self):
+        super().setUp()
+        self.conservado = self.crear_adjunto('conservado.txt', b'sigue en disco')
+        self.sin_archivo = self.crear_adjunto('perdido.txt', b'se borra del disco')
+        os.remove(self.sin_archivo.archivo.path)
+        self.huerfano = os.path.join(settings.MEDIA_ROOT, 'adjuntos', 'huerfano.txt')
+        os.makedirs(os.path.dirname(self.huerfano), exist_ok=True)
+        with open(self.huerfano, 'wb') as archivo:
+            archivo.write(b'sin registro')
+        antiguo = time.time() - 3 * 3600
+        os.utime(self.huerfano, (antiguo, antiguo))
+
+    def reconciliar(self, *argumentos):
+        salida = StringIO()
+        call_command('reconciliar_almacenamiento', *argumentos, stdout=salida)
+        return salida.getvalue()
+
+    def test_comparar_detecta_ambas_diferencias(self):
+        diferencias = list(ReconciliacionAlmacenamientoService.comparar())
+
+        self.assertIn(('huerfano', 'adjuntos/huerfano.txt', self.huerfano), diferencias)
+        self.assertIn(
+            ('faltante', self.sin_archivo.archivo.name, ('archivo', self.sin_archivo.id)), diferencias,
+        )
+        self.assertEqual(len(diferencias), 2)
+
+    def test_elimina_huerfanos_y_registros_sin_archivo(self):
+        salida = self.reconciliar()
+
+        self.assertIn('✓ Reconciliación completada', salida)
+        self.assertFalse(os.path.exists(self.huerfano))
+        self.assertFalse(Adjunto.objects.filter(id=self.sin_archivo.id).exists())
+        self.assertTrue(os.path.exists(self.conservado.archivo.path))
+        self.assertTrue(Adjunto.objects.filter(id=self.conservado.id).exists())
+
+    def test_dry_run_no_cambia_nada(self):
+        salida = self.reconciliar('--dry-run')
+
+        self.assertIn('Adjuntos sin archivo: 1', salida)
+        self.assertTrue(os.path.exists(self.huerfano))
+        self.assertTrue(Adjunto.objects.filter(id=self.sin_archivo.id).exists())
+
+    def test_respeta_la_gracia_de_las_subidas_recientes(self):
+        os.utime(self.huerfano)
+
+        salida = self.reconciliar()
+
+        self.assertIn('Omitidos por recientes: 1', salida)
+        self.assertTrue(os.path.exists(self.huerfano))
+
+    def test_derivado_sin_archivo_solo_limpia_la_referencia(self):
+        imagen = self.crear_adjunto('foto.png', png(200, 200))
+        DerivadosImagenService.generar_derivados(imagen)
+        os.remove(imagen.miniatura.path)
+
+        self.reconciliar()
+
+        imagen.refresh_from_db()
+        self.assertFalse(imagen.miniatura)
+        self.assertTrue(imagen.vista_previa)
+        self.assertTrue(os.path.exists(imagen.archivo.path))
+
+
+class AlmacenamientoFrioTest(AdjuntosTestCase):
+    """Archivado en frío y rehidratación de los originales"""
+
+    CONTENIDO = ''.join(f'línea {i} del registro de garantía\n' for i in range(500)).encode()
+
+    def setUp(self):
+        super().setUp()
+        adjuntos, _ = IngestaAdjuntosService.ingerir(
+            [SimpleUploadedFile('registro.txt', self.CONTENIDO)], 'ticket', self.ticket.id, self.ticket.id, self.cliente,
+        )
+        self.adjunto = adjuntos[0]
+
+    def test_archivar_y_rehidratar_conserva_los_bytes(self):
+        ruta_local = self.adjunto.archivo.path
+
+        self.assertTrue(AlmacenamientoFrioService.archivar(self.adjunto))
+
+        archivado = Adjunto.objects.get(id=self.adjunto.id)
+        self.assertTrue(archivado.esta_archivado())
+        self.assertFalse(os.path.exists(ruta_local))
+        with gzip.open(archivado.get_ruta_fria(), 'rb') as frio:
+            self.assertEqual(frio.read(), self.CONTENIDO)
+        with AlmacenamientoFrioService.abrir(archivado) as flujo:
+            self.assertEqual(flujo.read(), self.CONTENIDO)
+
+        rehidratado = AlmacenamientoFrioService.rehidratar(archivado)
+
+        self.assertFalse(rehidratado.esta_archivado())
+        self.assertFalse(os.path.exists(archivado.get_ruta_fria()))
+        with open(ruta_local, 'rb') as archivo:
+            self.assertEqual(hashlib.sha256(archivo.read()).hexdigest(), self.adjunto.checksum)
+
+    def test_archivar_dos_veces_no_hace_nada(self):
+        AlmacenamientoFrioService.archivar(self.adjunto)
+
+        self.assertFalse(AlmacenamientoFrioService.archivar(self.adjunto))
+
+    def test_la_descarga_rehidrata_el_original(self):
+        AlmacenamientoFrioService.archivar(self.adjunto)
+        self.client.force_login(self.cliente)
+
+        respuesta = self.client.get(reverse('attachments:descargar_adjunto', args=[self.adjunto.id]))
+
+        self.assertEqual(b''.join(respuesta.streaming_content), self.CONTENIDO)
+        self.assertFalse(Adjunto.objects.get(id=self.adjunto.id).esta_archivado())
+
+    def test_solo_son_archivables_los_tickets_cerrados_hace_tiempo(self):
+        self.assertFalse(AlmacenamientoFrioService.adjuntos_archivables(dias=30).exists())
+
+        Ticket.objects.filter(id=self.ticket.id).update(
+            estado='cerrado', closed_at=timezone.now() - timedelta(days=31),
+        )
+
+        self.assertEqual(list(AlmacenamientoFrioService.adjuntos_archivables(dias=30)), [self.adjunto])
+        self.assertFalse(AlmacenamientoFrioService.adjuntos_archivables(dias=60).exists())
+
+
+class CompresionEnReposoTest(AdjuntosTestCase):
+    """Los adjuntos comprimibles se guardan con gzip y se sirven descomprimidos si hace falta"""
+
+    CONTENIDO = b'2024-01-01 12:00:00 ERROR compresor sin respuesta\n' * 200
+
+    def ajustes_ticket(self):
+        return {'COMPRESS_AT_REST': True}
+
+    def setUp(self):
+        super().setUp()
+        self.adjunto = self.crear_adjunto('registro.txt', self.CONTENIDO)
+        self.client.force_login(self.cliente)
+
+    def descargar(self, **cabeceras):
+        return self.client.get(reverse('attachments:descargar_adjunto', args=[self.adjunto.id]), **cabeceras)
+
+    def test_se_guarda_comprimido_con_el_tamaño_original(self):
+        self.assertEqual(self.adjunto.codificacion, 'gzip')
+        self.assertEqual(self.adjunto.tamaño_bytes, len(self.CONTENIDO))
+        self.assertLess(os.path.getsize(self.adjunto.archivo.path), len(self.CONTENIDO))
+        with gzip.open(self.adjunto.archivo.path, 'rb') as archivo:
+            self.assertEqual(archivo.read(), self.CONTENIDO)
+
+    def test_descarga_sin_gzip_devuelve_el_original(self):
+        respuesta = self.descargar()
+
+        self.assertFalse(respuesta.has_header('Content-Encoding'))
+        self.assertEqual(int(respuesta['Content-Length']), len(self.CONTENIDO))
+        self.assertIn('Accept-Encoding', respuesta['Vary'])
+        self.assertEqual(b''.join(respuesta.streaming_content), self.CONTENIDO)
+
+    def test_descarga_con_gzip_sirve_los_bytes_guardados(self):
+        respuesta = self.descargar(HTTP_ACCEPT_ENCODING='gzip, deflate')
+
+        self.assertEqual(respuesta['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(b''.join(respuesta.streaming_content)), self.CONTENIDO)
+
+    def test_no_comprime_pequeños_ni_formatos_comprimidos(self):
+        for nombre, contenido in (('nota.txt', b'corta'), ('foto.png', png(300, 300))):
+            with self.subTest(nombre=nombre):
+                self.assertEqual(self.crear_adjunto(nombre, contenido).codificacion, '')
+
+    def test_archivado_en_frio_se_lee_descomprimido(self):
+        AlmacenamientoFrioService.archivar(self.adjunto)
+
+        with AlmacenamientoFrioService.abrir(Adjunto.objects.get(id=self.adjunto.id)) as flujo:
+            self.assertEqual(flujo.read(), self.CONTENIDO)
+
+
+class PaqueteZipTest(AdjuntosTestCase):
+    """El ZIP del ticket se genera por partes y solo con los adjuntos visibles"""
+
+    def setUp(self):
+        super().setUp()
+        publico = Comentario.objects.create(ticket=self.ticket, autor=self.agente, texto='Respuesta')
+        privado = Comentario.objects.create(ticket=self.ticket, autor=self.agente, texto='Nota', visibilidad='privado')
+        self.crear_adjunto('factura.txt', b'factura')
+        self.crear_adjunto('interno.txt', b'interno', es_publico=False)
+        self.crear_adjunto('respuesta.txt', b'respuesta', tipo_objeto='comentario', objeto_id=publico.id)
+        self.crear_adjunto('privado.txt', b'privado', tipo_objeto='comentario', objeto_id=privado.id)
+        self.carpeta_publico = f'comentarios/{str(publico.id)[:8]}/'
+        self.carpeta_privado = f'comentarios/{str(privado.id)[:8]}/'
+
+    def descargar_zip(self, usuario):
+        self.client.force_login(usuario)
+        respuesta = self.client.get(reverse('attachments:descargar_zip_ticket', args=[self.ticket.id]))
+        self.assertEqual(respuesta['Content-Type'], 'application/zip')
+        return zipfile.ZipFile(BytesIO(b''.join(respuesta.streaming_content)))
+
+    def test_cliente_solo_recibe_adjuntos_publicos(self):
+        with self.descargar_zip(self.cliente) as paquete:
+            self.assertEqual(
+                sorted(paquete.namelist()), sorted(['factura.txt', f'{self.carpeta_publico}respuesta.txt']),
+            )
+            self.assertEqual(paquete.read('factura.txt'), b'factura')
+
+    def test_agente_recibe_todos_los_adjuntos(self):
+        with self.descargar_zip(self.agente) as paquete:
+            self.assertIsNone(paquete.testzip())
+            self.assertEqual(paquete.read(f'{self.carpeta_privado}privado.txt'), b'privado')
+            self.assertEqual(len(paquete.namelist()), 4)
+
+    def test_nombres_repetidos_no_se_pisan(self):
+        self.crear_adjunto('factura.txt', b'segunda factura')
+
+        with self.descargar_zip(self.cliente) as paquete:
+            self.assertEqual(paquete.read('factura (2).txt'), b'segunda factura')
+
+
+class DescargaAsincronaTest(AdjuntosTestCase):
+    """La descarga es una vista asíncrona que transmite el archivo por bloques"""
+
+    CONTENIDO = b'0123456789abcdef' * 10000
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.ajeno = get_user_model().objects.create_user('cliente_ajeno', password='x', rol='cliente')
+
+    def setUp(self):
+        super().setUp()
+        self.adjunto = self.crear_adjunto('volcado.txt', self.CONTENIDO)
+        self.url = reverse('attachments:descargar_adjunto', args=[self.adjunto.id])
+
+    async def test_bajo_asgi_transmite_por_bloques(self):
+        await self.async_client.aforce_login(self.cliente)
+
+        respuesta = await self.async_client.get(self.url)
+
+        self.assertTrue(respuesta.is_async)
+        bloques = [bloque async for bloque in respuesta.streaming_content]
+        self.assertGreater(len(bloques), 1)
+        self.assertEqual(b''.join(bloques), self.CONTENIDO)
+        self.assertEqual(int(respuesta['Content-Length']), len(self.CONTENIDO))
+        self.assertIn('volcado.txt', respuesta['Content-Disposition'])
+
+    async def test_cliente_ajeno_no_puede_descargar(self):
+        await self.async_client.aforce_login(self.ajeno)
+
+        respuesta = await self.async_client.get(self.url)
+
+        self.assertEqual(respuesta.status_code, 403)
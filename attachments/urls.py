@@ -7,7 +7,16 @@ urlpatterns = [
     # Gestión de adjuntos
     path('subir/<uuid:ticket_id>/', views.subir_adjunto, name='subir_adjunto'),
     path('descargar/<uuid:adjunto_id>/', views.descargar_adjunto, name='descargar_adjunto'),
+    path('derivado/<uuid:adjunto_id>/<str:variante>/', views.ver_derivado, name='ver_derivado'),
     path('eliminar/<uuid:adjunto_id>/', views.eliminar_adjunto, name='eliminar_adjunto'),
+    path('ticket/<uuid:ticket_id>/zip/', views.descargar_zip_ticket, name='descargar_zip_ticket'),
+
+    # Subida fragmentada y reanudable
+    path('cargas/iniciar/', views.iniciar_carga, name='iniciar_carga'),
+    path('cargas/<uuid:carga_id>/', views.estado_carga, name='estado_carga'),
+    path('cargas/<uuid:carga_id>/fragmento/', views.agregar_fragmento, name='agregar_fragmento'),
+    path('cargas/<uuid:carga_id>/finalizar/', views.finalizar_carga, name='finalizar_carga'),
+    path('cargas/<uuid:carga_id>/cancelar/', views.cancelar_carga, name='cancelar_carga'),
 
     # Listado (solo superadmin)
     path('', views.listar_adjuntos, name='listar_adjuntos'),
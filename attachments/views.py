@@ -1,15 +1,28 @@
-from django.shortcuts import render, redirect, get_object_or_404
+from asgiref.sync import sync_to_async
+from django.shortcuts import render, redirect, get_object_or_404, aget_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import HttpResponseForbidden, HttpResponse, Http404
+from django.conf import settings
+from django.http import HttpResponseForbidden, HttpResponse, HttpResponseNotModified, FileResponse, Http404, JsonResponse, StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.http import content_disposition_header
 from django.core.exceptions import PermissionDenied, ValidationError
-from .models import Adjunto
+from django.core.handlers.asgi import ASGIRequest
+from django.views.decorators.http import require_GET, require_POST, require_http_methods
+from .models import Adjunto, CargaFragmentada
 from .forms import AdjuntoForm
-from tickets.models import Ticket
+from .services import AlmacenamientoFrioService, DerivadosImagenService, CargaFragmentadaService, ConflictoOffset, PaqueteZipService
+from tickets.models import Ticket, Comentario
+import asyncio
+import gzip
 import mimetypes
 import os
+import re
 import uuid
 
+_RE_ACEPTA_GZIP = re.compile(r'\bgzip\b')
+
+
 @login_required
 def subir_adjunto(request, ticket_id):
     """Vista para subir adjuntos a un ticket"""
@@ -36,12 +49,26 @@ def subir_adjunto(request, ticket_id):
     return redirect('tickets:detalle_ticket', ticket_id=ticket.id)
 
 
-@login_required
-def descargar_adjunto(request, adjunto_id):
-    """Vista para descargar un adjunto"""
-    adjunto = get_object_or_404(Adjunto, id=adjunto_id)
+def _verificar_acceso_ticket(usuario, ticket):
+    """
+    Verifica que el usuario pueda descargar los adjuntos del ticket
+    Lanza PermissionDenied si no tiene acceso
+    Compara IDs para no consultar la base de datos (se usa también en vistas asíncronas)
+    """
+    # Los clientes solo pueden descargar adjuntos de sus propios tickets
+    if usuario.es_cliente() and ticket.cliente_id != usuario.id:
+        raise PermissionDenied("No tienes permisos para descargar este archivo.")
 
-    # Verificar permisos según el tipo de objeto
+    # Los empleados pueden descargar adjuntos de tickets asignados o sin asignar
+    if usuario.es_empleado() and ticket.agente_id and ticket.agente_id != usuario.id:
+        raise PermissionDenied("No tienes permisos para descargar este archivo.")
+
+
+async def _verificar_acceso_descarga(usuario, adjunto):
+    """
+    Verifica que el usuario pueda descargar el adjunto
+    Lanza PermissionDenied o Http404 si no tiene acceso
+    """
     if adjunto.tipo_objeto == 'ticket':
         try:
             # Convertir objeto_id a UUID si es necesario
@@ -49,46 +76,180 @@ def descargar_adjunto(request, adjunto_id):
                 ticket_uuid = uuid.UUID(adjunto.objeto_id)
             else:
                 ticket_uuid = adjunto.objeto_id
-                
-            ticket = get_object_or_404(Ticket, id=ticket_uuid)
-
-            # Los clientes solo pueden descargar adjuntos de sus propios tickets
-            if request.user.es_cliente() and ticket.cliente != request.user:
-                raise PermissionDenied("No tienes permisos para descargar este archivo.")
 
-            # Los empleados pueden descargar adjuntos de tickets asignados o sin asignar
-            if request.user.es_empleado() and ticket.agente and ticket.agente != request.user:
-                raise PermissionDenied("No tienes permisos para descargar este archivo.")
+            ticket = await aget_object_or_404(Ticket, id=ticket_uuid)
+            _verificar_acceso_ticket(usuario, ticket)
         except (ValueError, Ticket.DoesNotExist):
             raise Http404("El ticket asociado no existe.")
 
+
+def _leer_por_bloques(flujo, tamaño_bloque=64 * 1024):
+    """Genera el contenido de un archivo por bloques y lo cierra al terminar"""
+    try:
+        for bloque in iter(lambda: flujo.read(tamaño_bloque), b''):
+            yield bloque
+    finally:
+        flujo.close()
+
+
+async def _iterar_en_hilo(iterador):
+    """Recorre un iterador síncrono con E/S de disco sin bloquear el bucle de eventos"""
+    fin = object()
+    try:
+        while True:
+            parte = await asyncio.to_thread(next, iterador, fin)
+            if parte is fin:
+                break
+            yield parte
+    finally:
+        cerrar = getattr(iterador, 'close', None)
+        if cerrar:
+            await asyncio.to_thread(cerrar)
+
+
+def _contenido_por_bloques(request, iterador):
+    """
+    Adapta el contenido de una respuesta en streaming al servidor:
+    bajo ASGI un iterador asíncrono que lee en hilos, bajo WSGI el iterador tal cual
+    (Django acumularía en memoria cualquier iterador del tipo contrario)
+    """
+    if isinstance(request, ASGIRequest):
+        return _iterar_en_hilo(iterador)
+    return iterador
+
+
+def _redirigir_tras_error(request, adjunto):
+    """Redirige al ticket del adjunto (o al listado) tras un error de descarga"""
+    messages.error(request, 'Error al descargar el archivo.')
+    try:
+        if isinstance(adjunto.objeto_id, str):
+            ticket_uuid = uuid.UUID(adjunto.objeto_id)
+        else:
+            ticket_uuid = adjunto.objeto_id
+        return redirect('tickets:detalle_ticket', ticket_id=ticket_uuid)
+    except:
+        return redirect('tickets:lista_tickets')
+
+
+@login_required
+async def descargar_adjunto(request, adjunto_id):
+    """
+    Vista para descargar un adjunto
+    Asíncrona: las lecturas de disco se hacen en hilos y no retienen un worker
+    """
+    usuario = await request.auser()
+    adjunto = await aget_object_or_404(Adjunto, id=adjunto_id)
+
+    # Verificar permisos según el tipo de objeto
+    await _verificar_acceso_descarga(usuario, adjunto)
+
+    # Los originales archivados se devuelven al disco local antes de servirlos
+    if adjunto.esta_archivado():
+        try:
+            adjunto = await sync_to_async(AlmacenamientoFrioService.rehidratar)(adjunto)
+        except OSError:
+            raise Http404("El archivo no existe.")
+
     # Verificar que el archivo existe
-    if not adjunto.archivo or not os.path.exists(adjunto.archivo.path):
+    if not adjunto.archivo or not await asyncio.to_thread(os.path.exists, adjunto.archivo.path):
         raise Http404("El archivo no existe.")
 
     # Preparar la respuesta
     try:
-        with open(adjunto.archivo.path, 'rb') as archivo:
-            response = HttpResponse(archivo.read())
+        ruta = adjunto.archivo.path
+        content_type = adjunto.tipo_mime or mimetypes.guess_type(ruta)[0] or 'application/octet-stream'
+        acepta_gzip = _RE_ACEPTA_GZIP.search(request.headers.get('Accept-Encoding', ''))
 
-        # Determinar el tipo de contenido
-        content_type = adjunto.tipo_mime or mimetypes.guess_type(adjunto.archivo.path)[0] or 'application/octet-stream'
-        response['Content-Type'] = content_type
-        response['Content-Disposition'] = f'attachment; filename="{adjunto.nombre_original}"'
-        response['Content-Length'] = adjunto.tamaño_bytes
+        if adjunto.codificacion == 'gzip' and acepta_gzip:
+            # El cliente descomprime: se sirven los bytes guardados tal cual
+            flujo = await asyncio.to_thread(open, ruta, 'rb')
+            tamaño = await asyncio.to_thread(os.path.getsize, ruta)
+        elif adjunto.codificacion == 'gzip':
+            flujo = await asyncio.to_thread(gzip.open, ruta, 'rb')
+            tamaño = adjunto.tamaño_bytes
+        else:
+            flujo = await asyncio.to_thread(open, ruta, 'rb')
+            tamaño = await asyncio.to_thread(os.path.getsize, ruta)
+
+        response = StreamingHttpResponse(
+            _contenido_por_bloques(request, _leer_por_bloques(flujo)), content_type=content_type
+        )
+        response['Content-Disposition'] = content_disposition_header(True, adjunto.nombre_original)
+        response['Content-Length'] = tamaño
+        if adjunto.codificacion:
+            if acepta_gzip:
+                response['Content-Encoding'] = 'gzip'
+            patch_vary_headers(response, ('Accept-Encoding',))
+        # El tipo declarado ya se obtuvo por firma; el navegador no debe reinterpretarlo
+        response['X-Content-Type-Options'] = 'nosniff'
 
         return response
 
     except Exception as e:
-        messages.error(request, 'Error al descargar el archivo.')
-        try:
-            if isinstance(adjunto.objeto_id, str):
-                ticket_uuid = uuid.UUID(adjunto.objeto_id)
-            else:
-                ticket_uuid = adjunto.objeto_id
-            return redirect('tickets:detalle_ticket', ticket_id=ticket_uuid)
-        except:
-            return redirect('tickets:lista_tickets')
+        return _redirigir_tras_error(request, adjunto)
+
+
+@login_required
+async def descargar_zip_ticket(request, ticket_id):
+    """
+    Descarga todos los adjuntos del ticket y de sus comentarios en un ZIP
+    Los permisos se resuelven una sola vez y el ZIP se genera mientras se envía
+    """
+    usuario = await request.auser()
+    ticket = await aget_object_or_404(Ticket, id=ticket_id)
+    _verificar_acceso_ticket(usuario, ticket)
+
+    adjuntos = [adjunto async for adjunto in PaqueteZipService.adjuntos_de_ticket(ticket, usuario)]
+    if not adjuntos:
+        messages.info(request, 'El ticket no tiene archivos adjuntos.')
+        return redirect('tickets:detalle_ticket', ticket_id=ticket.id)
+
+    response = StreamingHttpResponse(
+        _contenido_por_bloques(request, PaqueteZipService.generar(adjuntos)), content_type='application/zip'
+    )
+    response['Content-Disposition'] = content_disposition_header(
+        True, f'ticket_{str(ticket.id)[:8]}_adjuntos.zip'
+    )
+    return response
+
+
+@login_required
+async def ver_derivado(request, adjunto_id, variante):
+    """
+    Vista para servir la miniatura o vista previa WebP de una imagen
+    El nombre del derivado lleva el hash de su contenido: con ?v= de la versión actual
+    se cachea como inmutable; sin ella (o con una anterior) se revalida con el ETag
+    """
+    if variante not in DerivadosImagenService.obtener_variantes():
+        raise Http404("Variante no disponible.")
+
+    usuario = await request.auser()
+    adjunto = await aget_object_or_404(Adjunto, id=adjunto_id)
+    await _verificar_acceso_descarga(usuario, adjunto)
+
+    derivado = getattr(adjunto, variante)
+    if not derivado or not await asyncio.to_thread(os.path.exists, derivado.path):
+        # Aún no se ha generado: servir el original sin cache de larga duración
+        return redirect('attachments:descargar_adjunto', adjunto_id=adjunto.id)
+
+    etag = f'"{os.path.basename(derivado.name)}"'
+    if request.headers.get('If-None-Match') == etag:
+        response = HttpResponseNotModified()
+    else:
+        flujo = await asyncio.to_thread(open, derivado.path, 'rb')
+        response = StreamingHttpResponse(
+            _contenido_por_bloques(request, _leer_por_bloques(flujo)), content_type='image/webp'
+        )
+        response['Content-Length'] = await asyncio.to_thread(os.path.getsize, derivado.path)
+
+    response['ETag'] = etag
+    response['X-Content-Type-Options'] = 'nosniff'
+    version = adjunto.version_derivado(variante)
+    if version and request.GET.get('v') == version:
+        response['Cache-Control'] = f"private, max-age={settings.TICKET_SETTINGS.get('DERIVATIVE_CACHE_SECONDS', 31536000)}, immutable"
+    else:
+        response['Cache-Control'] = 'private, no-cache'
+    return response
 
 
 @login_required
@@ -104,14 +265,7 @@ def eliminar_adjunto(request, adjunto_id):
         ticket_id = adjunto.objeto_id
         nombre_archivo = adjunto.nombre_original
 
-        # Eliminar el archivo físico
-        if adjunto.archivo and os.path.exists(adjunto.archivo.path):
-            try:
-                os.remove(adjunto.archivo.path)
-            except OSError:
-                pass
-
-        # Eliminar el registro de la base de datos
+        # Adjunto.delete elimina el archivo físico y sus derivados
         adjunto.delete()
 
         messages.success(request, f'Archivo {nombre_archivo} eliminado exitosamente.')
@@ -171,4 +325,135 @@ def listar_adjuntos(request):
         'tipos_archivo': ['imagen', 'video', 'documento', 'otro'],
     }
 
-    return render(request, 'attachments/listar_adjuntos.html', context)
\ No newline at end of file
+    return render(request, 'attachments/listar_adjuntos.html', context)
+
+
+# ========== SUBIDA FRAGMENTADA Y REANUDABLE ==========
+
+def _estado_carga(carga):
+    """Serializa el estado de una carga fragmentada"""
+    return {
+        'id': str(carga.id),
+        'estado': carga.estado,
+        'nombre_original': carga.nombre_original,
+        'tamaño_total': carga.tamaño_total,
+        'bytes_recibidos': carga.bytes_recibidos,
+        'tamaño_fragmento': CargaFragmentadaService.tamaño_fragmento(),
+        'adjunto_id': str(carga.adjunto_id) if carga.adjunto_id else None,
+    }
+
+
+def _obtener_offset_fragmento(request):
+    """Obtiene el offset del fragmento desde Content-Range (bytes inicio-fin/total) o X-Offset"""
+    content_range = request.headers.get('Content-Range', '')
+    if content_range.startswith('bytes '):
+        return int(content_range[6:].split('-', 1)[0])
+    return int(request.headers.get('X-Offset', '0'))
+
+
+@login_required
+@require_POST
+def iniciar_carga(request):
+    """
+    Inicia una subida fragmentada para un ticket o comentario
+    Parámetros: ticket_id o comentario_id, nombre, tamaño, checksum (opcional)
+    """
+    usuario = request.user
+    ticket_id = request.POST.get('ticket_id')
+    comentario_id = request.POST.get('comentario_id')
+
+    try:
+        if comentario_id:
+            comentario = get_object_or_404(Comentario.objects.select_related('ticket'), id=comentario_id)
+            if comentario.autor != usuario:
+                return JsonResponse({'error': 'Solo el autor puede adjuntar archivos al comentario.'}, status=403)
+            tipo_objeto, objeto_id = 'comentario', comentario.id
+        else:
+            ticket = get_object_or_404(Ticket, id=ticket_id)
+            if not (ticket.cliente == usuario or usuario.puede_gestionar_tickets()):
+                return JsonResponse({'error': 'No tienes permisos para subir archivos a este ticket.'}, status=403)
+            tipo_objeto, objeto_id = 'ticket', ticket.id
+
+        carga = CargaFragmentadaService.iniciar(
+            usuario=usuario,
+            tipo_objeto=tipo_objeto,
+            objeto_id=objeto_id,
+            nombre_original=request.POST.get('nombre', ''),
+            tamaño_total=int(request.POST.get('tamaño', '0')),
+            checksum=request.POST.get('checksum'),
+            descripcion=request.POST.get('descripcion') or None,
+            # Los clientes no pueden subir archivos privados
+            es_publico=usuario.es_cliente() or request.POST.get('es_publico', 'true').lower() in ('1', 'true', 'on'),
+        )
+    except (ValueError, ValidationError) as e:
+        mensaje = '; '.join(e.messages) if isinstance(e, ValidationError) else 'Parámetros inválidos.'
+        return JsonResponse({'error': mensaje}, status=400)
+
+    return JsonResponse(_estado_carga(carga), status=201)
+
+
+@login_required
+@require_GET
+def estado_carga(request, carga_id):
+    """Consulta los bytes recibidos para reanudar una subida interrumpida"""
+    carga = get_object_or_404(CargaFragmentada, id=carga_id, usuario=request.user)
+    return JsonResponse(_estado_carga(carga))
+
+
+@login_required
+@require_http_methods(['PUT', 'POST'])
+def agregar_fragmento(request, carga_id):
+    """
+    Recibe un fragmento en el cuerpo de la petición (application/octet-stream)
+    El offset se indica con Content-Range o X-Offset
+    """
+    carga = get_object_or_404(CargaFragmentada, id=carga_id, usuario=request.user)
+
+    try:
+        carga = CargaFragmentadaService.agregar_fragmento(
+            carga.id,
+            offset=_obtener_offset_fragmento(request),
+            flujo=request,
+            longitud=int(request.META.get('CONTENT_LENGTH') or 0),
+            checksum_fragmento=request.headers.get('X-Checksum-Fragmento'),
+        )
+    except ConflictoOffset as e:
+        return JsonResponse({'error': 'Offset inválido.', 'bytes_recibidos': e.bytes_recibidos}, status=409)
+    except (ValueError, ValidationError) as e:
+        mensaje = '; '.join(e.messages) if isinstance(e, ValidationError) else 'Offset inválido.'
+        return JsonResponse({'error': mensaje}, status=400)
+
+    return JsonResponse(_estado_carga(carga))
+
+
+@login_required
+@require_POST
+def finalizar_carga(request, carga_id):
+    """Finaliza la subida fragmentada y crea el adjunto"""
+    carga = get_object_or_404(CargaFragmentada, id=carga_id, usuario=request.user)
+
+    try:
+        adjunto = CargaFragmentadaService.finalizar(carga.id)
+    except ValidationError as e:
+        return JsonResponse({'error': '; '.join(e.messages)}, status=400)
+
+    return JsonResponse({
+        'adjunto_id': str(adjunto.id),
+        'nombre_original': adjunto.nombre_original,
+        'checksum': adjunto.checksum,
+        'url_descarga': adjunto.get_url_descarga(),
+    }, status=201)
+
+
+@login_required
+@require_http_methods(['POST', 'DELETE'])
+def cancelar_carga(request, carga_id):
+    """Cancela la subida fragmentada y elimina los fragmentos recibidos"""
+    carga = get_object_or_404(CargaFragmentada, id=carga_id, usuario=request.user)
+
+    try:
+        carga = CargaFragmentadaService.cancelar(carga.id)
+    except ValidationError as e:
+        return JsonResponse({'error': '; '.join(e.messages)}, status=409)
+
+    return JsonResponse(_estado_carga(carga))
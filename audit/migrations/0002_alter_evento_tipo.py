@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-19 11:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('audit', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='evento',
+            name='tipo',
+            field=models.CharField(choices=[('creacion', 'Creación de Ticket'), ('asignacion', 'Asignación de Agente'), ('cambio_estado', 'Cambio de Estado'), ('comentario', 'Nuevo Comentario'), ('adjunto', 'Archivo Adjuntado'), ('cierre', 'Cierre de Ticket'), ('reapertura', 'Reapertura de Ticket'), ('sla_incumplido', 'SLA Incumplido')], max_length=20),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-19 11:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('audit', '0002_alter_evento_tipo'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='evento',
+            name='tipo',
+            field=models.CharField(choices=[('creacion', 'Creación de Ticket'), ('asignacion', 'Asignación de Agente'), ('cambio_estado', 'Cambio de Estado'), ('comentario', 'Nuevo Comentario'), ('adjunto', 'Archivo Adjuntado'), ('cierre', 'Cierre de Ticket'), ('reapertura', 'Reapertura de Ticket'), ('sla_incumplido', 'SLA Incumplido'), ('posible_duplicado', 'Posible Reclamo Duplicado')], max_length=20),
+        ),
+    ]
@@ -17,6 +17,8 @@ class Evento(models.Model):
         ('adjunto', 'Archivo Adjuntado'),
         ('cierre', 'Cierre de Ticket'),
         ('reapertura', 'Reapertura de Ticket'),
+        ('sla_incumplido', 'SLA Incumplido'),
+        ('posible_duplicado', 'Posible Reclamo Duplicado'),
     ]
     
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -26,19 +26,19 @@ def crear_evento_ticket(sender, instance, created, **kwargs):
             actor=instance.cliente
         )
     else:
-        # Detectar cambios de estado o asignación
-        if hasattr(instance, '_estado_anterior'):
-            if instance._estado_anterior != instance.estado:
-                Evento.objects.create(
-                    ticket_id=instance.id,
-                    tipo='cambio_estado',
-                    descripcion=f'Estado cambiado de {instance._estado_anterior} a {instance.estado}',
-                    datos_json={
-                        'estado_anterior': instance._estado_anterior,
-                        'estado_nuevo': instance.estado,
-                    },
-                    actor=getattr(instance, '_usuario_modificador', None)
-                )
+        # Detectar cambios de estado con el valor original que registra el ticket
+        estado_anterior = instance.valor_original('estado')
+        if estado_anterior is not None and estado_anterior != instance.estado:
+            Evento.objects.create(
+                ticket_id=instance.id,
+                tipo='cambio_estado',
+                descripcion=f'Estado cambiado de {estado_anterior} a {instance.estado}',
+                datos_json={
+                    'estado_anterior': estado_anterior,
+                    'estado_nuevo': instance.estado,
+                },
+                actor=getattr(instance, '_usuario_modificador', None)
+            )
 
 
 @receiver(post_save, sender=Comentario)
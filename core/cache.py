@@ -0,0 +1,152 @@
+"""
+Caché del proyecto
+Backend en archivos compartido entre procesos, invalidación por etiquetas (todas las
+entradas de un usuario) y cálculo con un solo recálculo simultáneo
+por clave (single-flight)
+"""
+import os
+import random
+import tempfile
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.cache.backends.filebased import FileBasedCache
+
+_AUSENTE = object()
+
+# Tiempo máximo que un cálculo retiene el candado si el proceso muere a mitad
+TTL_CANDADO = 30
+# Vida de la versión de una etiqueta; debe superar la de las entradas que etiqueta.
+# Al caducar, la etiqueta recibe otra versión y sus entradas se recalculan una vez
+TTL_ETIQUETA = 24 * 60 * 60
+INTERVALO_ESPERA = 0.05
+# Fracción de los add que recorren el directorio para purgar entradas si sobran
+PROBABILIDAD_PURGA = 0.05
+
+
+class ArchivoCompartidoCache(FileBasedCache):
+    """
+    FileBasedCache con add atómico entre procesos: la entrada se escribe en un temporal
+    y se enlaza con os.link, que falla si la clave ya existe. Los candados de
+    obtener_o_calcular dependen de ello (el add de FileBasedCache comprueba y escribe
+    en dos pasos)
+    """
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        # Caso habitual (candados y limitadores ya tomados): una lectura de la
+        # cabecera, sin escribir ni recorrer el directorio
+        if self.has_key(key, version):
+            return False
+        self._createdir()
+        fname = self._key_to_file(key, version)
+        # set() ya purga en cada escritura; aquí basta con hacerlo de vez en cuando
+        if random.random() < PROBABILIDAD_PURGA:
+            self._cull()
+        fd, tmp_path = tempfile.mkstemp(dir=self._dir)
+        try:
+            with open(fd, 'wb') as f:
+                self._write_content(f, timeout, value)
+            # Segundo intento solo si la entrada existente estaba caducada y se eliminó
+            for _ in range(2):
+                try:
+                    os.link(tmp_path, fname)
+                    return True
+                except FileExistsError:
+                    try:
+                        with open(fname, 'rb') as f:
+                            if not self._is_expired(f):
+                                return False
+                    except FileNotFoundError:
+                        pass
+            return False
+        finally:
+            os.remove(tmp_path)
+
+
+def etiqueta_usuario(usuario_id):
+    return f'usuario:{usuario_id}'
+
+
+def _clave_etiqueta(etiqueta):
+    return f'etiqueta:{etiqueta}'
+
+
+def versiones_etiquetas(etiquetas):
+    """
+    Versión actual de cada etiqueta: un token aleatorio y no un contador, así invalidar
+    es un simple set y no depende de que el backend tenga incr atómico. Si la versión
+    caduca o el backend la descarta, la etiqueta recibe otra y sus entradas quedan invalidadas
+    """
+    if not etiquetas:
+        return ()
+    claves = [_clave_etiqueta(etiqueta) for etiqueta in etiquetas]
+    actuales = cache.get_many(claves)
+    versiones = []
+    for clave in claves:
+        version = actuales.get(clave)
+        if version is None:
+            nueva = uuid.uuid4().hex[:12]
+            # add: si otro proceso la creó entre medias, gana la suya
+            version = nueva if cache.add(clave, nueva, timeout=TTL_ETIQUETA) else cache.get(clave, nueva)
+        versiones.append(version)
+    return tuple(versiones)
+
+
+def invalidar(*etiquetas):
+    """Invalida todas las entradas guardadas con alguna de estas etiquetas"""
+    if etiquetas:
+        cache.set_many(
+            {_clave_etiqueta(etiqueta): uuid.uuid4().hex[:12] for etiqueta in etiquetas},
+            timeout=TTL_ETIQUETA,
+        )
+
+
+def invalidar_usuario(*usuario_ids):
+    invalidar(*(etiqueta_usuario(usuario_id) for usuario_id in usuario_ids))
+
+
+def clave_versionada(clave, etiquetas=()):
+    versiones = versiones_etiquetas(etiquetas)
+    return f'{clave}:{".".join(versiones)}' if versiones else clave
+
+
+def obtener(clave, etiquetas=(), defecto=None):
+    return cache.get(clave_versionada(clave, etiquetas), defecto)
+
+
+def guardar(clave, valor, timeout=DEFAULT_TIMEOUT, etiquetas=()):
+    cache.set(clave_versionada(clave, etiquetas), valor, timeout)
+
+
+def obtener_o_calcular(clave, calcular, timeout, etiquetas=(), espera=None):
+    """
+    Retorna el valor en caché o lo calcula. Si varias peticiones fallan a la vez,
+    solo la que obtiene el candado (cache.add) calcula; el resto espera su resultado
+    hasta `espera` segundos y, si no llega, calcula por su cuenta
+    """
+    clave = clave_versionada(clave, etiquetas)
+    valor = cache.get(clave, _AUSENTE)
+    if valor is not _AUSENTE:
+        return valor
+
+    candado = f'{clave}:calculando'
+    if cache.add(candado, 1, timeout=TTL_CANDADO):
+        try:
+            valor = calcular()
+            cache.set(clave, valor, timeout)
+            return valor
+        finally:
+            cache.delete(candado)
+
+    if espera is None:
+        espera = settings.TICKET_SETTINGS.get('CACHE_LOCK_WAIT_SECONDS', 2)
+    limite = time.monotonic() + espera
+    while time.monotonic() < limite:
+        time.sleep(INTERVALO_ESPERA)
+        valor = cache.get(clave, _AUSENTE)
+        if valor is not _AUSENTE:
+            return valor
+    return calcular()
@@ -0,0 +1,215 @@
+"""
+Métricas por petición: consultas SQL, tiempo en SQL y en plantillas,
+consultas repetidas (N+1) y un agregado en memoria por vista
+"""
+import hashlib
+import re
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.signals import request_started
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponseForbidden, JsonResponse
+from django.template.backends.django import DjangoTemplates, Template
+
+# Métricas de la petición en curso; contextvars llega también a los hilos de sync_to_async
+_metricas_actuales = ContextVar('metricas_peticion', default=None)
+
+_LITERALES = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_LISTAS_IN = re.compile(r'\bIN\s*\((?:\s*(?:%s|\?)\s*,?)+\)', re.IGNORECASE)
+_ESPACIOS = re.compile(r'\s+')
+
+
+def configuracion_metricas(clave, defecto=None):
+    return settings.TICKET_SETTINGS.get(clave, defecto)
+
+
+def huella_consulta(sql):
+    """
+    Forma normalizada de una consulta: sin literales y con las listas IN colapsadas,
+    de modo que la misma consulta con distintos parámetros comparte huella
+    """
+    normalizada = _LITERALES.sub('?', sql)
+    normalizada = _LISTAS_IN.sub('IN (...)', normalizada)
+    normalizada = _ESPACIOS.sub(' ', normalizada).strip()
+    return hashlib.md5(normalizada.encode('utf-8')).hexdigest()[:12], normalizada
+
+
+class MetricasPeticion:
+    """Acumula lo medido durante una petición"""
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.consultas = 0
+        self.tiempo_sql = 0.0
+        self.tiempo_plantillas = 0.0
+        self.huellas = Counter()
+        self.ejemplos = {}
+
+    def registrar_consulta(self, sql, duracion):
+        self.consultas += 1
+        self.tiempo_sql += duracion
+        huella, normalizada = huella_consulta(sql)
+        self.huellas[huella] += 1
+        self.ejemplos.setdefault(huella, normalizada)
+
+    def repetidas(self, umbral):
+        """[(huella, veces, sql)] de las consultas ejecutadas al menos `umbral` veces"""
+        return [
+            (huella, veces, self.ejemplos[huella])
+            for huella, veces in self.huellas.most_common()
+            if veces >= umbral
+        ]
+
+    def duracion(self):
+        return time.perf_counter() - self.inicio
+
+
+def iniciar_medicion():
+    """Activa la medición para el contexto actual y devuelve (métricas, token)"""
+    metricas = MetricasPeticion()
+    return metricas, _metricas_actuales.set(metricas)
+
+
+def finalizar_medicion(token):
+    _metricas_actuales.reset(token)
+
+
+def medir_consulta(execute, sql, params, many, context):
+    """execute_wrapper: cuenta y cronometra las consultas de la petición en curso"""
+    metricas = _metricas_actuales.get()
+    if metricas is None:
+        return execute(sql, params, many, context)
+    inicio = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metricas.registrar_consulta(sql, time.perf_counter() - inicio)
+
+
+def instalar_en_conexion(connection):
+    if medir_consulta not in connection.execute_wrappers:
+        connection.execute_wrappers.append(medir_consulta)
+
+
+def instalar_en_conexiones():
+    """Instala el wrapper en las conexiones ya abiertas en este hilo"""
+    for connection in connections.all(initialized_only=True):
+        instalar_en_conexion(connection)
+
+
+def _al_crear_conexion(sender, connection, **kwargs):
+    instalar_en_conexion(connection)
+
+
+# Cada conexión nueva (de cualquier hilo) queda instrumentada; fuera de una petición medida
+# el wrapper solo comprueba el contextvar y ejecuta la consulta
+connection_created.connect(_al_crear_conexion, dispatch_uid='core.metricas.medir_consulta')
+
+
+def _al_iniciar_peticion(sender, **kwargs):
+    instalar_en_conexiones()
+
+
+# Las conexiones abiertas antes de importar este módulo no pasaron por connection_created.
+# request_started corre en el hilo que hará las consultas: el de la petición bajo WSGI y,
+# bajo ASGI, el de sync_to_async (asend agrupa los receptores síncronos en esa llamada)
+request_started.connect(_al_iniciar_peticion, dispatch_uid='core.metricas.instalar_en_conexiones')
+
+
+class PlantillaMedida(Template):
+    """Plantilla Django que suma su tiempo de render a la petición en curso"""
+
+    def render(self, context=None, request=None):
+        metricas = _metricas_actuales.get()
+        if metricas is None:
+            return super().render(context, request)
+        inicio = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metricas.tiempo_plantillas += time.perf_counter() - inicio
+
+
+class DjangoTemplatesMedidas(DjangoTemplates):
+    """Backend DjangoTemplates que devuelve PlantillaMedida (los include se miden dentro del padre)"""
+
+    def from_string(self, template_code):
+        return PlantillaMedida(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        plantilla = super().get_template(template_name)
+        return PlantillaMedida(plantilla.template, self)
+
+
+class AgregadoVistas:
+    """Totales por vista desde el arranque del proceso, para el endpoint de métricas"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._vistas = {}
+
+    def registrar(self, vista, duracion, metricas, repetidas):
+        with self._lock:
+            datos = self._vistas.setdefault(vista, {
+                'peticiones': 0,
+                'duracion_total': 0.0,
+                'duracion_max': 0.0,
+                'consultas_total': 0,
+                'consultas_max': 0,
+                'sql_total': 0.0,
+                'plantillas_total': 0.0,
+                'con_repetidas': 0,
+            })
+            datos['peticiones'] += 1
+            datos['duracion_total'] += duracion
+            datos['duracion_max'] = max(datos['duracion_max'], duracion)
+            datos['consultas_total'] += metricas.consultas
+            datos['consultas_max'] = max(datos['consultas_max'], metricas.consultas)
+            datos['sql_total'] += metricas.tiempo_sql
+            datos['plantillas_total'] += metricas.tiempo_plantillas
+            if repetidas:
+                datos['con_repetidas'] += 1
+
+    def resumen(self):
+        with self._lock:
+            vistas = {vista: dict(datos) for vista, datos in self._vistas.items()}
+        resultado = {}
+        for vista, datos in sorted(vistas.items()):
+            n = datos['peticiones']
+            resultado[vista] = {
+                'peticiones': n,
+                'duracion_media_ms': round(datos['duracion_total'] / n * 1000, 2),
+                'duracion_max_ms': round(datos['duracion_max'] * 1000, 2),
+                'consultas_media': round(datos['consultas_total'] / n, 2),
+                'consultas_max': datos['consultas_max'],
+                'sql_media_ms': round(datos['sql_total'] / n * 1000, 2),
+                'plantillas_media_ms': round(datos['plantillas_total'] / n * 1000, 2),
+                'peticiones_con_repetidas': datos['con_repetidas'],
+            }
+        return resultado
+
+    def reiniciar(self):
+        with self._lock:
+            self._vistas.clear()
+
+
+agregado_vistas = AgregadoVistas()
+
+
+def vista_metricas(request):
+    """
+    Agregado de métricas por vista del proceso actual (JSON).
+    Solo superadministradores; ?reiniciar=1 pone los contadores a cero
+    """
+    usuario = request.user
+    if not usuario.is_authenticated or not usuario.es_superadmin():
+        return HttpResponseForbidden('No tiene permisos para ver las métricas.')
+    resumen = agregado_vistas.resumen()
+    if request.GET.get('reiniciar') == '1':
+        agregado_vistas.reiniciar()
+    return JsonResponse({'vistas': resumen})
@@ -0,0 +1,184 @@
+"""
+Middleware del proyecto
+"""
+import logging
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
+
+from .metricas import (
+    agregado_vistas,
+    configuracion_metricas,
+    finalizar_medicion,
+    iniciar_medicion,
+)
+
+logger = logging.getLogger('core.metricas')
+
+
+class MetricasPeticionMiddleware:
+    """
+    Registra por petición el número de consultas, el tiempo en SQL y en plantillas,
+    las consultas repetidas (posibles N+1) y el tamaño de la respuesta.
+    Emite una línea clave=valor en el logger 'core.metricas' y, con
+    REQUEST_METRICS_ENDPOINT, acumula los totales por vista para /metricas/.
+    Debe ir el primero en MIDDLEWARE para medir también al resto de middleware
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.activo = configuracion_metricas('REQUEST_METRICS_ENABLED', True)
+        self.umbral_repetidas = configuracion_metricas('REQUEST_METRICS_DUPLICATE_THRESHOLD', 3)
+        self.agregar = configuracion_metricas('REQUEST_METRICS_ENDPOINT', False)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.activo:
+            return self.get_response(request)
+
+        metricas, token = iniciar_medicion()
+        try:
+            response = self.get_response(request)
+        finally:
+            finalizar_medicion(token)
+        self.registrar(request, response, metricas)
+        return response
+
+    async def __acall__(self, request):
+        if not self.activo:
+            return await self.get_response(request)
+
+        # Las consultas corren en hilos de sync_to_async, que heredan el contextvar;
+        # sus conexiones quedan instrumentadas por connection_created y request_started
+        metricas, token = iniciar_medicion()
+        try:
+            response = await self.get_response(request)
+        finally:
+            finalizar_medicion(token)
+        self.registrar(request, response, metricas)
+        return response
+
+    def registrar(self, request, response, metricas):
+        duracion = metricas.duracion()
+        match = getattr(request, 'resolver_match', None)
+        vista = (match.view_name if match else None) or '-'
+        repetidas = metricas.repetidas(self.umbral_repetidas)
+
+        if response.streaming:
+            tamano = response.get('Content-Length', '-')
+        else:
+            tamano = len(response.content)
+
+        logger.info(
+            'peticion metodo=%s ruta=%s vista=%s estado=%s duracion_ms=%.1f consultas=%d '
+            'sql_ms=%.1f plantillas_ms=%.1f bytes=%s repetidas=%d',
+            request.method, request.path, vista, response.status_code, duracion * 1000,
+            metricas.consultas, metricas.tiempo_sql * 1000, metricas.tiempo_plantillas * 1000,
+            tamano, len(repetidas),
+        )
+        for huella, veces, sql in repetidas:
+            logger.warning(
+                'consulta_repetida vista=%s huella=%s veces=%d sql="%s"',
+                vista, huella, veces, sql[:300],
+            )
+
+        if self.agregar:
+            agregado_vistas.registrar(vista, duracion, metricas, repetidas)
+
+
+class RenovacionSesionMiddleware:
+    """
+    Sin SESSION_SAVE_EVERY_REQUEST la sesión solo se escribe cuando cambia. Para que una
+    sesión en uso no caduque, renueva su vencimiento cuando ha pasado SESSION_RENEW_FRACTION
+    de SESSION_COOKIE_AGE desde la última renovación: una escritura cada cierto tiempo en
+    lugar de una por petición. Debe ir después de SessionMiddleware
+    """
+
+    CLAVE = '_renovada_en'
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        fraccion = settings.TICKET_SETTINGS.get('SESSION_RENEW_FRACTION', 0.5)
+        self.intervalo = settings.SESSION_COOKIE_AGE * fraccion
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    @staticmethod
+    def sesion_renovable(request, response):
+        session = getattr(request, 'session', None)
+        # Sesiones vacías (anónimos, logout) no se crean ni se renuevan
+        if session is None or session.is_empty() or response.status_code >= 500:
+            return None
+        return session
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        response = self.get_response(request)
+        session = self.sesion_renovable(request, response)
+        if session is not None:
+            ahora = int(time.time())
+            if ahora - session.get(self.CLAVE, 0) >= self.intervalo:
+                # Modificar la sesión hace que SessionMiddleware la guarde y reenvíe la cookie
+                session[self.CLAVE] = ahora
+        return response
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        session = self.sesion_renovable(request, response)
+        if session is not None:
+            ahora = int(time.time())
+            if ahora - await session.aget(self.CLAVE, 0) >= self.intervalo:
+                await session.aset(self.CLAVE, ahora)
+        return response
+
+
+class ActividadUsuarioMiddleware:
+    """
+    Anota la actividad del usuario autenticado en cada petición mediante
+    ActividadUsuarioService, que limita las escrituras. Toma el id de la sesión
+    para no cargar el usuario en peticiones que no lo necesitan.
+    Debe ir después de SessionMiddleware
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        response = self.get_response(request)
+        session = getattr(request, 'session', None)
+        usuario_id = session.get(SESSION_KEY) if session is not None else None
+        if usuario_id:
+            from accounts.services import ActividadUsuarioService
+
+            ActividadUsuarioService.registrar(usuario_id)
+        return response
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        session = getattr(request, 'session', None)
+        usuario_id = await session.aget(SESSION_KEY) if session is not None else None
+        if usuario_id:
+            from accounts.services import ActividadUsuarioService
+
+            await sync_to_async(ActividadUsuarioService.registrar)(usuario_id)
+        return response
@@ -53,8 +53,11 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.MetricasPeticionMiddleware',  # Primero: mide también al resto de middleware
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
+    'core.middleware.RenovacionSesionMiddleware',  # Tras SessionMiddleware: renueva el vencimiento cada cierto tiempo
+    'core.middleware.ActividadUsuarioMiddleware',  # Última actividad del usuario, anotada en caché y guardada por volcar_actividad
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -66,7 +69,7 @@ ROOT_URLCONF = 'core.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.metricas.DjangoTemplatesMedidas',  # DjangoTemplates que mide el tiempo de render
         'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -167,7 +170,9 @@ CRISPY_ALLOWED_TEMPLATE_PACKS = "bootstrap5"
 CRISPY_TEMPLATE_PACK = "bootstrap5"
 
 # File upload settings
-FILE_UPLOAD_MAX_MEMORY_SIZE = 25 * 1024 * 1024  # 25MB
+# Los archivos mayores a 2.5MB se vuelcan a disco en lugar de mantenerse en RAM;
+# los videos grandes deben usar la subida fragmentada (attachments/cargas/)
+FILE_UPLOAD_MAX_MEMORY_SIZE = int(2.5 * 1024 * 1024)  # 2.5MB
 DATA_UPLOAD_MAX_MEMORY_SIZE = 25 * 1024 * 1024  # 25MB
 
 # Email configuration
@@ -220,6 +225,11 @@ LOGGING = {
             'level': 'INFO',
             'propagate': False,
         },
+        'core.metricas': {
+            'handlers': ['console', 'file'],
+            'level': 'INFO',
+            'propagate': False,
+        },
         'tickets.services': {
             'handlers': ['console', 'file'],
             'level': 'DEBUG',
@@ -243,18 +253,26 @@ if not DEBUG:
     CSRF_COOKIE_SECURE = True
     X_FRAME_OPTIONS = 'DENY'
 
-# Cache configuration (para producción)
+# Caché compartida entre procesos (todos los workers ven las mismas entradas e invalidaciones)
+# en archivos locales, sin servicio externo; ver core/cache.py
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-        'LOCATION': 'unique-snowflake',
+        'BACKEND': 'core.cache.ArchivoCompartidoCache',
+        'LOCATION': BASE_DIR / 'tmp' / 'cache',
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'MAX_ENTRIES': 20000,
+        },
     }
 }
 
 # Session configuration
+# cached_db: las lecturas salen de la caché compartida y solo las escrituras van a la base de datos
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
 SESSION_COOKIE_AGE = 3600  # 1 hora
 SESSION_EXPIRE_AT_BROWSER_CLOSE = True
-SESSION_SAVE_EVERY_REQUEST = True
+# Sin escritura en cada petición: RenovacionSesionMiddleware renueva el vencimiento
+SESSION_SAVE_EVERY_REQUEST = False
 
 # Message framework
 from django.contrib.messages import constants as messages
@@ -287,6 +305,50 @@ TICKET_SETTINGS = {
         'baja': 72,
     },
     'DEFAULT_GUARANTEE_DAYS': 365,  # Días de garantía por defecto
+    'NOTIFICATIONS_ASYNC': True,  # Enviar los correos en hilos de fondo tras el commit
+    'NOTIFICATION_WORKERS': 2,  # Hilos de fondo para el envío de correos
+    'BULK_STATE_CHANGE_MAX': 500,  # Máximo de tickets por cambio de estado masivo
+    'AUTO_CLOSE_RESOLVED_DAYS': 7,  # Días en 'resuelto' tras los que se cierra el ticket
+    'AUTO_CLOSE_WAITING_DAYS': 15,  # Días sin respuesta del cliente en 'en_espera_cliente' antes de cerrar
+    'AUTO_CLOSE_ACTOR': None,  # Usuario que firma los cierres automáticos (None: primer administrador activo)
+    'SLA_REASSIGN_ON_BREACH': True,  # Reasignar al agente con menos carga los tickets que incumplen el SLA
+    'IMAGE_DERIVATIVES': {  # Derivados WebP por campo de Adjunto (ancho, alto máximos)
+        'miniatura': (320, 320),
+        'vista_previa': (1280, 1280),
+    },
+    'IMAGE_DERIVATIVES_QUALITY': 80,  # Calidad WebP de los derivados
+    'IMAGE_DERIVATIVES_ASYNC': True,  # Generar derivados en hilos de fondo (False: usar generar_derivados por cron)
+    'IMAGE_DERIVATIVES_WORKERS': 2,  # Hilos de fondo para generar derivados
+    'DERIVATIVE_CACHE_SECONDS': 31536000,  # Cache-Control de los derivados pedidos con su versión de contenido (1 año)
+    'CHUNKED_UPLOAD_DIR': BASE_DIR / 'tmp' / 'cargas',  # Archivos temporales de subidas fragmentadas
+    'CHUNKED_UPLOAD_CHUNK_MB': 5,  # Tamaño máximo de cada fragmento en MB
+    'CHUNKED_UPLOAD_MAX_SIZE_MB': 500,  # Tamaño máximo de un archivo subido por fragmentos
+    'CHUNKED_UPLOAD_EXPIRY_HOURS': 48,  # Horas sin actividad tras las que se cancela una carga fragmentada
+    'MULTI_UPLOAD_EXPIRY_HOURS': 24,  # Horas tras las que se purgan los registros de AdjuntoMultiple
+    'ORPHAN_GRACE_MINUTES': 60,  # Antigüedad mínima de un archivo sin registro antes de eliminarlo
+    'COLD_STORAGE_DIR': BASE_DIR / 'almacenamiento_frio',  # Archivo comprimido de adjuntos de tickets cerrados
+    'COLD_STORAGE_AFTER_DAYS': 90,  # Días desde el cierre del ticket para mover sus adjuntos al almacenamiento frío
+    'COLD_STORAGE_COMPRESSLEVEL': 6,  # Nivel de compresión gzip del almacenamiento frío
+    'COMPRESS_AT_REST': False,  # Guardar comprimidos con gzip los adjuntos de tipos comprimibles
+    'COMPRESS_AT_REST_LEVEL': 6,  # Nivel de compresión gzip en reposo
+    'COMPRESS_AT_REST_MIN_BYTES': 1024,  # Tamaño mínimo del original para comprimirlo
+    'COMPRESS_AT_REST_MIN_SAVING': 0.1,  # Ahorro mínimo (fracción) para guardar la versión comprimida
+    'REQUEST_METRICS_ENABLED': True,  # Registrar consultas, tiempos y tamaño de cada petición en el log
+    'REQUEST_METRICS_DUPLICATE_THRESHOLD': 3,  # Repeticiones de una misma consulta para avisar de un posible N+1
+    'REQUEST_METRICS_ENDPOINT': False,  # Acumular totales por vista y servirlos en /metricas/ (solo superadmin)
+    'DASHBOARD_CACHE_TEAM_SECONDS': 60,  # Vida en caché de los indicadores compartidos (sin asignar, carga, totales)
+    'DASHBOARD_CACHE_USER_SECONDS': 30,  # Vida en caché de los indicadores personales de cada dashboard
+    'CACHE_LOCK_WAIT_SECONDS': 2,  # Espera máxima al cálculo en curso de otra petición antes de calcular por cuenta propia
+    'SESSION_RENEW_FRACTION': 0.5,  # Fracción de SESSION_COOKIE_AGE tras la que se renueva una sesión en uso
+    'ACTIVITY_TRACKING_ENABLED': True,  # Registrar la última actividad de los usuarios autenticados
+    'ACTIVITY_THROTTLE_MINUTES': 5,  # Como mucho una anotación de actividad por usuario en este intervalo
+    'COMPRESSIBLE_MIME_TYPES': (  # Tipos que se comprimen en reposo (los formatos ya comprimidos no)
+        'text/plain',
+        'application/pdf',
+        'application/msword',
+        'application/vnd.ms-excel',
+        'application/vnd.ms-powerpoint',
+    ),
 }
 
 # Configuración de roles y permisos
@@ -0,0 +1,287 @@
+import json
+import shutil
+import tempfile
+import threading
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .cache import ArchivoCompartidoCache, invalidar, obtener_o_calcular
+from .metricas import MetricasPeticion, agregado_vistas, huella_consulta, medir_consulta, vista_metricas
+from .middleware import MetricasPeticionMiddleware, RenovacionSesionMiddleware
+
+User = get_user_model()
+
+
+class ArchivoCompartidoCacheTest(SimpleTestCase):
+    """add es atómico y no escribe ni recorre el directorio si la clave ya existe"""
+
+    def setUp(self):
+        directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directorio, ignore_errors=True)
+        self.cache = ArchivoCompartidoCache(directorio, {})
+
+    def test_add_solo_la_primera_vez(self):
+        self.assertTrue(self.cache.add('clave', 1))
+        self.assertFalse(self.cache.add('clave', 2))
+        self.assertEqual(self.cache.get('clave'), 1)
+
+    def test_add_sobre_clave_existente_no_escribe(self):
+        self.cache.add('clave', 1)
+        with mock.patch.object(self.cache, '_cull') as purga, \
+                mock.patch('core.cache.tempfile.mkstemp') as temporal:
+            self.assertFalse(self.cache.add('clave', 2))
+        purga.assert_not_called()
+        temporal.assert_not_called()
+
+    def test_add_sobre_clave_caducada(self):
+        self.cache.add('clave', 1, timeout=-1)
+        self.assertTrue(self.cache.add('clave', 2))
+        self.assertEqual(self.cache.get('clave'), 2)
+
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class ObtenerOCalcularTest(SimpleTestCase):
+    """Un único cálculo por clave aunque varias peticiones fallen a la vez"""
+
+    def setUp(self):
+        cache.clear()
+        self.calculos = 0
+
+    def calcular(self):
+        self.calculos += 1
+        return {'total': self.calculos}
+
+    def test_reutiliza_el_valor_hasta_invalidar_la_etiqueta(self):
+        self.assertEqual(obtener_o_calcular('prueba', self.calcular, 60, etiquetas=('grupo',)), {'total': 1})
+        self.assertEqual(obtener_o_calcular('prueba', self.calcular, 60, etiquetas=('grupo',)), {'total': 1})
+
+        invalidar('grupo')
+
+        self.assertEqual(obtener_o_calcular('prueba', self.calcular, 60, etiquetas=('grupo',)), {'total': 2})
+
+    def test_quien_no_obtiene_el_candado_espera_el_resultado(self):
+        empezado, liberar = threading.Event(), threading.Event()
+        resultados = {}
+
+        def calcular_lento():
+            empezado.set()
+            liberar.wait(5)
+            return 'lento'
+
+        def pedir(nombre, calcular):
+            resultados[nombre] = obtener_o_calcular('compartida', calcular, 60, espera=5)
+
+        primero = threading.Thread(target=pedir, args=('primero', calcular_lento))
+        primero.start()
+        empezado.wait(5)
+        segundo = threading.Thread(target=pedir, args=('segundo', self.calcular))
+        segundo.start()
+        liberar.set()
+        primero.join(5)
+        segundo.join(5)
+
+        self.assertEqual(resultados, {'primero': 'lento', 'segundo': 'lento'})
+        self.assertEqual(self.calculos, 0)
+
+    def test_calcula_por_su_cuenta_si_la_espera_vence(self):
+        empezado, liberar = threading.Event(), threading.Event()
+
+        def calcular_bloqueado():
+            empezado.set()
+            liberar.wait(5)
+            return 'tarde'
+
+        bloqueado = threading.Thread(target=obtener_o_calcular, args=('vencida', calcular_bloqueado, 60))
+        bloqueado.start()
+        self.addCleanup(bloqueado.join, 5)
+        self.addCleanup(liberar.set)
+        empezado.wait(5)
+
+        self.assertEqual(obtener_o_calcular('vencida', self.calcular, 60, espera=0.1), {'total': 1})
+
+class HuellaConsultaTest(SimpleTestCase):
+    """La misma consulta con otros parámetros comparte huella"""
+
+    def test_ignora_literales_y_espacios(self):
+        huella, normalizada = huella_consulta("SELECT * FROM t WHERE id = 5 AND nombre = 'ana'")
+
+        self.assertEqual(huella, huella_consulta("SELECT *  FROM t\nWHERE id = 12 AND nombre = 'o''neil'")[0])
+        self.assertEqual(normalizada, 'SELECT * FROM t WHERE id = ? AND nombre = ?')
+        self.assertNotEqual(huella, huella_consulta('SELECT * FROM u WHERE id = 5')[0])
+
+    def test_colapsa_las_listas_in(self):
+        self.assertEqual(
+            huella_consulta('SELECT * FROM t WHERE id IN (%s, %s)'),
+            huella_consulta('SELECT * FROM t WHERE id IN (%s, %s, %s, %s)'),
+        )
+
+    def test_repetidas_a_partir_del_umbral(self):
+        metricas = MetricasPeticion()
+        for numero in range(3):
+            metricas.registrar_consulta(f'SELECT * FROM t WHERE id = {numero}', 0.001)
+        metricas.registrar_consulta('SELECT COUNT(*) FROM t', 0.001)
+
+        self.assertEqual(metricas.consultas, 4)
+        self.assertEqual([veces for _, veces, _ in metricas.repetidas(3)], [3])
+        self.assertEqual(metricas.repetidas(4), [])
+
+
+class MetricasPeticionMiddlewareTest(TestCase):
+    """El middleware cuenta las consultas de la petición y avisa de las repetidas"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuarios = [User.objects.create_user(f'metricas_{numero}', password='x') for numero in range(4)]
+
+    def setUp(self):
+        agregado_vistas.reiniciar()
+        self.addCleanup(agregado_vistas.reiniciar)
+
+    def vista_con_n_mas_1(self, request):
+        for usuario in self.usuarios:
+            User.objects.get(id=usuario.id)
+        User.objects.count()
+        return HttpResponse('ok')
+
+    def test_cuenta_consultas_y_registra_las_repetidas(self):
+        middleware = MetricasPeticionMiddleware(self.vista_con_n_mas_1)
+
+        with self.assertLogs('core.metricas', 'INFO') as registro:
+            middleware(RequestFactory().get('/'))
+
+        self.assertIn('consultas=5', registro.output[0])
+        self.assertIn('repetidas=1', registro.output[0])
+        self.assertIn('consulta_repetida', registro.output[1])
+        self.assertIn('veces=4', registro.output[1])
+
+    def test_acumula_por_vista_solo_con_el_endpoint(self):
+        MetricasPeticionMiddleware(self.vista_con_n_mas_1)(RequestFactory().get('/'))
+        self.assertEqual(agregado_vistas.resumen(), {})
+
+        with override_settings(TICKET_SETTINGS={**settings.TICKET_SETTINGS, 'REQUEST_METRICS_ENDPOINT': True}):
+            middleware = MetricasPeticionMiddleware(self.vista_con_n_mas_1)
+        for _ in range(2):
+            middleware(RequestFactory().get('/'))
+
+        resumen = agregado_vistas.resumen()['-']
+        self.assertEqual(resumen['peticiones'], 2)
+        self.assertEqual(resumen['consultas_max'], 5)
+        self.assertEqual(resumen['peticiones_con_repetidas'], 2)
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    async def test_cuenta_las_consultas_de_vistas_asincronas(self):
+        def como_conexion_previa():
+            # Una conexión abierta antes de importar core.metricas no tiene el wrapper
+            if medir_consulta in connection.execute_wrappers:
+                connection.execute_wrappers.remove(medir_consulta)
+
+        await self.async_client.aforce_login(self.usuarios[0])
+        await sync_to_async(como_conexion_previa)()
+
+        with self.assertLogs('core.metricas', 'INFO') as registro:
+            await self.async_client.get(reverse('accounts:dashboard_datos'))
+
+        consultas = int(registro.output[0].split('consultas=')[1].split()[0])
+        self.assertGreater(consultas, 0)
+
+
+class VistaMetricasTest(TestCase):
+    """/metricas/ solo responde a superadministradores"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.cliente = User.objects.create_user('cliente_metricas', password='x', rol='cliente')
+        cls.admin = User.objects.create_user('admin_metricas', password='x', rol='superadmin')
+
+    def setUp(self):
+        agregado_vistas.reiniciar()
+        self.addCleanup(agregado_vistas.reiniciar)
+
+    def consultar(self, usuario, **parametros):
+        request = RequestFactory().get('/metricas/', parametros)
+        request.user = usuario
+        return vista_metricas(request)
+
+    def test_permisos(self):
+        self.assertEqual(self.consultar(AnonymousUser()).status_code, 403)
+        self.assertEqual(self.consultar(self.cliente).status_code, 403)
+        self.assertEqual(self.consultar(self.admin).status_code, 200)
+
+    def test_resumen_y_reinicio(self):
+        agregado_vistas.registrar('tickets:listar_tickets', 0.02, MetricasPeticion(), [])
+
+        respuesta = self.consultar(self.admin, reiniciar='1')
+
+        self.assertEqual(json.loads(respuesta.content)['vistas']['tickets:listar_tickets']['peticiones'], 1)
+        self.assertEqual(agregado_vistas.resumen(), {})
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class RenovacionSesionMiddlewareTest(TestCase):
+    """La sesión en uso se reescribe una vez por intervalo y no en cada petición"""
+
+    CLAVE = RenovacionSesionMiddleware.CLAVE
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.cliente = User.objects.create_user('cliente_sesion', password='x', rol='cliente')
+
+    def setUp(self):
+        cache.clear()
+        self.url = reverse('accounts:dashboard_datos')
+        self.intervalo = settings.SESSION_COOKIE_AGE * settings.TICKET_SETTINGS['SESSION_RENEW_FRACTION']
+
+    def renueva(self, respuesta):
+        return settings.SESSION_COOKIE_NAME in respuesta.cookies
+
+    def retrasar_renovacion(self, segundos):
+        sesion = self.client.session
+        sesion[self.CLAVE] -= segundos
+        sesion.save()
+
+    def test_renueva_solo_al_cumplirse_el_intervalo(self):
+        self.client.force_login(self.cliente)
+        self.assertTrue(self.renueva(self.client.get(self.url)))
+        self.assertFalse(self.renueva(self.client.get(self.url)))
+
+        self.retrasar_renovacion(self.intervalo - 60)
+        self.assertFalse(self.renueva(self.client.get(self.url)))
+
+        self.retrasar_renovacion(60)
+        self.assertTrue(self.renueva(self.client.get(self.url)))
+
+    def test_no_crea_sesiones_para_anonimos(self):
+        respuesta = self.client.get(self.url)
+
+        self.assertFalse(self.renueva(respuesta))
+
+    async def test_renueva_en_vistas_asincronas(self):
+        await self.async_client.aforce_login(self.cliente)
+
+        primera = await self.async_client.get(self.url)
+        segunda = await self.async_client.get(self.url)
+
+        self.assertTrue(self.renueva(primera))
+        self.assertFalse(self.renueva(segunda))
+
+    def test_anota_la_actividad_sin_escribir_el_usuario(self):
+        from accounts.services import ActividadUsuarioService
+
+        self.client.force_login(self.cliente)
+        with CaptureQueriesContext(connection) as consultas:
+            self.client.get(self.url)
+            self.client.get(self.url)
+
+        self.assertEqual(ActividadUsuarioService.total_pendientes(), 1)
+        self.assertFalse([consulta for consulta in consultas if consulta['sql'].startswith('UPDATE "usuarios"')])
@@ -33,6 +33,11 @@ urlpatterns = [
     path('audit/', include('audit.urls')),
 ]
 
+# Métricas por vista del proceso (ver core.middleware.MetricasPeticionMiddleware)
+if settings.TICKET_SETTINGS.get('REQUEST_METRICS_ENDPOINT'):
+    from core.metricas import vista_metricas
+    urlpatterns.append(path('metricas/', vista_metricas, name='metricas'))
+
 # Servir archivos media en desarrollo
 if settings.DEBUG:
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
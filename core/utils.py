@@ -2,7 +2,12 @@
 Utilidades generales para el sistema de tickets
 """
 import hashlib
+import mimetypes
 import os
+import re
+import unicodedata
+from dataclasses import dataclass
+from types import MappingProxyType
 from django.core.files.storage import default_storage
 from django.conf import settings
 
@@ -44,22 +49,238 @@ def generar_nombre_unico(archivo):
 
 
 
+EXTENSIONES_IMAGEN = frozenset({'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp', '.svg'})
+EXTENSIONES_VIDEO = frozenset({'.mp4', '.avi', '.mov', '.wmv', '.flv', '.webm', '.mkv', '.m4v'})
+EXTENSIONES_DOCUMENTO = frozenset({'.pdf', '.doc', '.docx', '.xls', '.xlsx', '.txt', '.odt', '.ods', '.ppt', '.pptx'})
+
+# Tipos MIME por extensión precalculados (mimetypes no conoce algunos en todas las plataformas)
+MIME_POR_EXTENSION = MappingProxyType({
+    '.jpg': 'image/jpeg', '.jpeg': 'image/jpeg', '.png': 'image/png', '.gif': 'image/gif',
+    '.bmp': 'image/bmp', '.webp': 'image/webp', '.svg': 'image/svg+xml',
+    '.mp4': 'video/mp4', '.m4v': 'video/mp4', '.avi': 'video/x-msvideo', '.mov': 'video/quicktime',
+    '.wmv': 'video/x-ms-wmv', '.flv': 'video/x-flv', '.webm': 'video/webm', '.mkv': 'video/x-matroska',
+    '.pdf': 'application/pdf', '.txt': 'text/plain',
+    '.doc': 'application/msword', '.xls': 'application/vnd.ms-excel', '.ppt': 'application/vnd.ms-powerpoint',
+    '.docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+    '.xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    '.pptx': 'application/vnd.openxmlformats-officedocument.presentationml.presentation',
+    '.odt': 'application/vnd.oasis.opendocument.text',
+    '.ods': 'application/vnd.oasis.opendocument.spreadsheet',
+    '.zip': 'application/zip', '.rar': 'application/vnd.rar', '.7z': 'application/x-7z-compressed',
+})
+
+# Firmas (offset, bytes mágicos, tipo MIME) evaluadas en orden sobre la cabecera del archivo
+FIRMAS_MIME = (
+    (0, b'\xff\xd8\xff', 'image/jpeg'),
+    (0, b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (0, b'GIF87a', 'image/gif'),
+    (0, b'GIF89a', 'image/gif'),
+    (0, b'%PDF-', 'application/pdf'),
+    (0, b'PK\x03\x04', 'application/zip'),
+    (0, b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1', 'application/x-ole-storage'),
+    (0, b'Rar!\x1a\x07', 'application/vnd.rar'),
+    (0, b"7z\xbc\xaf'\x1c", 'application/x-7z-compressed'),
+    (0, b'\x1aE\xdf\xa3', 'video/webm'),
+    (0, b'FLV\x01', 'video/x-flv'),
+    (0, b'0&\xb2u\x8ef\xcf\x11', 'video/x-ms-wmv'),
+    (0, b'\x7fELF', 'application/x-executable'),
+)
+
+# BMP y ejecutables PE tienen firmas de dos bytes ('BM', 'MZ') que también inician textos
+# normales: solo se reconocen si la estructura de la cabecera las confirma
+TAMAÑOS_CABECERA_DIB = frozenset({12, 40, 52, 56, 64, 108, 124})
+
+# Contenedores genéricos cuyo tipo concreto lo indica la extensión (docx es un zip, mkv es EBML...)
+CONTENEDORES_POR_EXTENSION = MappingProxyType({
+    'application/zip': frozenset({'.docx', '.xlsx', '.pptx', '.odt', '.ods'}),
+    'application/x-ole-storage': frozenset({'.doc', '.xls', '.ppt'}),
+    'video/webm': frozenset({'.mkv'}),
+    'video/mp4': frozenset({'.m4v'}),
+    'text/plain': frozenset({'.txt', '.svg'}),
+})
+
+# Contenidos que nunca se aceptan, sin importar la extensión declarada
+# Un script (#!) se trata como texto: no es ejecutable al subirlo y, con otra extensión,
+# lo rechaza la comprobación de coherencia con la extensión
+TIPOS_MIME_PROHIBIDOS = frozenset({'application/x-dosexec', 'application/x-executable'})
+
+TAMAÑO_CABECERA = 8 * 1024
+
+
+@dataclass(frozen=True)
+class InspeccionArchivo:
+    """Resultado de inspeccionar un archivo (reutilizado por validación, almacenamiento y metadatos)"""
+    nombre: str
+    extension: str
+    tipo_mime: str
+    categoria: str
+    detectado_por_contenido: bool
+    coincide_con_extension: bool
+
+    @property
+    def es_prohibido(self):
+        return self.tipo_mime in TIPOS_MIME_PROHIBIDOS
+
+
+def _obtener_nombre(archivo):
+    """Obtiene el nombre de un objeto archivo o de un string (nombre/ruta)"""
+    if hasattr(archivo, 'name'):
+        return archivo.name or ''
+    return str(archivo)
+
+
+def _obtener_extension(archivo):
+    return os.path.splitext(_obtener_nombre(archivo))[1].lower()
+
+
+def categoria_por_extension(extension):
+    """Retorna la categoría (imagen, video, documento, otro) de una extensión"""
+    if extension in EXTENSIONES_IMAGEN:
+        return 'imagen'
+    if extension in EXTENSIONES_VIDEO:
+        return 'video'
+    if extension in EXTENSIONES_DOCUMENTO:
+        return 'documento'
+    return 'otro'
+
+
+def categoria_por_mime(tipo_mime):
+    """Retorna la categoría (imagen, video, documento, otro) de un tipo MIME"""
+    if tipo_mime.startswith('image/'):
+        return 'imagen'
+    if tipo_mime.startswith('video/'):
+        return 'video'
+    if tipo_mime == 'application/pdf' or tipo_mime == 'text/plain' or tipo_mime.startswith((
+        'application/msword', 'application/vnd.ms-', 'application/vnd.openxmlformats', 'application/vnd.oasis',
+    )):
+        return 'documento'
+    return 'otro'
+
+
+def _es_bmp(cabecera):
+    """'BM' seguido de una cabecera DIB de tamaño conocido (offset 14)"""
+    return (
+        cabecera[:2] == b'BM' and len(cabecera) >= 18
+        and int.from_bytes(cabecera[14:18], 'little') in TAMAÑOS_CABECERA_DIB
+    )
+
+
+def _es_ejecutable_pe(cabecera):
+    """'MZ' cuyo e_lfanew (offset 0x3C) apunta a la firma 'PE\\0\\0'"""
+    if cabecera[:2] != b'MZ' or len(cabecera) < 64:
+        return False
+    e_lfanew = int.from_bytes(cabecera[0x3C:0x40], 'little')
+    return cabecera[e_lfanew:e_lfanew + 4] == b'PE\0\0'
+
+
+def _detectar_mime_por_firma(cabecera):
+    """Determina el tipo MIME a partir de los bytes mágicos de la cabecera"""
+    for offset, firma, tipo_mime in FIRMAS_MIME:
+        if cabecera.startswith(firma, offset):
+            return tipo_mime
+    if _es_bmp(cabecera):
+        return 'image/bmp'
+    if _es_ejecutable_pe(cabecera):
+        return 'application/x-dosexec'
+
+    # Contenedores RIFF (WEBP / AVI) e ISO BMFF (MP4 / MOV)
+    if cabecera[:4] == b'RIFF':
+        formato = cabecera[8:12]
+        if formato == b'WEBP':
+            return 'image/webp'
+        if formato == b'AVI ':
+            return 'video/x-msvideo'
+    if cabecera[4:8] == b'ftyp':
+        return 'video/quicktime' if cabecera[8:12] == b'qt  ' else 'video/mp4'
+
+    # Texto: SVG o texto plano (sin bytes nulos y UTF-8 válido)
+    if b'\x00' not in cabecera:
+        try:
+            texto = cabecera.decode('utf-8')
+        except UnicodeDecodeError as e:
+            # La cabecera puede cortar un carácter multibyte al final
+            if e.start < len(cabecera) - 3:
+                return None
+            texto = cabecera[:e.start].decode('utf-8')
+        if '<svg' in texto[:1024].lower():
+            return 'image/svg+xml'
+        return 'text/plain'
+
+    return None
+
+
+def _leer_cabecera(archivo):
+    """Lee los primeros KB de un archivo sin alterar su posición; None si no es legible"""
+    if not hasattr(archivo, 'read'):
+        return None
+    try:
+        posicion = archivo.tell() if hasattr(archivo, 'tell') else 0
+        archivo.seek(0)
+        cabecera = archivo.read(TAMAÑO_CABECERA)
+        archivo.seek(posicion)
+        return cabecera if isinstance(cabecera, bytes) else None
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def inspeccionar_archivo(archivo, leer_contenido=True):
+    """
+    Inspecciona un archivo en una sola pasada: lee la cabecera una vez y determina
+    el tipo MIME real por firma y su categoría
+    El resultado se guarda en el objeto archivo para reutilizarlo en pasos posteriores
+    Args:
+        archivo: Puede ser un string (nombre/ruta) o un objeto archivo
+        leer_contenido: Si es False solo se usa la extensión
+    """
+    previo = getattr(archivo, '_inspeccion', None)
+    if previo is not None:
+        return previo
+
+    nombre = _obtener_nombre(archivo)
+    extension = _obtener_extension(nombre)
+    mime_extension = obtener_tipo_mime(nombre)
+
+    cabecera = _leer_cabecera(archivo) if leer_contenido else None
+    mime_contenido = _detectar_mime_por_firma(cabecera) if cabecera else None
+
+    if mime_contenido is None:
+        tipo_mime = mime_extension
+        coincide = True
+    elif mime_contenido == mime_extension:
+        tipo_mime = mime_contenido
+        coincide = True
+    elif extension in CONTENEDORES_POR_EXTENSION.get(mime_contenido, ()):
+        # Contenedor genérico coherente con la extensión: el tipo concreto lo da la extensión
+        tipo_mime = mime_extension
+        coincide = True
+    else:
+        tipo_mime = mime_contenido
+        coincide = False
+
+    resultado = InspeccionArchivo(
+        nombre=os.path.basename(nombre),
+        extension=extension,
+        tipo_mime=tipo_mime,
+        categoria=categoria_por_mime(tipo_mime) if mime_contenido else categoria_por_extension(extension),
+        detectado_por_contenido=mime_contenido is not None,
+        coincide_con_extension=coincide,
+    )
+
+    if not isinstance(archivo, str):
+        try:
+            archivo._inspeccion = resultado
+        except AttributeError:
+            pass
+    return resultado
+
+
 def es_imagen(archivo):
     """
     Verifica si un archivo es una imagen basándose en su extensión
     Args:
         archivo: Puede ser un string (nombre/ruta) o un objeto archivo
     """
-    # Si es un objeto archivo, obtener el nombre
-    if hasattr(archivo, 'name'):
-        nombre = archivo.name
-    else:
-        # Si es un string, usarlo directamente
-        nombre = str(archivo)
-    
-    extension = os.path.splitext(nombre)[1].lower()
-    extensiones_imagen = ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp', '.svg']
-    return extension in extensiones_imagen
+    return _obtener_extension(archivo) in EXTENSIONES_IMAGEN
 
 
 def es_video(archivo):
@@ -68,16 +289,7 @@ def es_video(archivo):
     Args:
         archivo: Puede ser un string (nombre/ruta) o un objeto archivo
     """
-    # Si es un objeto archivo, obtener el nombre
-    if hasattr(archivo, 'name'):
-        nombre = archivo.name
-    else:
-        # Si es un string, usarlo directamente
-        nombre = str(archivo)
-    
-    extension = os.path.splitext(nombre)[1].lower()
-    extensiones_video = ['.mp4', '.avi', '.mov', '.wmv', '.flv', '.webm', '.mkv', '.m4v']
-    return extension in extensiones_video
+    return _obtener_extension(archivo) in EXTENSIONES_VIDEO
 
 
 def es_documento(archivo):
@@ -86,34 +298,19 @@ def es_documento(archivo):
     Args:
         archivo: Puede ser un string (nombre/ruta) o un objeto archivo
     """
-    # Si es un objeto archivo, obtener el nombre
-    if hasattr(archivo, 'name'):
-        nombre = archivo.name
-    else:
-        # Si es un string, usarlo directamente
-        nombre = str(archivo)
-    
-    extension = os.path.splitext(nombre)[1].lower()
-    extensiones_documento = ['.pdf', '.doc', '.docx', '.xls', '.xlsx', '.txt', '.odt', '.ods', '.ppt', '.pptx']
-    return extension in extensiones_documento
+    return _obtener_extension(archivo) in EXTENSIONES_DOCUMENTO
 
 
 def obtener_tipo_mime(archivo):
     """
-    Obtiene el tipo MIME de un archivo
+    Obtiene el tipo MIME de un archivo según su extensión
     Args:
         archivo: Puede ser un string (nombre/ruta) o un objeto archivo
     """
-    import mimetypes
-    
-    # Si es un objeto archivo, obtener el nombre
-    if hasattr(archivo, 'name'):
-        nombre = archivo.name
-    else:
-        # Si es un string, usarlo directamente
-        nombre = str(archivo)
-    
-    tipo_mime, _ = mimetypes.guess_type(nombre)
+    nombre = _obtener_nombre(archivo)
+    tipo_mime = MIME_POR_EXTENSION.get(_obtener_extension(nombre))
+    if tipo_mime is None:
+        tipo_mime, _ = mimetypes.guess_type(nombre)
     return tipo_mime or 'application/octet-stream'
 
 
@@ -132,4 +329,33 @@ def formatear_tamaño_archivo(tamaño_bytes):
     elif tamaño_bytes < 1024 * 1024 * 1024:
         return f"{tamaño_bytes / (1024 * 1024):.2f} MB"
     else:
-        return f"{tamaño_bytes / (1024 * 1024 * 1024):.2f} GB"
\ No newline at end of file
+        return f"{tamaño_bytes / (1024 * 1024 * 1024):.2f} GB"
+
+_SEPARADORES = re.compile(r'[^0-9A-Z]')
+
+
+def normalizar_identificador(valor):
+    """
+    Normaliza un número de factura o de serie para búsquedas exactas:
+    mayúsculas, sin tildes y sin separadores ("fac-2024/001" -> "FAC2024001")
+    """
+    if not valor:
+        return ''
+    valor = unicodedata.normalize('NFKD', str(valor)).encode('ascii', 'ignore').decode('ascii')
+    return _SEPARADORES.sub('', valor.upper())
+
+
+_ALFABETO_NORMALIZADO = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+
+
+def rango_prefijo(prefijo):
+    """
+    Límites [desde, hasta) que cubren todas las cadenas normalizadas que empiezan
+    por el prefijo; a diferencia de LIKE 'x%' el rango usa el índice en cualquier motor.
+    hasta es None cuando el prefijo no tiene sucesor (solo 'Z')
+    """
+    base = prefijo.rstrip('Z')
+    if not base:
+        return prefijo, None
+    siguiente = _ALFABETO_NORMALIZADO[_ALFABETO_NORMALIZADO.index(base[-1]) + 1]
+    return prefijo, base[:-1] + siguiente
@@ -12,8 +12,8 @@ class CategoriaAdmin(admin.ModelAdmin):
 
 @admin.register(Ticket)
 class TicketAdmin(admin.ModelAdmin):
-    list_display = ('id', 'asunto', 'numero_factura', 'cliente', 'agente', 'estado', 'prioridad', 'created_at')
-    list_filter = ('estado', 'prioridad', 'categoria', 'created_at')
+    list_display = ('id', 'asunto', 'numero_factura', 'cliente', 'agente', 'estado', 'prioridad', 'posible_duplicado', 'created_at')
+    list_filter = ('estado', 'prioridad', 'categoria', 'posible_duplicado', 'created_at')
     search_fields = ('asunto', 'numero_factura', 'cliente__username', 'cliente__email')
     ordering = ('-created_at',)
     readonly_fields = ('id', 'created_at', 'updated_at', 'closed_at')
@@ -0,0 +1,333 @@
+"""
+API JSON para integraciones
+Tickets, comentarios y adjuntos con selección de campos (?fields=),
+paginación por cursor y peticiones condicionales (ETag / Last-Modified),
+más el cambio de estado masivo
+"""
+
+import base64
+import hashlib
+import json
+import uuid
+from functools import wraps
+
+from django.db.models import Count, Max, Min, Q
+from django.http import JsonResponse
+from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from django.utils.dateparse import parse_datetime
+from django.utils.http import http_date
+from django.views.decorators.http import require_GET, require_POST
+
+from attachments.services import PaqueteZipService
+from .models import Ticket, filtro_identificador
+from .services import CambioEstadoMasivoService
+
+LIMITE_DEFECTO = 50
+LIMITE_MAXIMO = 200
+
+# Campo público -> lookup del ORM; solo se consultan las columnas pedidas
+CAMPOS_TICKET = {
+    'id': 'id',
+    'numero_factura': 'numero_factura',
+    'numero_serie': 'numero_serie',
+    'fecha_compra': 'fecha_compra',
+    'posible_duplicado': 'posible_duplicado',
+    'asunto': 'asunto',
+    'descripcion': 'descripcion',
+    'categoria': 'categoria__nombre',
+    'categoria_id': 'categoria_id',
+    'prioridad': 'prioridad',
+    'tipo_reclamo': 'tipo_reclamo',
+    'estado': 'estado',
+    'cliente_id': 'cliente_id',
+    'agente_id': 'agente_id',
+    'tecnico_id': 'tecnico_id',
+    'garantia_vigente': 'garantia_vigente',
+    'fecha_vencimiento_garantia': 'fecha_vencimiento_garantia',
+    'motivo_rechazo': 'motivo_rechazo',
+    'fecha_asignacion': 'fecha_asignacion',
+    'fecha_primera_respuesta': 'fecha_primera_respuesta',
+    'fecha_resolucion': 'fecha_resolucion',
+    'closed_at': 'closed_at',
+    'num_comentarios_publicos': 'num_comentarios_publicos',
+    'ultima_actividad_at': 'ultima_actividad_at',
+    'created_at': 'created_at',
+    'updated_at': 'updated_at',
+}
+CAMPOS_TICKET_DEFECTO = ('id', 'asunto', 'estado', 'prioridad', 'categoria', 'created_at', 'updated_at')
+# Campos que salen de un modelo unido: su updated_at entra en el validador de la página
+MARCAS_TICKET = {'categoria': 'categoria__updated_at'}
+
+CAMPOS_COMENTARIO = {
+    'id': 'id',
+    'ticket_id': 'ticket_id',
+    'autor_id': 'autor_id',
+    'texto': 'texto',
+    'visibilidad': 'visibilidad',
+    'es_respuesta_inicial': 'es_respuesta_inicial',
+    'resuelve_ticket': 'resuelve_ticket',
+    'created_at': 'created_at',
+    'updated_at': 'updated_at',
+}
+CAMPOS_COMENTARIO_DEFECTO = ('id', 'autor_id', 'texto', 'visibilidad', 'created_at')
+
+CAMPOS_ADJUNTO = {
+    'id': 'id',
+    'tipo_objeto': 'tipo_objeto',
+    'objeto_id': 'objeto_id',
+    'nombre_original': 'nombre_original',
+    'tipo_archivo': 'tipo_archivo',
+    'tipo_mime': 'tipo_mime',
+    'tamaño_bytes': 'tamaño_bytes',
+    'checksum': 'checksum',
+    'es_publico': 'es_publico',
+    'descripcion': 'descripcion',
+    'subido_por_id': 'subido_por_id',
+    'created_at': 'created_at',
+    'updated_at': 'updated_at',
+    # Derivado del id, sin columna propia
+    'url_descarga': 'id',
+}
+CAMPOS_ADJUNTO_DEFECTO = ('id', 'nombre_original', 'tipo_archivo', 'tamaño_bytes', 'url_descarga', 'created_at')
+
+
+class ErrorParametros(ValueError):
+    """Parámetro de consulta inválido (respuesta 400)"""
+
+
+def _api_login_required(vista):
+    """Como login_required, pero responde 401 en JSON en lugar de redirigir"""
+    @wraps(vista)
+    def envoltura(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return JsonResponse({'error': 'Autenticación requerida'}, status=401)
+        try:
+            return vista(request, *args, **kwargs)
+        except ErrorParametros as e:
+            return JsonResponse({'error': str(e)}, status=400)
+    return envoltura
+
+
+def _campos_solicitados(request, disponibles, por_defecto):
+    """Lista de campos pedidos en ?fields= validada contra la lista blanca"""
+    parametro = request.GET.get('fields', '').strip()
+    if not parametro:
+        return list(por_defecto)
+
+    campos = list(dict.fromkeys(campo.strip() for campo in parametro.split(',') if campo.strip()))
+    desconocidos = [campo for campo in campos if campo not in disponibles]
+    if desconocidos:
+        raise ErrorParametros(f"Campos no disponibles: {', '.join(desconocidos)}")
+    return campos
+
+
+def _limite(request):
+    try:
+        limite = int(request.GET.get('limite', LIMITE_DEFECTO))
+    except ValueError:
+        raise ErrorParametros('El límite debe ser un número entero')
+    return max(1, min(limite, LIMITE_MAXIMO))
+
+
+def _codificar_cursor(fila):
+    datos = json.dumps([fila['created_at'].isoformat(), str(fila['id'])])
+    return base64.urlsafe_b64encode(datos.encode()).decode().rstrip('=')
+
+
+def _decodificar_cursor(cursor):
+    try:
+        relleno = '=' * (-len(cursor) % 4)
+        created_at, id_ = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+        fecha = parse_datetime(created_at)
+        if fecha is None:
+            raise ValueError
+        return fecha, uuid.UUID(id_)
+    except (ValueError, TypeError):
+        raise ErrorParametros('Cursor inválido')
+
+
+def _validador(request, ventana, marcas):
+    """
+    ETag y Last-Modified de la página a partir de agregados baratos de su ventana
+    (filas, fechas de modificación y extremos de created_at), sin leer ni serializar
+    las columnas pedidas. Los extremos cambian si una fila sale de la ventana y
+    entra otra; las marcas unidas cubren valores como el nombre de la categoría
+    """
+    agregados = ventana.aggregate(
+        total=Count('id'),
+        primera=Min('created_at'),
+        ultima=Max('created_at'),
+        **{f'marca_{indice}': Max(marca) for indice, marca in enumerate(marcas)},
+    )
+    fechas = [agregados[f'marca_{indice}'] for indice in range(len(marcas))]
+    partes = [request.get_full_path(), str(request.user.pk)] + [
+        valor.isoformat() if hasattr(valor, 'isoformat') else str(valor) for valor in agregados.values()
+    ]
+    etag = f'"{hashlib.md5("|".join(partes).encode()).hexdigest()}"'
+    ultima_modificacion = max((fecha for fecha in fechas if fecha), default=None)
+    return etag, ultima_modificacion
+
+
+def _respuesta_paginada(request, queryset, disponibles, por_defecto, descendente=True, marcas_unidas=None):
+    """
+    Respuesta JSON con los campos pedidos de una página del queryset
+    Orden estable por (created_at, id) y cursor opaco para la página siguiente
+    Responde 304 sin consultar la página si no cambió desde el ETag o la fecha del cliente
+    marcas_unidas: campo público -> updated_at del modelo unido del que sale su valor
+    """
+    campos = _campos_solicitados(request, disponibles, por_defecto)
+    limite = _limite(request)
+
+    if descendente:
+        orden = ('-created_at', '-id')
+    else:
+        orden = ('created_at', 'id')
+    pagina = queryset.order_by(*orden)
+
+    cursor = request.GET.get('cursor')
+    if cursor:
+        fecha, id_ = _decodificar_cursor(cursor)
+        if descendente:
+            pagina = pagina.filter(Q(created_at__lt=fecha) | Q(created_at=fecha, id__lt=id_))
+        else:
+            pagina = pagina.filter(Q(created_at__gt=fecha) | Q(created_at=fecha, id__gt=id_))
+
+    marcas = ['updated_at'] + [marca for campo, marca in (marcas_unidas or {}).items() if campo in campos]
+    etag, ultima_modificacion = _validador(request, pagina[:limite + 1], marcas)
+    marca_http = int(ultima_modificacion.timestamp()) if ultima_modificacion else None
+
+    respuesta = get_conditional_response(request, etag=etag, last_modified=marca_http)
+    if respuesta is None:
+        lookups = list(dict.fromkeys([disponibles[campo] for campo in campos] + ['created_at', 'id']))
+        filas = list(pagina.values(*lookups)[:limite + 1])
+
+        siguiente = None
+        if len(filas) > limite:
+            filas = filas[:limite]
+            siguiente = _codificar_cursor(filas[-1])
+
+        resultados = []
+        for fila in filas:
+            resultado = {campo: fila[disponibles[campo]] for campo in campos}
+            if 'url_descarga' in resultado:
+                resultado['url_descarga'] = reverse('attachments:descargar_adjunto', args=[fila['id']])
+            resultados.append(resultado)
+
+        respuesta = JsonResponse({'resultados': resultados, 'siguiente': siguiente})
+
+    respuesta['ETag'] = etag
+    if marca_http is not None:
+        respuesta['Last-Modified'] = http_date(marca_http)
+    # El cliente puede guardar la respuesta pero debe revalidarla siempre
+    respuesta['Cache-Control'] = 'private, no-cache'
+    return respuesta
+
+
+def _ticket_visible(usuario, ticket_id):
+    try:
+        return Ticket.objects.visibles_para(usuario).get(id=ticket_id)
+    except Ticket.DoesNotExist:
+        return None
+
+
+@require_GET
+@_api_login_required
+def api_tickets(request):
+    """
+    Listado de tickets visibles para el usuario
+    Filtros: estado, prioridad, categoria, factura, serie (prefijo con *),
+    modificado_desde (ISO 8601)
+    """
+    tickets = Ticket.objects.visibles_para(request.user)
+
+    for parametro, lookup in (('estado', 'estado'), ('prioridad', 'prioridad')):
+        valor = request.GET.get(parametro, '').strip()
+        if valor:
+            tickets = tickets.filter(**{lookup: valor})
+
+    categoria = request.GET.get('categoria', '').strip()
+    if categoria:
+        try:
+            tickets = tickets.filter(categoria_id=uuid.UUID(categoria))
+        except ValueError:
+            raise ErrorParametros('categoria debe ser un UUID')
+
+    # Factura y serie: exactas sobre el valor normalizado, o por prefijo terminando en *
+    for parametro, campo in (('factura', 'factura_normalizada'), ('serie', 'serie_normalizada')):
+        valor = request.GET.get(parametro, '').strip()
+        if valor:
+            prefijo = valor.endswith('*')
+            tickets = tickets.filter(filtro_identificador(campo, valor.rstrip('*'), prefijo=prefijo))
+
+    modificado_desde = request.GET.get('modificado_desde', '').strip()
+    if modificado_desde:
+        fecha = parse_datetime(modificado_desde)
+        if fecha is None:
+            raise ErrorParametros('modificado_desde debe ser una fecha ISO 8601')
+        tickets = tickets.filter(updated_at__gt=fecha)
+
+    return _respuesta_paginada(
+        request, tickets, CAMPOS_TICKET, CAMPOS_TICKET_DEFECTO, marcas_unidas=MARCAS_TICKET
+    )
+
+
+@require_GET
+@_api_login_required
+def api_comentarios(request, ticket_id):
+    """Comentarios de un ticket en orden cronológico; los clientes solo ven los públicos"""
+    ticket = _ticket_visible(request.user, ticket_id)
+    if ticket is None:
+        return JsonResponse({'error': 'Ticket no encontrado'}, status=404)
+
+    comentarios = ticket.comentarios.all()
+    if request.user.es_cliente():
+        comentarios = comentarios.filter(visibilidad='publico')
+
+    return _respuesta_paginada(
+        request, comentarios, CAMPOS_COMENTARIO, CAMPOS_COMENTARIO_DEFECTO, descendente=False
+    )
+
+
+@require_GET
+@_api_login_required
+def api_adjuntos(request, ticket_id):
+    """Adjuntos del ticket y de sus comentarios visibles para el usuario"""
+    ticket = _ticket_visible(request.user, ticket_id)
+    if ticket is None:
+        return JsonResponse({'error': 'Ticket no encontrado'}, status=404)
+
+    adjuntos = PaqueteZipService.adjuntos_de_ticket(ticket, request.user)
+    return _respuesta_paginada(request, adjuntos, CAMPOS_ADJUNTO, CAMPOS_ADJUNTO_DEFECTO)
+
+
+@require_POST
+@_api_login_required
+def api_cambiar_estado_masivo(request):
+    """
+    Cambia el estado de varios tickets en una transacción
+    Cuerpo: {"tickets": [id, ...], "estado": "...", "motivo": "..."}
+    """
+    if not request.user.puede_gestionar_tickets():
+        return JsonResponse({'error': 'No tienes permisos para cambiar el estado de los tickets'}, status=403)
+
+    try:
+        datos = json.loads(request.body)
+    except ValueError:
+        raise ErrorParametros('El cuerpo debe ser JSON válido')
+
+    ticket_ids = datos.get('tickets') if isinstance(datos, dict) else None
+    if not isinstance(ticket_ids, list) or not ticket_ids:
+        raise ErrorParametros('Debe indicar la lista de tickets')
+
+    try:
+        actualizados, rechazados = CambioEstadoMasivoService.cambiar_estados(
+            ticket_ids, datos.get('estado'), request.user, datos.get('motivo', '')
+        )
+    except ValueError as e:
+        raise ErrorParametros(str(e))
+
+    return JsonResponse({
+        'actualizados': [str(ticket.id) for ticket in actualizados],
+        'rechazados': [{'id': ticket_id, 'motivo': motivo} for ticket_id, motivo in rechazados],
+    })
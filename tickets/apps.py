@@ -4,4 +4,7 @@ from django.apps import AppConfig
 class TicketsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'tickets'
-    verbose_name = 'Gestión de Tickets'
\ No newline at end of file
+    verbose_name = 'Gestión de Tickets'
+
+    def ready(self):
+        import tickets.signals
@@ -0,0 +1,473 @@
+"""
+Generador de datos sintéticos a gran escala (pruebas de carga y benchmarks)
+
+Inserta usuarios, tickets, comentarios, adjuntos y eventos con bulk_create por lotes.
+No pasa por Ticket.save ni dispara señales, así que calcula aquí todo lo que el
+modelo deriva al guardar: identificadores normalizados, fecha límite y estado del SLA,
+garantía, tiempos de respuesta/resolución y contadores desnormalizados
+"""
+import base64
+import hashlib
+import random
+import uuid
+import weakref
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
+
+from attachments.models import DIRECTORIO_COMPARTIDO, Adjunto
+from audit.models import Evento
+from core.utils import normalizar_identificador
+from .models import Categoria, Comentario, Ticket
+
+User = get_user_model()
+
+CATEGORIAS = [
+    # (nombre, días de garantía, peso)
+    ('Hardware', 365, 40),
+    ('Software', 180, 20),
+    ('Redes', 90, 10),
+    ('Producto Defectuoso', 365, 15),
+    ('Entrega', 30, 10),
+    ('Facturación', 30, 5),
+]
+
+PESOS_PRIORIDAD = {'baja': 30, 'media': 45, 'alta': 20, 'critica': 5}
+
+PESOS_TIPO_RECLAMO = {'garantia': 45, 'reclamo': 35, 'consulta': 12, 'devolucion': 8}
+
+# Mezcla de estados según la antigüedad del ticket (días): los viejos están casi todos cerrados
+PESOS_ESTADO_POR_ANTIGUEDAD = [
+    (2, {'abierto': 60, 'en_revision': 30, 'aceptado': 10}),
+    (30, {
+        'abierto': 10, 'en_revision': 20, 'aceptado': 10, 'en_reparacion': 15,
+        'en_espera_cliente': 15, 'resuelto': 20, 'rechazado': 5, 'cerrado': 5,
+    }),
+    (None, {'cerrado': 75, 'rechazado': 10, 'resuelto': 10, 'en_espera_cliente': 5}),
+]
+
+ESTADOS_CON_RESOLUCION = ('resuelto', 'cerrado', 'rechazado')
+
+ASUNTOS = [
+    'Producto llegó dañado',
+    'Pantalla con píxeles muertos',
+    'No enciende después de actualizar',
+    'Batería se descarga muy rápido',
+    'Error en la facturación',
+    'Pedido incompleto',
+    'Ruido extraño al funcionar',
+    'Solicitud de devolución',
+    'Conexión wifi intermitente',
+    'Consulta sobre cobertura de garantía',
+]
+
+DESCRIPCIONES = [
+    'El equipo presenta la falla desde la primera semana de uso.',
+    'Ya probé reiniciarlo y restaurar la configuración de fábrica sin resultado.',
+    'Adjunto la factura y fotos del problema para su revisión.',
+    'Necesito una solución urgente porque lo uso para trabajar.',
+]
+
+TEXTOS_CLIENTE = [
+    '¿Hay novedades sobre mi reclamo?',
+    'Adjunto la información que me solicitaron.',
+    'El problema continúa igual.',
+    'Gracias por la respuesta.',
+]
+
+TEXTOS_AGENTE = [
+    'Recibimos su reclamo, lo estamos revisando.',
+    'Por favor envíenos una foto del número de serie.',
+    'El equipo fue derivado al servicio técnico.',
+    'Se aplicó la solución, quedamos atentos a su confirmación.',
+]
+
+TEXTOS_INTERNOS = [
+    'Revisar historial de reclamos del cliente.',
+    'Falla conocida del lote, aprobar cambio.',
+]
+
+# Archivos de relleno compartidos por todos los adjuntos sintéticos (nombre, tipo, mime, contenido).
+# Van en DIRECTORIO_COMPARTIDO: borrar un adjunto sintético no los elimina
+ARCHIVOS_BASE = [
+    ('factura.pdf', 'documento', 'application/pdf',
+     b'%PDF-1.4\n1 0 obj<<>>endobj\ntrailer<<>>\n%%EOF\n'),
+    ('foto.png', 'imagen', 'image/png', base64.b64decode(
+        'iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mP8z8DwHwAFBQIAX8jx0gAAAABJRU5ErkJggg=='
+    )),
+    ('detalle.txt', 'documento', 'text/plain', 'Detalle del reclamo generado para pruebas.\n'.encode('utf-8') * 20),
+]
+
+
+# Modelos cuyos receptores post_save/post_delete se desconectan con senales_desactivadas()
+MODELOS_CON_SENALES = (Ticket, Comentario, Adjunto)
+
+
+@contextmanager
+def senales_desactivadas(modelos=MODELOS_CON_SENALES):
+    """
+    Desconecta temporalmente los receptores post_save/post_delete de los modelos
+    (auditoría, contadores) para cargas que luego se reparan en bloque
+    """
+    desconectados = []
+    for senal in (post_save, post_delete):
+        for modelo in modelos:
+            for (clave, id_emisor), receptor, *_ in list(senal.receivers):
+                funcion = receptor() if isinstance(receptor, weakref.ReferenceType) else receptor
+                if funcion is None or id_emisor != id(modelo):
+                    continue
+                # La clave es id(receptor) salvo que se conectara con dispatch_uid
+                uid = None if clave == id(funcion) else clave
+                senal.disconnect(funcion, sender=modelo, dispatch_uid=uid)
+                desconectados.append((senal, funcion, modelo, uid))
+    try:
+        yield
+    finally:
+        for senal, funcion, modelo, uid in desconectados:
+            senal.connect(funcion, sender=modelo, dispatch_uid=uid)
+
+
+@contextmanager
+def fechas_manuales(modelos):
+    """
+    Desactiva temporalmente auto_now / auto_now_add para que bulk_create respete
+    las fechas históricas asignadas a cada instancia
+    """
+    campos = [
+        (campo, campo.auto_now, campo.auto_now_add)
+        for modelo in modelos
+        for campo in modelo._meta.concrete_fields
+        if getattr(campo, 'auto_now', False) or getattr(campo, 'auto_now_add', False)
+    ]
+    for campo, _, _ in campos:
+        campo.auto_now = campo.auto_now_add = False
+    try:
+        yield
+    finally:
+        for campo, auto_now, auto_now_add in campos:
+            campo.auto_now, campo.auto_now_add = auto_now, auto_now_add
+
+
+def _elegir(rng, pesos):
+    return rng.choices(list(pesos), weights=list(pesos.values()))[0]
+
+
+class GeneradorDatosSinteticos:
+    """
+    Genera un volumen realista de datos con distribuciones plausibles.
+    Uso:
+        generador = GeneradorDatosSinteticos(semilla=1)
+        generador.generar(tickets=100000, clientes=5000, agentes=40, tecnicos=15)
+    """
+
+    def __init__(self, semilla=None, lote=2000, anios=3, comentarios_por_ticket=3.0,
+                 fraccion_adjuntos=0.3, fraccion_duplicados=0.02, progreso=None):
+        self.rng = random.Random(semilla)
+        self.lote = lote
+        self.anios = anios
+        self.comentarios_por_ticket = comentarios_por_ticket
+        self.fraccion_adjuntos = fraccion_adjuntos
+        self.fraccion_duplicados = fraccion_duplicados
+        self._reclamados = []
+        self.progreso = progreso
+        self.sufijo = uuid.uuid4().hex[:6]
+        self.totales = {'usuarios': 0, 'tickets': 0, 'comentarios': 0, 'adjuntos': 0, 'eventos': 0}
+
+    def generar(self, tickets, clientes, agentes, tecnicos):
+        """Crea usuarios, categorías, archivos base y los tickets con su historia"""
+        self.ahora = timezone.now()
+        self.hoy = self.ahora.date()
+        self.categorias = self.crear_categorias()
+        self.archivos = self.crear_archivos_base()
+        self.clientes = self.crear_usuarios('cliente', clientes)
+        self.agentes = self.crear_usuarios('soporte', agentes)
+        self.tecnicos = self.crear_usuarios('soporte_tecnico', tecnicos)
+
+        creados = 0
+        while creados < tickets:
+            cantidad = min(self.lote, tickets - creados)
+            self._generar_lote(creados, cantidad)
+            creados += cantidad
+            if self.progreso:
+                self.progreso(creados, tickets)
+        return self.totales
+
+    def crear_categorias(self):
+        """Categorías con su peso en la mezcla de tickets (reutiliza las existentes)"""
+        existentes = {c.nombre: c for c in Categoria.objects.all()}
+        nuevas = [
+            Categoria(nombre=nombre, descripcion=f'Categoría {nombre}', dias_garantia_defecto=dias)
+            for nombre, dias, _ in CATEGORIAS if nombre not in existentes
+        ]
+        for categoria in Categoria.objects.bulk_create(nuevas):
+            existentes[categoria.nombre] = categoria
+        return [(existentes[nombre], peso) for nombre, _, peso in CATEGORIAS]
+
+    def crear_archivos_base(self):
+        """Guarda (una sola vez) los archivos de relleno que referencian los adjuntos"""
+        archivos = []
+        for nombre, tipo, mime, contenido in ARCHIVOS_BASE:
+            ruta = f'{DIRECTORIO_COMPARTIDO}/{nombre}'
+            if not default_storage.exists(ruta):
+                ruta = default_storage.save(ruta, ContentFile(contenido))
+            archivos.append({
+                'archivo': ruta,
+                'nombre_original': nombre,
+                'tipo_archivo': tipo,
+                'tipo_mime': mime,
+                'tamaño_bytes': len(contenido),
+                'checksum': hashlib.sha256(contenido).hexdigest(),
+            })
+        return archivos
+
+    def crear_usuarios(self, rol, cantidad):
+        """Usuarios de un rol en bloque; todos comparten la contraseña 'password123'"""
+        clave = make_password('password123')
+        usuarios = []
+        for i in range(cantidad):
+            username = f'{rol}_{self.sufijo}_{i}'
+            usuarios.append(User(
+                username=username,
+                email=f'{username}@example.com',
+                first_name=rol.replace('_', ' ').title(),
+                last_name=str(i),
+                password=clave,
+                rol=rol,
+                max_tickets_simultaneos=self.rng.randint(10, 40) if rol != 'cliente' else 10,
+            ))
+        for inicio in range(0, len(usuarios), self.lote):
+            User.objects.bulk_create(usuarios[inicio:inicio + self.lote])
+        self.totales['usuarios'] += cantidad
+        return usuarios
+
+    def _fecha_creacion(self):
+        # Más densidad en el pasado reciente, como en un sistema que crece
+        segundos = self.anios * 365 * 86400 * (self.rng.random() ** 1.6)
+        return self.ahora - timedelta(seconds=segundos)
+
+    def _entre(self, desde, hasta):
+        if hasta <= desde:
+            return desde
+        return desde + (hasta - desde) * self.rng.random()
+
+    def _estado(self, antiguedad_dias):
+        for limite, pesos in PESOS_ESTADO_POR_ANTIGUEDAD:
+            if limite is None or antiguedad_dias < limite:
+                return _elegir(self.rng, pesos)
+
+    def _nuevo_ticket(self, numero):
+        rng = self.rng
+        creado = self._fecha_creacion()
+        estado = self._estado((self.ahora - creado).days)
+        prioridad = _elegir(rng, PESOS_PRIORIDAD)
+        categoria = rng.choices(*zip(*self.categorias))[0]
+
+        agente = None
+        if estado != 'abierto' or rng.random() < 0.3:
+            agente = rng.choice(self.agentes) if self.agentes else None
+        tecnico = None
+        if self.tecnicos and (estado == 'en_reparacion' or (estado in ('resuelto', 'cerrado') and rng.random() < 0.4)):
+            tecnico = rng.choice(self.tecnicos)
+
+        limite = Ticket.LIMITES_RESPUESTA.get(prioridad, timedelta(hours=24))
+        fecha_asignacion = self._entre(creado, min(creado + timedelta(hours=8), self.ahora)) if agente else None
+        fecha_primera_respuesta = None
+        if agente and estado != 'abierto':
+            # La mayoría responde dentro del plazo del SLA
+            margen = limite * (0.8 if rng.random() < 0.85 else 3)
+            fecha_primera_respuesta = self._entre(fecha_asignacion, min(fecha_asignacion + margen, self.ahora))
+
+        fecha_resolucion = closed_at = None
+        if estado in ESTADOS_CON_RESOLUCION:
+            fecha_resolucion = min(creado + timedelta(days=rng.uniform(0.5, 20)), self.ahora)
+        if estado == 'cerrado':
+            closed_at = min(fecha_resolucion + timedelta(days=rng.uniform(0, 7)), self.ahora)
+
+        fecha_compra = (creado - timedelta(days=rng.randint(5, 700))).date()
+        vencimiento = fecha_compra + timedelta(days=categoria.dias_garantia_defecto)
+        fecha_limite = creado + limite
+
+        numero_factura = f'FAC-{creado.year}-{numero:07d}'
+        numero_serie = f'SN-{rng.getrandbits(40):010X}' if rng.random() < 0.6 else None
+        # Los clientes frecuentes concentran buena parte de los reclamos
+        cliente = self.clientes[int(len(self.clientes) * rng.random() ** 1.3)]
+
+        # Una fracción reclama otra vez una factura/serie ya reclamada (casi siempre el mismo cliente)
+        original = None
+        if self._reclamados and rng.random() < self.fraccion_duplicados:
+            original = rng.choice(self._reclamados)
+            numero_factura, numero_serie = original.numero_factura, original.numero_serie
+            if rng.random() < 0.8:
+                cliente = original.cliente
+
+        ticket = Ticket(
+            numero_factura=numero_factura,
+            numero_serie=numero_serie,
+            factura_normalizada=normalizar_identificador(numero_factura),
+            serie_normalizada=normalizar_identificador(numero_serie),
+            fecha_compra=fecha_compra,
+            asunto=rng.choice(ASUNTOS),
+            descripcion=' '.join(rng.sample(DESCRIPCIONES, 2)),
+            categoria=categoria,
+            prioridad=prioridad,
+            tipo_reclamo=_elegir(rng, PESOS_TIPO_RECLAMO),
+            estado=estado,
+            cliente=cliente,
+            agente=agente,
+            tecnico=tecnico,
+            garantia_vigente=self.hoy <= vencimiento,
+            fecha_vencimiento_garantia=vencimiento,
+            motivo_rechazo='Fuera de garantía' if estado == 'rechazado' else None,
+            created_at=creado,
+            updated_at=closed_at or fecha_resolucion or fecha_primera_respuesta or creado,
+            fecha_asignacion=fecha_asignacion,
+            fecha_primera_respuesta=fecha_primera_respuesta,
+            fecha_resolucion=fecha_resolucion,
+            closed_at=closed_at,
+            tiempo_respuesta_horas=(
+                int((fecha_primera_respuesta - creado).total_seconds() / 3600) if fecha_primera_respuesta else None
+            ),
+            tiempo_resolucion_horas=(
+                int((fecha_resolucion - creado).total_seconds() / 3600) if fecha_resolucion else None
+            ),
+            fecha_limite_respuesta=fecha_limite,
+            # Lo que el monitor de SLA ya habría escalado
+            sla_incumplido=estado in Ticket.ESTADOS_SLA and fecha_limite < self.ahora,
+            ultima_actividad_at=creado,
+            posible_duplicado=original is not None,
+        )
+        ticket._duplicado_de = original
+        if original is None:
+            self._reclamados.append(ticket)
+            if len(self._reclamados) > 5000:
+                del self._reclamados[:1000]
+        return ticket
+
+    def _comentarios(self, ticket):
+        rng = self.rng
+        if ticket.estado == 'abierto' and not ticket.agente_id:
+            cantidad = 1 if rng.random() < 0.2 else 0
+        else:
+            cantidad = min(int(rng.expovariate(1 / self.comentarios_por_ticket)) + 1, 40)
+
+        fin = ticket.closed_at or ticket.fecha_resolucion or self.ahora
+        inicio = ticket.fecha_primera_respuesta or ticket.created_at
+        fechas = sorted(self._entre(inicio, fin) for _ in range(cantidad))
+        if fechas and ticket.fecha_primera_respuesta:
+            fechas[0] = ticket.fecha_primera_respuesta
+        comentarios = []
+        for i, fecha in enumerate(fechas):
+            if not ticket.agente_id:
+                del_agente = False
+            elif i == 0 and ticket.fecha_primera_respuesta:
+                del_agente = True
+            else:
+                del_agente = rng.random() < 0.5
+            privado = del_agente and rng.random() < 0.15
+            if del_agente:
+                autor_id = ticket.agente_id
+                texto = rng.choice(TEXTOS_INTERNOS if privado else TEXTOS_AGENTE)
+            else:
+                autor_id = ticket.cliente_id
+                texto = rng.choice(TEXTOS_CLIENTE)
+            comentarios.append(Comentario(
+                ticket_id=ticket.id,
+                autor_id=autor_id,
+                texto=texto,
+                visibilidad='privado' if privado else 'publico',
+                es_respuesta_inicial=del_agente and i == 0,
+                created_at=fecha,
+                updated_at=fecha,
+            ))
+        return comentarios
+
+    def _adjuntos(self, ticket):
+        if self.rng.random() >= self.fraccion_adjuntos:
+            return []
+        return [
+            Adjunto(
+                objeto_id=ticket.id,
+                tipo_objeto='ticket',
+                subido_por_id=ticket.cliente_id,
+                created_at=ticket.created_at,
+                updated_at=ticket.created_at,
+                **self.rng.choice(self.archivos),
+            )
+            for _ in range(self.rng.randint(1, 3))
+        ]
+
+    def _eventos(self, ticket, comentarios):
+        eventos = [Evento(
+            ticket_id=ticket.id, tipo='creacion', actor_id=ticket.cliente_id,
+            descripcion=f'Ticket creado: {ticket.asunto}', created_at=ticket.created_at,
+        )]
+        if ticket.agente_id:
+            eventos.append(Evento(
+                ticket_id=ticket.id, tipo='asignacion', actor_id=ticket.agente_id,
+                descripcion='Ticket asignado', datos_json={'agente': str(ticket.agente_id)},
+                created_at=ticket.fecha_asignacion,
+            ))
+        if ticket.estado != 'abierto':
+            eventos.append(Evento(
+                ticket_id=ticket.id, tipo='cierre' if ticket.estado == 'cerrado' else 'cambio_estado',
+                actor_id=ticket.agente_id, descripcion=f'Estado cambiado a {ticket.estado}',
+                datos_json={'estado_anterior': 'abierto', 'estado_nuevo': ticket.estado},
+                created_at=ticket.updated_at,
+            ))
+        original = ticket._duplicado_de
+        if original is not None:
+            eventos.append(Evento(
+                ticket_id=ticket.id, tipo='posible_duplicado', created_at=ticket.created_at,
+                descripcion='Factura o número de serie ya reclamados en 1 ticket(s)',
+                datos_json={
+                    'tickets': [str(original.id)],
+                    'coincide_serie': bool(ticket.serie_normalizada),
+                    'otros_clientes': [] if original.cliente_id == ticket.cliente_id else [str(original.cliente_id)],
+                },
+            ))
+        eventos.extend(
+            Evento(
+                ticket_id=ticket.id, tipo='comentario', actor_id=comentario.autor_id,
+                descripcion='Nuevo comentario', datos_json={'comentario_id': str(comentario.id)},
+                created_at=comentario.created_at,
+            )
+            for comentario in comentarios
+        )
+        return eventos
+
+    def _generar_lote(self, desplazamiento, cantidad):
+        tickets, comentarios, adjuntos, eventos = [], [], [], []
+        for i in range(cantidad):
+            ticket = self._nuevo_ticket(desplazamiento + i + 1)
+            de_ticket = self._comentarios(ticket)
+            adjuntos_ticket = self._adjuntos(ticket)
+
+            # Contadores desnormalizados coherentes con lo generado
+            ticket.num_comentarios = len(de_ticket)
+            ticket.num_comentarios_publicos = sum(1 for c in de_ticket if c.visibilidad == 'publico')
+            ticket.num_adjuntos = len(adjuntos_ticket)
+            if de_ticket:
+                ticket.ultima_actividad_at = de_ticket[-1].created_at
+                ticket.updated_at = max(ticket.updated_at, ticket.ultima_actividad_at)
+
+            tickets.append(ticket)
+            comentarios.extend(de_ticket)
+            adjuntos.extend(adjuntos_ticket)
+            eventos.extend(self._eventos(ticket, de_ticket))
+
+        modelos = ((Ticket, tickets), (Comentario, comentarios), (Adjunto, adjuntos), (Evento, eventos))
+        with transaction.atomic(), senales_desactivadas(), fechas_manuales([modelo for modelo, _ in modelos]):
+            for modelo, objetos in modelos:
+                modelo.objects.bulk_create(objetos, batch_size=self.lote)
+
+        self.totales['tickets'] += len(tickets)
+        self.totales['comentarios'] += len(comentarios)
+        self.totales['adjuntos'] += len(adjuntos)
+        self.totales['eventos'] += len(eventos)
@@ -0,0 +1,84 @@
+"""
+Comando de gestión para cerrar tickets inactivos
+Ubicación: tickets/management/commands/cerrar_tickets_inactivos.py
+
+Pensado para ejecutarse desde cron; es idempotente y procesa por lotes.
+
+Uso:
+    python manage.py cerrar_tickets_inactivos
+    python manage.py cerrar_tickets_inactivos --dias-resuelto 10 --dias-espera 30
+    python manage.py cerrar_tickets_inactivos --dry-run
+"""
+
+from django.conf import settings
+from django.core.exceptions import ObjectDoesNotExist
+from django.core.management.base import BaseCommand, CommandError
+
+from tickets.services import CierreAutomaticoService
+
+
+class Command(BaseCommand):
+    help = 'Cierra los tickets resueltos tras el periodo de gracia y los que esperan al cliente sin respuesta'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dias-resuelto',
+            type=int,
+            default=settings.TICKET_SETTINGS.get('AUTO_CLOSE_RESOLVED_DAYS', 7),
+            help="Días en 'resuelto' antes de cerrar (0 = no cerrar resueltos)",
+        )
+        parser.add_argument(
+            '--dias-espera',
+            type=int,
+            default=settings.TICKET_SETTINGS.get('AUTO_CLOSE_WAITING_DAYS', 15),
+            help="Días sin respuesta del cliente en 'en_espera_cliente' (0 = no cerrar)",
+        )
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=200,
+            help='Tickets por transacción',
+        )
+        parser.add_argument(
+            '--usuario',
+            help='Usuario que firma los cierres (por defecto el primer administrador activo)',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Muestra qué se cerraría sin hacer cambios',
+        )
+
+    def handle(self, *args, **options):
+        grupos = []
+        if options['dias_resuelto'] > 0:
+            grupos.append((
+                'resueltos',
+                CierreAutomaticoService.tickets_resueltos_vencidos(options['dias_resuelto']),
+                f"Cierre automático: resuelto hace más de {options['dias_resuelto']} días sin reclamos",
+            ))
+        if options['dias_espera'] > 0:
+            grupos.append((
+                'en espera del cliente',
+                CierreAutomaticoService.tickets_en_espera_vencidos(options['dias_espera']),
+                f"Cierre automático: sin respuesta del cliente en {options['dias_espera']} días",
+            ))
+
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING('Modo DRY-RUN: No se harán cambios\n'))
+            for nombre, tickets, _ in grupos:
+                self.stdout.write(f'Se cerrarían {tickets.count()} tickets {nombre}')
+            return
+
+        try:
+            actor = CierreAutomaticoService.obtener_actor(options['usuario'])
+        except ObjectDoesNotExist:
+            raise CommandError(f"No existe el usuario activo '{options['usuario']}'")
+        if actor is None:
+            raise CommandError('No hay un administrador activo para firmar los cierres; use --usuario')
+
+        for nombre, tickets, motivo in grupos:
+            cerrados, rechazados = CierreAutomaticoService.cerrar(tickets, actor, motivo, lote=options['lote'])
+            self.stdout.write(self.style.SUCCESS(f'✓ Tickets {nombre} cerrados: {cerrados}'))
+            if rechazados:
+                self.stdout.write(self.style.ERROR(f'  No se pudieron cerrar: {rechazados}'))
@@ -1,8 +1,23 @@
-from django.core.management.base import BaseCommand
+"""
+Comando de gestión para crear datos de ejemplo
+Ubicación: tickets/management/commands/crear_datos_ejemplo.py
+
+Uso:
+    python manage.py crear_datos_ejemplo
+    python manage.py crear_datos_ejemplo --sin-senales
+    python manage.py crear_datos_ejemplo --masivo --tickets 1000000 --clientes 50000
+    python manage.py crear_datos_ejemplo --masivo --tickets 200000 --anios 5 --semilla 42
+"""
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
 from django.contrib.auth import get_user_model
+from tickets.datos_sinteticos import GeneradorDatosSinteticos, senales_desactivadas
 from tickets.models import Categoria, Ticket
 from django.utils import timezone
 from datetime import timedelta
+from contextlib import nullcontext
 
 User = get_user_model()
 
@@ -20,11 +35,87 @@ class Command(BaseCommand):
         parser.add_argument(
             '--tickets',
             type=int,
-            default=10,
-            help='Número de tickets de ejemplo a crear'
+            default=None,
+            help='Número de tickets de ejemplo a crear (10 por defecto; 100000 con --masivo)'
+        )
+        parser.add_argument(
+            '--sin-senales',
+            action='store_true',
+            help='No dispara los receptores post_save (auditoría, contadores); luego ejecute reparar_contadores'
         )
 
+        masivo = parser.add_argument_group('Generación masiva (--masivo)')
+        masivo.add_argument(
+            '--masivo',
+            action='store_true',
+            help='Genera un volumen realista con inserciones por lotes (no usa Ticket.save ni señales)'
+        )
+        masivo.add_argument('--clientes', type=int, default=5000, help='Clientes sintéticos')
+        masivo.add_argument('--agentes', type=int, default=40, help='Agentes de soporte sintéticos')
+        masivo.add_argument('--tecnicos', type=int, default=15, help='Técnicos sintéticos')
+        masivo.add_argument('--anios', type=int, default=3, help='Años de historia que abarcan los tickets')
+        masivo.add_argument('--comentarios', type=float, default=3.0, help='Media de comentarios por ticket atendido')
+        masivo.add_argument('--adjuntos', type=float, default=0.3, help='Fracción de tickets con adjuntos')
+        masivo.add_argument('--duplicados', type=float, default=0.02, help='Fracción de reclamos duplicados')
+        masivo.add_argument('--lote', type=int, default=2000, help='Tickets insertados por transacción')
+        masivo.add_argument('--semilla', type=int, default=None, help='Semilla para datos reproducibles')
+
     def handle(self, *args, **options):
+        if options['masivo']:
+            self.generar_masivo(options)
+            return
+
+        if options['tickets'] is None:
+            options['tickets'] = 10
+
+        with senales_desactivadas() if options['sin_senales'] else nullcontext():
+            self.crear_ejemplos(options)
+
+        if options['sin_senales']:
+            self.stdout.write(self.style.WARNING(
+                'Señales desactivadas: ejecute reparar_contadores para actualizar los contadores'
+            ))
+
+    def generar_masivo(self, options):
+        tickets = options['tickets'] if options['tickets'] is not None else 100000
+        if tickets <= 0 or options['clientes'] <= 0:
+            raise CommandError('--tickets y --clientes deben ser mayores que cero')
+
+        inicio = time.perf_counter()
+        ultimo_aviso = [inicio]
+
+        def progreso(creados, total):
+            # Un aviso cada pocos segundos, no uno por lote
+            ahora = time.perf_counter()
+            if creados < total and ahora - ultimo_aviso[0] < 5:
+                return
+            ultimo_aviso[0] = ahora
+            ritmo = creados / (ahora - inicio) if ahora > inicio else 0
+            self.stdout.write(f'⟳ {creados}/{total} tickets ({ritmo:,.0f} tickets/s)')
+
+        self.stdout.write(f'Generando {tickets} tickets sintéticos...')
+        generador = GeneradorDatosSinteticos(
+            semilla=options['semilla'],
+            lote=options['lote'],
+            anios=options['anios'],
+            comentarios_por_ticket=options['comentarios'],
+            fraccion_adjuntos=options['adjuntos'],
+            fraccion_duplicados=options['duplicados'],
+            progreso=progreso,
+        )
+        totales = generador.generar(
+            tickets=tickets,
+            clientes=options['clientes'],
+            agentes=options['agentes'],
+            tecnicos=options['tecnicos'],
+        )
+
+        self.stdout.write(self.style.SUCCESS(f'\n✓ Datos generados en {time.perf_counter() - inicio:.1f}s'))
+        for clave, valor in totales.items():
+            self.stdout.write(f'  {clave}: {valor}')
+        self.stdout.write('  Contraseña de los usuarios generados: password123')
+
+    def crear_ejemplos(self, options):
         self.stdout.write('Creando datos de ejemplo...')
         
         # Crear categorías
@@ -0,0 +1,284 @@
+"""
+Comando de gestión para medir el rendimiento de las rutas críticas sobre datos sintéticos
+Ubicación: tickets/management/commands/medir_rendimiento.py
+
+Crea una base de datos de pruebas desechable (la misma que usa el test runner) y un
+MEDIA_ROOT temporal, la llena con GeneradorDatosSinteticos y cronometra cada escenario
+varias veces. Reporta p50/p95 y número de consultas, y puede guardarlo en JSON para
+comparar entre commits.
+
+Uso:
+    python manage.py medir_rendimiento
+    python manage.py medir_rendimiento --tickets 200000 --repeticiones 20 --salida bench.json
+    python manage.py medir_rendimiento --comparar bench_anterior.json
+    python manage.py medir_rendimiento --escenarios listar dashboard
+"""
+
+import json
+import logging
+import shutil
+import subprocess
+import tempfile
+import time
+import warnings
+from datetime import datetime
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import (
+    CaptureQueriesContext,
+    override_settings,
+    setup_databases,
+    setup_test_environment,
+    teardown_databases,
+    teardown_test_environment,
+)
+from django.urls import reverse
+
+from attachments.models import Adjunto
+from tickets.datos_sinteticos import GeneradorDatosSinteticos
+from tickets.models import Ticket
+from tickets.services import BalanceadorCarga, MetricasService
+
+User = get_user_model()
+
+CACHE_MEDICION = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'medir_rendimiento',
+    }
+}
+
+
+def percentil(valores, p):
+    """Percentil por rango más cercano sobre una lista ordenada"""
+    if not valores:
+        return None
+    indice = max(0, min(len(valores) - 1, round(p / 100 * len(valores) + 0.5) - 1))
+    return valores[indice]
+
+
+def commit_actual():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=settings.BASE_DIR, capture_output=True, text=True, timeout=5,
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = 'Mide p50/p95 y consultas de las rutas críticas sobre una base de datos sintética desechable'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tickets', type=int, default=20000, help='Tickets sintéticos a generar')
+        parser.add_argument('--clientes', type=int, default=2000, help='Clientes sintéticos')
+        parser.add_argument('--agentes', type=int, default=25, help='Agentes de soporte sintéticos')
+        parser.add_argument('--tecnicos', type=int, default=10, help='Técnicos sintéticos')
+        parser.add_argument('--repeticiones', type=int, default=10, help='Mediciones por escenario')
+        parser.add_argument('--calentamiento', type=int, default=1, help='Ejecuciones previas no medidas')
+        parser.add_argument('--semilla', type=int, default=1, help='Semilla del generador (datos reproducibles)')
+        parser.add_argument(
+            '--escenarios',
+            nargs='+',
+            help='Solo los escenarios cuyo nombre contenga alguno de estos textos',
+        )
+        parser.add_argument('--salida', help='Archivo JSON donde guardar los resultados')
+        parser.add_argument('--comparar', help='JSON de una ejecución anterior para mostrar la diferencia')
+
+    def handle(self, *args, **options):
+        anterior = None
+        if options['comparar']:
+            try:
+                with open(options['comparar'], encoding='utf-8') as archivo:
+                    anterior = json.load(archivo)
+            except (OSError, ValueError) as e:
+                raise CommandError(f'No se pudo leer {options["comparar"]}: {e}')
+
+        # Sin el log por petición del middleware de métricas ni el de los servicios
+        # (las notificaciones que dispara redistribuir_carga llenarían la salida)
+        silenciados = [logging.getLogger(nombre) for nombre in ('core.metricas', 'tickets.services', 'django.request')]
+        niveles = [logger.level for logger in silenciados]
+        for logger in silenciados:
+            logger.setLevel(logging.CRITICAL)
+
+        media = tempfile.mkdtemp(prefix='medir_rendimiento_')
+        setup_test_environment()
+        config_bd = setup_databases(verbosity=0, interactive=False)
+        try:
+            # Caché propia: las entradas de la base de datos real compartirían ids con la desechable
+            with override_settings(MEDIA_ROOT=media, CACHES=CACHE_MEDICION):
+                resultados = self.ejecutar(options)
+        finally:
+            teardown_databases(config_bd, verbosity=0)
+            teardown_test_environment()
+            shutil.rmtree(media, ignore_errors=True)
+            for logger, nivel in zip(silenciados, niveles):
+                logger.setLevel(nivel)
+
+        self.mostrar(resultados, anterior)
+
+        if options['salida']:
+            with open(options['salida'], 'w', encoding='utf-8') as archivo:
+                json.dump(resultados, archivo, ensure_ascii=False, indent=2)
+            self.stdout.write(self.style.SUCCESS(f'\n✓ Resultados guardados en {options["salida"]}'))
+
+    def ejecutar(self, options):
+        self.stdout.write(f'⟳ Generando {options["tickets"]} tickets sintéticos...')
+        inicio = time.perf_counter()
+        generador = GeneradorDatosSinteticos(semilla=options['semilla'])
+        totales = generador.generar(
+            tickets=options['tickets'],
+            clientes=options['clientes'],
+            agentes=options['agentes'],
+            tecnicos=options['tecnicos'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ Datos generados en {time.perf_counter() - inicio:.1f}s: '
+            + ', '.join(f'{clave}={valor}' for clave, valor in totales.items())
+        ))
+
+        escenarios = self.escenarios(generador)
+        if options['escenarios']:
+            escenarios = [
+                (nombre, funcion) for nombre, funcion in escenarios
+                if any(filtro in nombre for filtro in options['escenarios'])
+            ]
+
+        medidos = {}
+        for nombre, funcion in escenarios:
+            self.stdout.write(f'⟳ {nombre}')
+            try:
+                medidos[nombre] = self.medir(funcion, options['repeticiones'], options['calentamiento'])
+            except Exception as e:
+                # Un escenario roto no invalida el resto de la medición
+                medidos[nombre] = {'error': f'{type(e).__name__}: {e}'}
+                self.stdout.write(self.style.ERROR(f'✗ {nombre}: {medidos[nombre]["error"]}'))
+
+        return {
+            'fecha': datetime.now().isoformat(timespec='seconds'),
+            'commit': commit_actual(),
+            'base_de_datos': connection.vendor,
+            'parametros': {
+                clave: options[clave]
+                for clave in ('tickets', 'clientes', 'agentes', 'tecnicos', 'repeticiones', 'semilla')
+            },
+            'datos': totales,
+            'escenarios': medidos,
+        }
+
+    def medir(self, funcion, repeticiones, calentamiento):
+        for _ in range(calentamiento):
+            funcion()
+
+        tiempos, consultas = [], []
+        for _ in range(repeticiones):
+            with CaptureQueriesContext(connection) as capturadas:
+                inicio = time.perf_counter()
+                funcion()
+                tiempos.append((time.perf_counter() - inicio) * 1000)
+            consultas.append(len(capturadas))
+
+        tiempos.sort()
+        return {
+            'p50_ms': round(percentil(tiempos, 50), 2),
+            'p95_ms': round(percentil(tiempos, 95), 2),
+            'min_ms': round(tiempos[0], 2),
+            'max_ms': round(tiempos[-1], 2),
+            'consultas': max(consultas),
+        }
+
+    def escenarios(self, generador):
+        """(nombre, función) de cada ruta medida; las vistas pasan por el stack completo"""
+        # El cliente con más tickets, para que su listado y dashboard tengan volumen
+        mayor = Ticket.objects.values('cliente').annotate(total=Count('id')).order_by('-total').first()
+        cliente = User.objects.get(pk=mayor['cliente'])
+        agente = generador.agentes[0]
+        tecnico = generador.tecnicos[0] if generador.tecnicos else None
+        admin = User.objects.create_user(f'admin_{generador.sufijo}', password='password123', rol='superadmin')
+
+        ticket_detalle = Ticket.objects.order_by('-num_comentarios').first()
+        ticket_adjuntos = Ticket.objects.order_by('-num_adjuntos').filter(num_adjuntos__gt=0).first()
+        adjunto = Adjunto.objects.filter(tipo_objeto='ticket').first()
+        factura = ticket_detalle.numero_factura[:-3]
+
+        clientes_http = {}
+
+        def navegador(usuario):
+            if usuario.pk not in clientes_http:
+                http = Client()
+                http.force_login(usuario)
+                clientes_http[usuario.pk] = http
+            return clientes_http[usuario.pk]
+
+        def get(usuario, url, **parametros):
+            def ejecutar():
+                respuesta = navegador(usuario).get(url, parametros)
+                if respuesta.status_code != 200:
+                    raise CommandError(f'{url} respondió {respuesta.status_code}')
+                if respuesta.streaming:
+                    with warnings.catch_warnings():
+                        warnings.simplefilter('ignore')
+                        b''.join(respuesta.streaming_content)
+            return ejecutar
+
+        def redistribuir():
+            # Modifica datos: se deshace para que cada repetición parta del mismo estado
+            with transaction.atomic():
+                BalanceadorCarga.redistribuir_carga()
+                transaction.set_rollback(True)
+
+        listar = reverse('tickets:listar_tickets')
+        escenarios = [
+            ('listar_tickets', get(admin, listar)),
+            ('listar_tickets_cliente', get(cliente, listar)),
+            ('listar_tickets_busqueda_factura', get(admin, listar, busqueda=factura)),
+            ('listar_tickets_busqueda_texto', get(admin, listar, busqueda='pantalla')),
+            ('listar_tickets_filtro_estado', get(admin, listar, estado='en_revision')),
+            ('tickets_sin_asignar', get(agente, reverse('tickets:tickets_sin_asignar'))),
+            ('detalle_ticket', get(admin, reverse('tickets:detalle_ticket', args=[ticket_detalle.id]))),
+            ('estadisticas_tickets', get(admin, reverse('tickets:estadisticas_tickets'))),
+            ('dashboard_cliente', get(cliente, reverse('accounts:dashboard_cliente'))),
+            ('dashboard_soporte', get(agente, reverse('accounts:dashboard_soporte'))),
+            ('dashboard_superadmin', get(admin, reverse('accounts:dashboard_superadmin'))),
+            ('dashboard_datos_soporte', get(agente, reverse('accounts:dashboard_datos'))),
+            ('metricas_generales', MetricasService.obtener_metricas_generales),
+            ('metricas_por_agente', MetricasService.obtener_metricas_por_agente),
+            ('redistribuir_carga', redistribuir),
+        ]
+        if tecnico:
+            escenarios.append(('dashboard_tecnico', get(tecnico, reverse('accounts:dashboard_tecnico'))))
+        if adjunto:
+            escenarios.append((
+                'descargar_adjunto',
+                get(admin, reverse('attachments:descargar_adjunto', args=[adjunto.id])),
+            ))
+        if ticket_adjuntos:
+            escenarios.append((
+                'descargar_zip_ticket',
+                get(admin, reverse('attachments:descargar_zip_ticket', args=[ticket_adjuntos.id])),
+            ))
+        return escenarios
+
+    def mostrar(self, resultados, anterior=None):
+        previos = (anterior or {}).get('escenarios', {})
+        self.stdout.write('')
+        self.stdout.write(f'{"Escenario":<34}{"p50 ms":>10}{"p95 ms":>10}{"consultas":>11}')
+        for nombre, medida in resultados['escenarios'].items():
+            if 'error' in medida:
+                self.stdout.write(self.style.ERROR(f'{nombre:<34}{"error":>10}'))
+                continue
+            linea = f'{nombre:<34}{medida["p50_ms"]:>10.1f}{medida["p95_ms"]:>10.1f}{medida["consultas"]:>11}'
+            previo = previos.get(nombre)
+            if previo and previo.get('p50_ms'):
+                cambio = (medida['p50_ms'] - previo['p50_ms']) / previo['p50_ms'] * 100
+                consultas = medida['consultas'] - previo['consultas']
+                texto = f'   p50 {cambio:+.0f}%  consultas {consultas:+d}'
+                estilo = self.style.SUCCESS if cambio <= 0 else self.style.WARNING
+                linea += estilo(texto)
+            self.stdout.write(linea)
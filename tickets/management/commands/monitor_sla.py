@@ -0,0 +1,68 @@
+"""
+Comando de gestión para detectar y escalar incumplimientos de SLA
+Ubicación: tickets/management/commands/monitor_sla.py
+
+Pensado para ejecutarse cada minuto desde cron: solo consulta los tickets
+no escalados cuya fecha límite de respuesta ya pasó.
+
+Uso:
+    python manage.py monitor_sla
+    python manage.py monitor_sla --sin-reasignar
+    python manage.py monitor_sla --dry-run
+"""
+
+from django.core.management.base import BaseCommand
+
+from tickets.services import MonitorSLAService
+
+
+class Command(BaseCommand):
+    help = 'Escala los tickets que superaron su tiempo límite de respuesta'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=500,
+            help='Tickets por transacción',
+        )
+        parser.add_argument(
+            '--sin-reasignar',
+            action='store_true',
+            help='Sube la prioridad y notifica sin cambiar el agente',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Muestra los incumplimientos sin hacer cambios',
+        )
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING('Modo DRY-RUN: No se harán cambios\n'))
+            tickets = MonitorSLAService.tickets_incumplidos().order_by('fecha_limite_respuesta')
+            total = 0
+            for ticket in tickets.only('id', 'asunto', 'prioridad', 'fecha_limite_respuesta').iterator():
+                total += 1
+                self.stdout.write(
+                    f'  #{str(ticket.id)[:8]} {ticket.asunto[:50]} '
+                    f'({ticket.prioridad}, límite {ticket.fecha_limite_respuesta:%d/%m/%Y %H:%M})'
+                )
+            self.stdout.write(f'Se escalarían {total} tickets')
+            return
+
+        reasignar = False if options['sin_reasignar'] else None
+        escalados = 0
+        reasignados = 0
+
+        while True:
+            tickets, cantidad_reasignados = MonitorSLAService.escalar(lote=options['lote'], reasignar=reasignar)
+            escalados += len(tickets)
+            reasignados += cantidad_reasignados
+            if len(tickets) < options['lote']:
+                break
+
+        if escalados:
+            self.stdout.write(self.style.WARNING(f'⟳ Tickets escalados: {escalados} (reasignados: {reasignados})'))
+        else:
+            self.stdout.write(self.style.SUCCESS('✓ Sin incumplimientos nuevos de SLA'))
@@ -0,0 +1,58 @@
+"""
+Comando de gestión para recalcular la garantía de los tickets abiertos
+Ubicación: tickets/management/commands/recalcular_garantias.py
+
+Pensado para ejecutarse cada noche desde cron: actualiza la vigencia de las
+garantías que vencieron con el cambio de día.
+
+Uso:
+    python manage.py recalcular_garantias
+    python manage.py recalcular_garantias --completo
+    python manage.py recalcular_garantias --dry-run
+"""
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from tickets.models import Categoria, Ticket
+from tickets.services import ValidadorGarantia
+
+
+class Command(BaseCommand):
+    help = 'Actualiza la vigencia de garantía de los tickets abiertos (una sentencia UPDATE por paso)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--completo',
+            action='store_true',
+            help='Recalcula también el vencimiento con los días de garantía actuales de cada categoría',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Muestra cuántos tickets cambiarían sin hacer cambios',
+        )
+
+    def handle(self, *args, **options):
+        hoy = timezone.now().date()
+
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING('Modo DRY-RUN: No se harán cambios\n'))
+            abiertos = Ticket.objects.exclude(estado__in=ValidadorGarantia.ESTADOS_FINALES)
+            vencidas = abiertos.filter(garantia_vigente=True, fecha_vencimiento_garantia__lt=hoy).count()
+            self.stdout.write(f'Garantías que vencerían hoy: {vencidas}')
+            return
+
+        with transaction.atomic():
+            if options['completo']:
+                total = 0
+                for categoria in Categoria.objects.all():
+                    total += ValidadorGarantia.recalcular_categoria(categoria, hoy)
+                self.stdout.write(self.style.SUCCESS(f'✓ Vencimientos recalculados: {total} tickets'))
+
+            vencidas, reactivadas = ValidadorGarantia.recalcular_vigencias(hoy)
+
+        self.stdout.write(self.style.SUCCESS(f'✓ Garantías vencidas: {vencidas}'))
+        if reactivadas:
+            self.stdout.write(self.style.WARNING(f'⟳ Garantías reactivadas: {reactivadas}'))
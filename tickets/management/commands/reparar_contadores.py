@@ -0,0 +1,44 @@
+"""
+Comando de gestión para recalcular los contadores desnormalizados de los tickets
+Ubicación: tickets/management/commands/reparar_contadores.py
+
+Uso:
+    python manage.py reparar_contadores
+    python manage.py reparar_contadores --lote 1000
+    python manage.py reparar_contadores --dry-run
+"""
+
+from django.core.management.base import BaseCommand
+
+from tickets.services import ContadoresTicketService
+
+
+class Command(BaseCommand):
+    help = 'Corrige num_comentarios, num_comentarios_publicos, num_adjuntos y ultima_actividad_at de los tickets'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=500,
+            help='Tickets revisados por consulta',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Muestra cuántos tickets tienen contadores desfasados sin corregirlos',
+        )
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING('Modo DRY-RUN: No se harán cambios\n'))
+
+        revisados, corregidos = ContadoresTicketService.reparar(lote=options['lote'], dry_run=options['dry_run'])
+
+        self.stdout.write(f'Tickets revisados: {revisados}')
+        if not corregidos:
+            self.stdout.write(self.style.SUCCESS('✓ Todos los contadores están al día'))
+        elif options['dry_run']:
+            self.stdout.write(self.style.WARNING(f'Se corregirían {corregidos} tickets'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'✓ Tickets corregidos: {corregidos}'))
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.5 on 2026-10-19 11:28
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0002_remove_comentario_tickets_com_ticket__c2a0c7_idx_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ticket',
+            name='fecha_limite_respuesta',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Fecha Límite de Respuesta'),
+        ),
+        migrations.AddField(
+            model_name='ticket',
+            name='sla_incumplido',
+            field=models.BooleanField(default=False, verbose_name='SLA Incumplido'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(condition=models.Q(('sla_incumplido', False)), fields=['estado', 'fecha_limite_respuesta'], name='tickets_sla_pendiente_idx'),
+        ),
+    ]
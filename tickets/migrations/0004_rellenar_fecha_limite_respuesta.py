@@ -0,0 +1,35 @@
+# Generated by Django 5.2.5 on 2026-10-19 11:28
+
+from datetime import timedelta
+
+from django.db import migrations
+from django.db.models import F
+
+# Copia de Ticket.LIMITES_RESPUESTA al momento de la migración
+LIMITES_RESPUESTA = {
+    'critica': timedelta(hours=1),
+    'alta': timedelta(hours=4),
+    'media': timedelta(hours=24),
+    'baja': timedelta(hours=72),
+}
+
+
+def rellenar_fecha_limite(apps, schema_editor):
+    """Una sentencia UPDATE por prioridad en lugar de guardar ticket por ticket"""
+    Ticket = apps.get_model('tickets', 'Ticket')
+    for prioridad, limite in LIMITES_RESPUESTA.items():
+        Ticket.objects.filter(prioridad=prioridad).update(fecha_limite_respuesta=F('created_at') + limite)
+    Ticket.objects.exclude(prioridad__in=LIMITES_RESPUESTA).update(
+        fecha_limite_respuesta=F('created_at') + timedelta(hours=24)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0003_ticket_fecha_limite_respuesta_ticket_sla_incumplido_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(rellenar_fecha_limite, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.5 on 2026-10-19 11:31
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0004_rellenar_fecha_limite_respuesta'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='ticket',
+            name='tickets_tic_numero__def7c2_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='ticket',
+            name='tickets_tic_numero__93cb21_idx',
+        ),
+        migrations.AddField(
+            model_name='ticket',
+            name='factura_normalizada',
+            field=models.CharField(blank=True, default='', editable=False, max_length=50, verbose_name='Factura Normalizada'),
+        ),
+        migrations.AddField(
+            model_name='ticket',
+            name='posible_duplicado',
+            field=models.BooleanField(default=False, verbose_name='Posible Reclamo Duplicado'),
+        ),
+        migrations.AddField(
+            model_name='ticket',
+            name='serie_normalizada',
+            field=models.CharField(blank=True, default='', editable=False, max_length=100, verbose_name='Serie Normalizada'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['factura_normalizada'], name='tickets_tic_factura_b9cf12_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['serie_normalizada'], name='tickets_tic_serie_n_4f9da5_idx'),
+        ),
+    ]
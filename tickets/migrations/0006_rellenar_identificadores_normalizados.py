@@ -0,0 +1,31 @@
+# Generated by Django 5.2.5 on 2026-10-19 11:31
+
+from django.db import migrations
+
+from core.utils import normalizar_identificador
+
+
+def rellenar_identificadores(apps, schema_editor):
+    """Normaliza factura y serie de los tickets existentes por lotes"""
+    Ticket = apps.get_model('tickets', 'Ticket')
+    lote = []
+    for ticket in Ticket.objects.only('id', 'numero_factura', 'numero_serie').iterator(chunk_size=2000):
+        ticket.factura_normalizada = normalizar_identificador(ticket.numero_factura)
+        ticket.serie_normalizada = normalizar_identificador(ticket.numero_serie)
+        lote.append(ticket)
+        if len(lote) >= 2000:
+            Ticket.objects.bulk_update(lote, ['factura_normalizada', 'serie_normalizada'])
+            lote = []
+    if lote:
+        Ticket.objects.bulk_update(lote, ['factura_normalizada', 'serie_normalizada'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0005_remove_ticket_tickets_tic_numero__def7c2_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(rellenar_identificadores, migrations.RunPython.noop),
+    ]
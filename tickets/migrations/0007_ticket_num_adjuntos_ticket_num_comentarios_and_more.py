@@ -0,0 +1,33 @@
+# Generated by Django 5.2.5 on 2026-10-19 11:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0006_rellenar_identificadores_normalizados'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ticket',
+            name='num_adjuntos',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Adjuntos'),
+        ),
+        migrations.AddField(
+            model_name='ticket',
+            name='num_comentarios',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Comentarios'),
+        ),
+        migrations.AddField(
+            model_name='ticket',
+            name='num_comentarios_publicos',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Comentarios Públicos'),
+        ),
+        migrations.AddField(
+            model_name='ticket',
+            name='ultima_actividad_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Última Actividad'),
+        ),
+    ]
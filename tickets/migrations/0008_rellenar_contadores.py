@@ -0,0 +1,49 @@
+# Generated by Django 5.2.5 on 2026-10-19 11:35
+
+from django.db import migrations
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+
+def rellenar_contadores(apps, schema_editor):
+    """Calcula los contadores de todos los tickets con una sola sentencia UPDATE"""
+    Ticket = apps.get_model('tickets', 'Ticket')
+    Comentario = apps.get_model('tickets', 'Comentario')
+    Adjunto = apps.get_model('attachments', 'Adjunto')
+
+    def contar(queryset, campo):
+        return Coalesce(
+            Subquery(queryset.values(campo).annotate(total=Count('id')).values('total')[:1]),
+            Value(0),
+        )
+
+    def ultima(queryset):
+        return Coalesce(Subquery(queryset.order_by('-created_at').values('created_at')[:1]), F('created_at'))
+
+    comentarios = Comentario.objects.filter(ticket=OuterRef('pk'))
+    adjuntos_ticket = Adjunto.objects.filter(tipo_objeto='ticket', objeto_id=OuterRef('pk'))
+    adjuntos_comentarios = Adjunto.objects.filter(
+        tipo_objeto='comentario',
+        objeto_id__in=Comentario.objects.filter(ticket=OuterRef(OuterRef('pk'))).values('id'),
+    )
+
+    Ticket.objects.update(
+        num_comentarios=contar(comentarios, 'ticket'),
+        num_comentarios_publicos=contar(comentarios.filter(visibilidad='publico'), 'ticket'),
+        num_adjuntos=contar(adjuntos_ticket, 'tipo_objeto') + contar(adjuntos_comentarios, 'tipo_objeto'),
+        ultima_actividad_at=Greatest(
+            F('created_at'), ultima(comentarios), ultima(adjuntos_ticket), ultima(adjuntos_comentarios)
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0007_ticket_num_adjuntos_ticket_num_comentarios_and_more'),
+        ('attachments', '0008_codificacion_adjunto'),
+    ]
+
+    operations = [
+        migrations.RunPython(rellenar_contadores, migrations.RunPython.noop),
+    ]
@@ -4,6 +4,8 @@ from django.contrib.auth import get_user_model
 from django.utils import timezone
 from datetime import timedelta, datetime
 
+from core.utils import normalizar_identificador, rango_prefijo
+
 User = get_user_model()
 
 
@@ -41,10 +43,72 @@ class Categoria(models.Model):
     def __str__(self):
         return self.nombre
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        instancia._dias_garantia_original = instancia.__dict__.get('dias_garantia_defecto')
+        return instancia
+
+    def save(self, *args, **kwargs):
+        dias_cambiaron = (
+            not self._state.adding
+            and getattr(self, '_dias_garantia_original', None) != self.dias_garantia_defecto
+        )
+        super().save(*args, **kwargs)
+        self._dias_garantia_original = self.dias_garantia_defecto
+
+        # Un único UPDATE sobre los tickets de la categoría en lugar de guardarlos uno a uno
+        if dias_cambiaron:
+            from .services import ValidadorGarantia
+            ValidadorGarantia.recalcular_categoria(self)
+
+
+def filtro_identificador(campo, valor, prefijo=False):
+    """
+    Condición sobre factura_normalizada / serie_normalizada que usa su índice:
+    igualdad exacta o, con prefijo=True, un rango [prefijo, sucesor)
+    """
+    valor = normalizar_identificador(valor)
+    if not valor:
+        return models.Q(pk__in=[])
+    if not prefijo:
+        return models.Q(**{campo: valor})
+    desde, hasta = rango_prefijo(valor)
+    condicion = models.Q(**{f'{campo}__gte': desde})
+    if hasta:
+        condicion &= models.Q(**{f'{campo}__lt': hasta})
+    return condicion
+
+
+def orden_listado(orden):
+    """
+    Expresiones de order_by para una ordenación de Ticket.ORDENES_LISTADO.
+    'reciente' y 'actividad' recorren los índices compuestos (filtro, -fecha);
+    'urgencia' pone primero los tickets con SLA en curso y los ordena por fecha límite
+    """
+    if orden == 'actividad':
+        return ('-ultima_actividad_at',)
+    if orden == 'urgencia':
+        en_curso = models.Case(
+            models.When(estado__in=Ticket.ESTADOS_SLA, then=models.Value(0)),
+            default=models.Value(1),
+            output_field=models.IntegerField(),
+        )
+        return (en_curso.asc(), 'fecha_limite_respuesta')
+    return ('-created_at',)
+
 
 class TicketManager(models.Manager):
     """Manager personalizado para el modelo Ticket"""
 
+    def por_factura(self, numero_factura, prefijo=False):
+        """Tickets por número de factura normalizado (exacto o por prefijo)"""
+        return self.filter(filtro_identificador('factura_normalizada', numero_factura, prefijo))
+
+    def por_serie(self, numero_serie, prefijo=False):
+        """Tickets por número de serie normalizado (exacto o por prefijo)"""
+        return self.filter(filtro_identificador('serie_normalizada', numero_serie, prefijo))
+
     def abiertos(self):
         """Retorna tickets abiertos"""
         return self.filter(estado='abierto')
@@ -89,6 +153,14 @@ class TicketManager(models.Manager):
         """Retorna tickets sin asignar"""
         return self.filter(agente__isnull=True, estado='abierto')
 
+    def visibles_para(self, usuario):
+        """Retorna los tickets que el usuario puede consultar según su rol"""
+        if usuario.es_cliente():
+            return self.filter(cliente=usuario)
+        if usuario.es_empleado():
+            return self.filter(models.Q(agente=usuario) | models.Q(agente__isnull=True))
+        return self.all()
+
     def por_prioridad(self, prioridad):
         """Retorna tickets por prioridad"""
         return self.filter(prioridad=prioridad)
@@ -121,6 +193,24 @@ class Ticket(models.Model):
         ('cerrado', 'Cerrado'),
     ]
 
+    # Estados en los que corre el reloj del SLA (en espera del cliente se pausa)
+    ESTADOS_SLA = ('abierto', 'en_revision', 'aceptado', 'en_reparacion')
+
+    # Ordenaciones disponibles en los listados
+    ORDENES_LISTADO = [
+        ('reciente', 'Más recientes'),
+        ('actividad', 'Última actividad'),
+        ('urgencia', 'Urgencia'),
+    ]
+
+    # Tiempo límite de respuesta según la prioridad
+    LIMITES_RESPUESTA = {
+        'critica': timedelta(hours=1),
+        'alta': timedelta(hours=4),
+        'media': timedelta(hours=24),
+        'baja': timedelta(hours=72),
+    }
+
     PRIORIDADES = [
         ('baja', 'Baja'),
         ('media', 'Media'),
@@ -142,6 +232,11 @@ class Ticket(models.Model):
     numero_serie = models.CharField(max_length=100, blank=True, null=True, verbose_name='Número de Serie')
     fecha_compra = models.DateField(blank=True, null=True, verbose_name='Fecha de Compra')
 
+    # Factura y serie normalizadas (mayúsculas, sin separadores) para búsquedas indexadas
+    factura_normalizada = models.CharField(max_length=50, blank=True, default='', editable=False, verbose_name='Factura Normalizada')
+    serie_normalizada = models.CharField(max_length=100, blank=True, default='', editable=False, verbose_name='Serie Normalizada')
+    posible_duplicado = models.BooleanField(default=False, verbose_name='Posible Reclamo Duplicado')
+
     asunto = models.CharField(max_length=200, verbose_name='Asunto')
     descripcion = models.TextField(verbose_name='Descripción del Problema')
 
@@ -175,6 +270,16 @@ class Ticket(models.Model):
     fecha_resolucion = models.DateTimeField(blank=True, null=True, verbose_name='Fecha de Resolución')
     closed_at = models.DateTimeField(blank=True, null=True, verbose_name='Fecha de Cierre')
 
+    # Contadores desnormalizados (ContadoresTicketService los mantiene con F())
+    num_comentarios = models.PositiveIntegerField(default=0, editable=False, verbose_name='Comentarios')
+    num_comentarios_publicos = models.PositiveIntegerField(default=0, editable=False, verbose_name='Comentarios Públicos')
+    num_adjuntos = models.PositiveIntegerField(default=0, editable=False, verbose_name='Adjuntos')
+    ultima_actividad_at = models.DateTimeField(blank=True, null=True, editable=False, verbose_name='Última Actividad')
+
+    # SLA: fecha límite persistida para que el monitor use el índice en lugar de recalcularla
+    fecha_limite_respuesta = models.DateTimeField(blank=True, null=True, editable=False, verbose_name='Fecha Límite de Respuesta')
+    sla_incumplido = models.BooleanField(default=False, verbose_name='SLA Incumplido')
+
     # Métricas
     tiempo_respuesta_horas = models.PositiveIntegerField(blank=True, null=True, verbose_name='Tiempo de Respuesta (horas)')
     tiempo_resolucion_horas = models.PositiveIntegerField(blank=True, null=True, verbose_name='Tiempo de Resolución (horas)')
@@ -186,42 +291,153 @@ class Ticket(models.Model):
         verbose_name_plural = 'Tickets'
         ordering = ['-created_at']
         indexes = [
-            models.Index(fields=['estado']),
             models.Index(fields=['prioridad']),
-            models.Index(fields=['cliente']),
-            models.Index(fields=['agente']),
-            models.Index(fields=['tecnico']),
             models.Index(fields=['created_at']),
-            models.Index(fields=['numero_factura']),
-            models.Index(fields=['numero_serie']),
+            models.Index(fields=['ultima_actividad_at']),
+            # Filtro + orden de los listados: la igualdad va primero y la columna de orden
+            # después, así el motor recorre el índice ya ordenado y corta en la página pedida
+            models.Index(fields=['estado', '-created_at'], name='tickets_estado_creado_idx'),
+            models.Index(fields=['cliente', '-created_at'], name='tickets_cliente_creado_idx'),
+            models.Index(fields=['cliente', '-ultima_actividad_at'], name='tickets_cliente_activ_idx'),
+            models.Index(fields=['agente', '-created_at'], name='tickets_agente_creado_idx'),
+            models.Index(fields=['agente', '-ultima_actividad_at'], name='tickets_agente_activ_idx'),
+            models.Index(fields=['tecnico', '-updated_at'], name='tickets_tecnico_modif_idx'),
+            # Bandeja de tickets sin asignar (agente IS NULL AND tecnico IS NULL AND estado = ?).
+            # Compuesto y no parcial: Django pasa 'abierto' como parámetro y SQLite no puede
+            # comprobar con parámetros que la consulta cumple la condición de un índice parcial
+            models.Index(fields=['agente', 'tecnico', 'estado', '-created_at'], name='tickets_sin_asignar_idx'),
+            models.Index(fields=['factura_normalizada']),
+            models.Index(fields=['serie_normalizada']),
+            # Solo los tickets aún no escalados: el monitor de SLA lee únicamente los nuevos incumplimientos
+            models.Index(
+                fields=['estado', 'fecha_limite_respuesta'],
+                condition=models.Q(sla_incumplido=False),
+                name='tickets_sla_pendiente_idx',
+            ),
         ]
 
+    # Campos que save() recalcula a partir de otros
+    CAMPOS_DERIVADOS = frozenset({
+        'fecha_limite_respuesta', 'factura_normalizada', 'serie_normalizada',
+        'garantia_vigente', 'fecha_vencimiento_garantia', 'closed_at', 'fecha_resolucion',
+        'tiempo_respuesta_horas', 'tiempo_resolucion_horas',
+    })
+
     def __str__(self):
         return f"Ticket #{str(self.id)[:8]} - {self.asunto}"
 
     def save(self, *args, **kwargs):
-        # Actualizar fecha de cierre cuando el estado cambia a cerrado
+        nuevo = self._state.adding
+        modificados = set() if nuevo else self.campos_modificados()
+
+        def cambio(*campos):
+            return nuevo or not modificados.isdisjoint(campos)
+
+        self.calcular_fechas_derivadas()
+
+        # Los campos derivados solo se recalculan si cambiaron sus datos de origen
+        if cambio('prioridad') or not self.fecha_limite_respuesta:
+            self.fecha_limite_respuesta = self.calcular_fecha_limite_respuesta()
+
+        if cambio('numero_factura', 'numero_serie'):
+            self.factura_normalizada = normalizar_identificador(self.numero_factura)
+            self.serie_normalizada = normalizar_identificador(self.numero_serie)
+
+        if nuevo and not self.ultima_actividad_at:
+            self.ultima_actividad_at = timezone.now()
+
+        # Detección de reclamos duplicados con una búsqueda indexada al crear el ticket
+        duplicados = []
+        if nuevo:
+            from .services import DetectorDuplicados
+            duplicados = DetectorDuplicados.buscar(self)
+            self.posible_duplicado = bool(duplicados)
+
+        # Validar garantía: el vencimiento solo se recalcula (y se consulta la categoría)
+        # si cambió la fecha de compra o la categoría; la vigencia sale del vencimiento
+        if cambio('fecha_compra', 'categoria'):
+            self.calcular_garantia()
+        elif self.fecha_vencimiento_garantia:
+            self.garantia_vigente = timezone.now().date() <= self.fecha_vencimiento_garantia
+
+        # Ticket existente: escribir solo las columnas modificadas, o nada si no hay cambios
+        if not nuevo and not args and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            modificados = self.campos_modificados()
+            if not modificados:
+                return
+            kwargs['update_fields'] = modificados | {'updated_at'}
+        elif not nuevo and kwargs.get('update_fields'):
+            # Con update_fields explícito, los derivados recalculados arriba también se escriben
+            derivados = self.campos_modificados() & self.CAMPOS_DERIVADOS
+            if derivados:
+                kwargs['update_fields'] = set(kwargs['update_fields']) | derivados
+
+        super().save(*args, **kwargs)
+        self._guardar_originales()
+
+        if duplicados:
+            DetectorDuplicados.registrar(self, duplicados)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        instancia._guardar_originales()
+        return instancia
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        # Al cargar un campo diferido solo ese campo pasa a ser el valor original
+        self._guardar_originales(fields)
+
+    def calcular_fechas_derivadas(self, ahora=None):
+        """
+        Fecha de cierre y de resolución al cerrar, y tiempos de respuesta y resolución
+        en horas. La usan save() y los cambios masivos con bulk_update, que no pasan por save()
+        """
+        ahora = ahora or timezone.now()
         if self.estado == 'cerrado' and not self.closed_at:
-            self.closed_at = timezone.now()
-            if not self.fecha_resolucion:
-                self.fecha_resolucion = timezone.now()
+            self.closed_at = ahora
+        if self.closed_at and not self.fecha_resolucion:
+            self.fecha_resolucion = self.closed_at
 
-        # Calcular tiempos de respuesta y resolución
-        if self.fecha_primera_respuesta and not self.tiempo_respuesta_horas:
+        # created_at es None antes del primer guardado: el tiempo se calcula en el siguiente
+        if self.created_at and self.fecha_primera_respuesta and self.tiempo_respuesta_horas is None:
             delta = self.fecha_primera_respuesta - self.created_at
             self.tiempo_respuesta_horas = int(delta.total_seconds() / 3600)
 
-        if self.fecha_resolucion and not self.tiempo_resolucion_horas:
+        if self.created_at and self.fecha_resolucion and self.tiempo_resolucion_horas is None:
             delta = self.fecha_resolucion - self.created_at
             self.tiempo_resolucion_horas = int(delta.total_seconds() / 3600)
 
-        # Validar garantía automáticamente
-        if self.fecha_compra and self.categoria:
-            dias_transcurridos = (timezone.now().date() - self.fecha_compra).days
-            self.garantia_vigente = dias_transcurridos <= self.categoria.dias_garantia_defecto
-            self.fecha_vencimiento_garantia = self.fecha_compra + timedelta(days=self.categoria.dias_garantia_defecto)
+    def _guardar_originales(self, campos=None):
+        """Copia de los valores persistidos para detectar qué campos se modificaron"""
+        if campos is None or not hasattr(self, '_valores_originales'):
+            self._valores_originales = {}
+        for campo in self._meta.concrete_fields:
+            if campo.attname in self.__dict__ and (campos is None or campo.attname in campos or campo.name in campos):
+                self._valores_originales[campo.attname] = self.__dict__[campo.attname]
+
+    def valor_original(self, campo):
+        """Valor de un campo (attname) tal como se leyó de la base de datos; None si es nuevo"""
+        return getattr(self, '_valores_originales', {}).get(campo)
+
+    def campos_modificados(self):
+        """Nombres de los campos cuyo valor difiere del leído de la base de datos"""
+        originales = getattr(self, '_valores_originales', None)
+        campos = [campo for campo in self._meta.concrete_fields if not campo.primary_key]
+        if originales is None:
+            return {campo.name for campo in campos}
+        return {
+            campo.name for campo in campos
+            if campo.attname in self.__dict__
+            and (campo.attname not in originales or originales[campo.attname] != self.__dict__[campo.attname])
+        }
 
-        super().save(*args, **kwargs)
+    def calcular_garantia(self):
+        """Calcula vencimiento y vigencia de la garantía a partir de la fecha de compra y la categoría"""
+        if self.fecha_compra and self.categoria_id:
+            self.fecha_vencimiento_garantia = self.fecha_compra + timedelta(days=self.categoria.dias_garantia_defecto)
+            self.garantia_vigente = timezone.now().date() <= self.fecha_vencimiento_garantia
 
     def esta_abierto(self):
         """Verifica si el ticket está abierto"""
@@ -271,21 +487,19 @@ class Ticket(models.Model):
 
     def get_tiempo_limite_respuesta(self):
         """Retorna el tiempo límite de respuesta según la prioridad"""
-        limites = {
-            'critica': timedelta(hours=1),
-            'alta': timedelta(hours=4),
-            'media': timedelta(hours=24),
-            'baja': timedelta(hours=72),
-        }
-        return limites.get(self.prioridad, timedelta(hours=24))
+        return self.LIMITES_RESPUESTA.get(self.prioridad, timedelta(hours=24))
+
+    def calcular_fecha_limite_respuesta(self):
+        """Fecha límite de respuesta: creación + tiempo límite de la prioridad"""
+        return (self.created_at or timezone.now()) + self.get_tiempo_limite_respuesta()
 
     def esta_vencido(self):
         """Verifica si el ticket ha superado el tiempo de respuesta esperado"""
         if self.estado in ['cerrado', 'rechazado']:
             return False
 
-        tiempo_limite = self.get_tiempo_limite_respuesta()
-        return timezone.now() > (self.created_at + tiempo_limite)
+        fecha_limite = self.fecha_limite_respuesta or self.calcular_fecha_limite_respuesta()
+        return timezone.now() > fecha_limite
 
     def asignar_automaticamente(self):
         """Asigna automáticamente el ticket al agente con menos carga"""
@@ -357,19 +571,36 @@ class Comentario(models.Model):
     def __str__(self):
         return f"Comentario de {self.autor.get_full_name()} en {self.ticket}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        instancia._visibilidad_original = instancia.__dict__.get('visibilidad')
+        return instancia
+
     def save(self, *args, **kwargs):
         # Marcar fecha de primera respuesta en el ticket si es la primera respuesta del agente
-        if not self.pk and self.autor.puede_gestionar_tickets() and not self.ticket.fecha_primera_respuesta:
+        # (el id se genera al instanciar, por eso se usa _state.adding y no self.pk)
+        if self._state.adding and self.autor.puede_gestionar_tickets() and not self.ticket.fecha_primera_respuesta:
             self.ticket.fecha_primera_respuesta = timezone.now()
             self.es_respuesta_inicial = True
-            self.ticket.save()
 
         # Si el comentario resuelve el ticket, actualizar estado
         if self.resuelve_ticket and self.ticket.estado != 'resuelto':
             self.ticket.estado = 'resuelto'
             self.ticket.fecha_resolucion = timezone.now()
-            self.ticket.save()
 
+        if self._state.adding:
+            from .services import ContadoresTicketService
+
+            # Los contadores no los suma la señal: van en el mismo UPDATE que los
+            # cambios pendientes del ticket
+            self._contado_en_ticket = True
+            super().save(*args, **kwargs)
+            ContadoresTicketService.guardar_con_comentario(self.ticket, self.visibilidad == 'publico')
+            return
+
+        if self.ticket.campos_modificados():
+            self.ticket.save()
         super().save(*args, **kwargs)
 
     def es_visible_para(self, usuario):
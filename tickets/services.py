@@ -1,16 +1,21 @@
 """
 Servicios para el sistema de tickets
-Incluye balanceo de carga, notificaciones y validaciones automáticas
+Incluye balanceo de carga, notificaciones, cambios de estado y validaciones automáticas
 """
 
 import logging
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from django.core.mail import send_mail, EmailMultiAlternatives
 from django.template.loader import render_to_string
 from django.conf import settings
 from django.utils import timezone
 from django.contrib.auth import get_user_model
-from django.db.models import Count, Q
+from django.db import close_old_connections, transaction
+from django.db.models import Avg, Case, Count, Exists, F, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce, Greatest
+from core.cache import etiqueta_usuario, invalidar, obtener_o_calcular
 from .models import Ticket, Comentario
 
 User = get_user_model()
@@ -122,11 +127,47 @@ class BalanceadorCarga:
 
 class NotificacionService:
     """Servicio para envío de notificaciones por email"""
+
+    _executor = None
+
+    @classmethod
+    def encolar(cls, notificacion, *args):
+        """
+        Programa una notificación para después del commit, en un hilo de fondo
+        para que el envío de correo no retenga la petición
+        """
+        if not settings.TICKET_SETTINGS.get('NOTIFICATIONS_ASYNC', True):
+            transaction.on_commit(lambda: notificacion(*args))
+            return
+
+        transaction.on_commit(
+            lambda: cls._obtener_executor().submit(cls._enviar_en_segundo_plano, notificacion, args)
+        )
+
+    @classmethod
+    def _obtener_executor(cls):
+        if cls._executor is None:
+            cls._executor = ThreadPoolExecutor(
+                max_workers=settings.TICKET_SETTINGS.get('NOTIFICATION_WORKERS', 2),
+                thread_name_prefix='notificaciones',
+            )
+        return cls._executor
+
+    @staticmethod
+    def _enviar_en_segundo_plano(notificacion, args):
+        close_old_connections()
+        try:
+            notificacion(*args)
+        except Exception:
+            logger.exception(f"Error al enviar la notificación {notificacion.__name__}")
+        finally:
+            close_old_connections()
     
     @staticmethod
-    def enviar_email(destinatario, asunto, template_html, template_txt, contexto):
+    def enviar_email(destinatario, asunto, template_html, template_txt, contexto, connection=None):
         """
         Envía un email usando templates HTML y texto plano
+        connection permite reutilizar una conexión SMTP en envíos por lotes
         """
         try:
             if not destinatario.recibir_notificaciones:
@@ -139,7 +180,8 @@ class NotificacionService:
                 subject=asunto,
                 body=text_content,
                 from_email=settings.DEFAULT_FROM_EMAIL,
-                to=[destinatario.email]
+                to=[destinatario.email],
+                connection=connection
             )
             msg.attach_alternative(html_content, "text/html")
             msg.send()
@@ -244,6 +286,73 @@ class NotificacionService:
                 contexto=contexto
             )
     
+    @staticmethod
+    def notificar_cambios_estado(cambios, usuario_que_cambio):
+        """
+        Notifica un lote de cambios de estado [(ticket, estado_anterior), ...]
+        reutilizando una sola conexión SMTP para todos los correos
+        """
+        from django.core.mail import get_connection
+
+        with get_connection() as connection:
+            for ticket, estado_anterior in cambios:
+                contexto = {
+                    'ticket': ticket,
+                    'estado_anterior': estado_anterior,
+                    'estado_nuevo': ticket.get_estado_display(),
+                    'usuario_que_cambio': usuario_que_cambio,
+                    'url_ticket': f"{settings.SITE_URL}/tickets/{ticket.id}/"
+                }
+
+                NotificacionService.enviar_email(
+                    destinatario=ticket.cliente,
+                    asunto=f"Actualización en su ticket #{str(ticket.id)[:8]}",
+                    template_html='emails/cambio_estado.html',
+                    template_txt='emails/cambio_estado.txt',
+                    contexto=contexto,
+                    connection=connection
+                )
+
+                if ticket.agente and ticket.agente != usuario_que_cambio:
+                    NotificacionService.enviar_email(
+                        destinatario=ticket.agente,
+                        asunto=f"Cambio de estado en ticket #{str(ticket.id)[:8]}",
+                        template_html='emails/cambio_estado.html',
+                        template_txt='emails/cambio_estado.txt',
+                        contexto=contexto,
+                        connection=connection
+                    )
+
+    @staticmethod
+    def notificar_sla_incumplidos(tickets):
+        """
+        Un correo por agente con sus tickets escalados y un resumen
+        para los administradores, todo por una sola conexión SMTP
+        """
+        from django.core.mail import get_connection
+
+        por_agente = {}
+        for ticket in tickets:
+            if ticket.agente:
+                por_agente.setdefault(ticket.agente, []).append(ticket)
+
+        administradores = User.objects.filter(rol='superadmin', is_active=True)
+
+        with get_connection() as connection:
+            for destinatario, tickets_destinatario in [*por_agente.items(), *((admin, tickets) for admin in administradores)]:
+                NotificacionService.enviar_email(
+                    destinatario=destinatario,
+                    asunto=f"SLA incumplido en {len(tickets_destinatario)} ticket(s)",
+                    template_html='emails/sla_incumplido.html',
+                    template_txt='emails/sla_incumplido.txt',
+                    contexto={
+                        'destinatario': destinatario,
+                        'tickets': tickets_destinatario,
+                        'site_url': settings.SITE_URL,
+                    },
+                    connection=connection
+                )
+
     @staticmethod
     def notificar_nuevo_comentario(comentario):
         """Notifica cuando se agrega un nuevo comentario"""
@@ -282,13 +391,633 @@ class NotificacionService:
                 )
 
 
+class CambioEstadoService:
+    """Servicio para cambiar el estado de los tickets dejando constancia y notificando"""
+
+    @staticmethod
+    def cambiar_estado(ticket, nuevo_estado, usuario, motivo=''):
+        """
+        Cambia el estado del ticket, crea el comentario automático
+        y programa la notificación para después del commit
+        """
+        estado_anterior = ticket.get_estado_display()
+
+        with transaction.atomic():
+            ticket.estado = nuevo_estado
+            ticket._usuario_modificador = usuario
+
+            # Actualizar fechas según el estado
+            if nuevo_estado == 'resuelto' and not ticket.fecha_resolucion:
+                ticket.fecha_resolucion = timezone.now()
+            elif nuevo_estado == 'cerrado' and not ticket.closed_at:
+                ticket.closed_at = timezone.now()
+            elif nuevo_estado == 'rechazado':
+                ticket.motivo_rechazo = motivo
+
+            # Crear comentario automático del cambio de estado; al guardarse escribe
+            # el ticket en un solo UPDATE, con sus contadores y la primera respuesta si aplica
+            texto_comentario = f"Estado cambiado de '{estado_anterior}' a '{ticket.get_estado_display()}'"
+            if motivo:
+                texto_comentario += f"\n\nMotivo: {motivo}"
+
+            Comentario.objects.create(
+                ticket=ticket,
+                autor=usuario,
+                texto=texto_comentario,
+                visibilidad='publico'
+            )
+
+            NotificacionService.encolar(
+                NotificacionService.notificar_cambio_estado, ticket, estado_anterior, usuario
+            )
+
+        return ticket
+
+    @staticmethod
+    def resolver(ticket, resolucion, usuario):
+        """Marca el ticket como resuelto con el comentario de resolución y lo notifica"""
+        estado_anterior = ticket.get_estado_display()
+
+        with transaction.atomic():
+            ticket.estado = 'resuelto'
+            ticket.fecha_resolucion = timezone.now()
+            ticket._usuario_modificador = usuario
+
+            # Crear comentario con la resolución; al guardarse escribe el ticket en un solo UPDATE
+            Comentario.objects.create(
+                ticket=ticket,
+                autor=usuario,
+                texto=f"**TICKET RESUELTO**\n\n{resolucion}",
+                visibilidad='publico',
+                resuelve_ticket=True
+            )
+
+            NotificacionService.encolar(
+                NotificacionService.notificar_cambio_estado, ticket, estado_anterior, usuario
+            )
+
+        return ticket
+
+
+class CambioEstadoMasivoService:
+    """
+    Cambio de estado de muchos tickets en una sola transacción
+    (p. ej. el cierre de fin de mes de los tickets resueltos)
+    """
+
+    @staticmethod
+    def cambiar_estados(ticket_ids, nuevo_estado, usuario, motivo=''):
+        """
+        Valida cada transición con puede_cambiar_estado_ticket y aplica las permitidas
+        con bulk_update; comentarios y eventos de auditoría se insertan con bulk_create
+        y las notificaciones se encolan como un único lote tras el commit.
+        Retorna (tickets_actualizados, [(ticket_id, motivo_rechazo), ...])
+        """
+        from audit.models import Evento
+
+        rechazados = []
+        validos = []
+        for ticket_id in dict.fromkeys(str(ticket_id) for ticket_id in ticket_ids):
+            try:
+                validos.append(str(uuid.UUID(ticket_id)))
+            except ValueError:
+                rechazados.append((ticket_id, "Identificador inválido"))
+        ticket_ids = validos
+
+        maximo = settings.TICKET_SETTINGS.get('BULK_STATE_CHANGE_MAX', 500)
+        if len(ticket_ids) > maximo:
+            raise ValueError(f"No se pueden cambiar más de {maximo} tickets a la vez")
+        if nuevo_estado not in dict(Ticket.ESTADOS):
+            raise ValueError("Estado inválido")
+
+        actualizados = []
+        cambios = []
+        comentarios = []
+        eventos = []
+        ahora = timezone.now()
+        nuevo_estado_display = dict(Ticket.ESTADOS)[nuevo_estado]
+        primera_respuesta = usuario.puede_gestionar_tickets()
+
+        with transaction.atomic():
+            tickets = {
+                str(ticket.id): ticket
+                for ticket in Ticket.objects.visibles_para(usuario)
+                .select_for_update(of=('self',))
+                .select_related('cliente', 'agente')
+                .filter(id__in=ticket_ids)
+            }
+
+            for ticket_id in ticket_ids:
+                ticket = tickets.get(ticket_id)
+                if ticket is None:
+                    rechazados.append((ticket_id, "Ticket no encontrado"))
+                    continue
+                if ticket.estado == nuevo_estado:
+                    rechazados.append((ticket_id, f"El ticket ya está en '{nuevo_estado_display}'"))
+                    continue
+                if not usuario.puede_cambiar_estado_ticket(ticket.estado, nuevo_estado):
+                    rechazados.append((ticket_id, f"Transición no permitida desde '{ticket.get_estado_display()}'"))
+                    continue
+
+                estado_anterior = ticket.estado
+                estado_anterior_display = ticket.get_estado_display()
+
+                # Mismas reglas de fechas que CambioEstadoService.cambiar_estado
+                ticket.estado = nuevo_estado
+                if nuevo_estado == 'resuelto' and not ticket.fecha_resolucion:
+                    ticket.fecha_resolucion = ahora
+                elif nuevo_estado == 'cerrado' and not ticket.closed_at:
+                    ticket.closed_at = ahora
+                elif nuevo_estado == 'rechazado':
+                    ticket.motivo_rechazo = motivo
+
+                # bulk_create no pasa por Comentario.save: marcar aquí la primera respuesta
+                es_respuesta_inicial = primera_respuesta and not ticket.fecha_primera_respuesta
+                if es_respuesta_inicial:
+                    ticket.fecha_primera_respuesta = ahora
+
+                # bulk_update no pasa por save(): mismas fechas y tiempos derivados, y auto_now
+                ticket.calcular_fechas_derivadas(ahora)
+                ticket.updated_at = ahora
+
+                texto_comentario = f"Estado cambiado de '{estado_anterior_display}' a '{nuevo_estado_display}'"
+                if motivo:
+                    texto_comentario += f"\n\nMotivo: {motivo}"
+
+                comentario = Comentario(
+                    ticket=ticket,
+                    autor=usuario,
+                    texto=texto_comentario,
+                    visibilidad='publico',
+                    es_respuesta_inicial=es_respuesta_inicial
+                )
+                comentarios.append(comentario)
+
+                # Los eventos que crearían las señales post_save, que bulk_create no emite
+                eventos.append(Evento(
+                    ticket_id=ticket.id,
+                    tipo='cambio_estado',
+                    descripcion=f'Estado cambiado de {estado_anterior} a {nuevo_estado}',
+                    datos_json={
+                        'estado_anterior': estado_anterior,
+                        'estado_nuevo': nuevo_estado,
+                        'masivo': True,
+                    },
+                    actor=usuario
+                ))
+                eventos.append(Evento(
+                    ticket_id=ticket.id,
+                    tipo='comentario',
+                    descripcion=f'Nuevo comentario de {usuario.get_full_name()}',
+                    datos_json={
+                        'visibilidad': comentario.visibilidad,
+                        'longitud_texto': len(comentario.texto),
+                    },
+                    actor=usuario
+                ))
+
+                actualizados.append(ticket)
+                cambios.append((ticket, estado_anterior_display))
+
+            if actualizados:
+                Ticket.objects.bulk_update(
+                    actualizados,
+                    ['estado', 'fecha_resolucion', 'closed_at', 'motivo_rechazo',
+                     'fecha_primera_respuesta', 'tiempo_respuesta_horas',
+                     'tiempo_resolucion_horas', 'updated_at'],
+                    batch_size=200
+                )
+                Comentario.objects.bulk_create(comentarios, batch_size=200)
+                Evento.objects.bulk_create(eventos, batch_size=200)
+                # bulk_create no dispara señales: contadores en una sola sentencia
+                ContadoresTicketService.registrar_comentarios([ticket.id for ticket in actualizados])
+                # bulk_update tampoco dispara la invalidación de los dashboards
+                DashboardService.invalidar_tickets(actualizados)
+
+                NotificacionService.encolar(NotificacionService.notificar_cambios_estado, cambios, usuario)
+
+        logger.info(
+            f"Cambio masivo a '{nuevo_estado}' por {usuario.username}: "
+            f"{len(actualizados)} aplicados, {len(rechazados)} rechazados"
+        )
+        return actualizados, rechazados
+
+
+class CierreAutomaticoService:
+    """
+    Cierre programado de tickets inactivos: resueltos sin reclamos tras el
+    periodo de gracia y tickets en espera de un cliente que no respondió
+    """
+
+    @staticmethod
+    def tickets_resueltos_vencidos(dias, ahora=None):
+        """Tickets resueltos hace más de `dias` días"""
+        limite = (ahora or timezone.now()) - timedelta(days=dias)
+        return Ticket.objects.annotate(
+            resuelto_en=Coalesce('fecha_resolucion', 'updated_at')
+        ).filter(estado='resuelto', resuelto_en__lt=limite)
+
+    @staticmethod
+    def tickets_en_espera_vencidos(dias, ahora=None):
+        """Tickets en espera del cliente sin actividad ni comentarios suyos en `dias` días"""
+        limite = (ahora or timezone.now()) - timedelta(days=dias)
+        respuesta_cliente = Comentario.objects.filter(
+            ticket=OuterRef('pk'), autor=OuterRef('cliente'), created_at__gte=limite
+        )
+        return Ticket.objects.filter(
+            estado='en_espera_cliente', updated_at__lt=limite
+        ).exclude(Exists(respuesta_cliente))
+
+    @staticmethod
+    def obtener_actor(username=None):
+        """
+        Usuario que firma los cierres automáticos: el indicado o, por defecto,
+        el primer administrador activo
+        """
+        username = username or settings.TICKET_SETTINGS.get('AUTO_CLOSE_ACTOR')
+        if username:
+            return User.objects.get(username=username, is_active=True)
+        return User.objects.filter(rol='superadmin', is_active=True).order_by('date_joined').first()
+
+    @staticmethod
+    def cerrar(tickets, actor, motivo, lote=200):
+        """
+        Cierra los tickets del queryset por lotes con CambioEstadoMasivoService.
+        Cada lote es una transacción; es idempotente porque los tickets cerrados
+        dejan de cumplir el filtro. Retorna (cerrados, rechazados)
+        """
+        lote = min(lote, settings.TICKET_SETTINGS.get('BULK_STATE_CHANGE_MAX', 500))
+        cerrados = 0
+        rechazados = 0
+        omitidos = []
+
+        while True:
+            ids = list(
+                tickets.exclude(id__in=omitidos).order_by('updated_at').values_list('id', flat=True)[:lote]
+            )
+            if not ids:
+                break
+
+            actualizados, fallidos = CambioEstadoMasivoService.cambiar_estados(ids, 'cerrado', actor, motivo)
+            cerrados += len(actualizados)
+            rechazados += len(fallidos)
+            # Los rechazados seguirían cumpliendo el filtro: no volver a intentarlos
+            omitidos.extend(ticket_id for ticket_id, _ in fallidos)
+
+        return cerrados, rechazados
+
+
+class MonitorSLAService:
+    """
+    Detección y escalado de tickets que superan su fecha límite de respuesta.
+    Solo lee los tickets no escalados cuya fecha límite ya pasó (índice parcial
+    tickets_sla_pendiente_idx), por lo que el costo depende de los incumplimientos
+    nuevos y no del tamaño de la tabla
+    """
+
+    ESCALADO_PRIORIDAD = {'baja': 'media', 'media': 'alta', 'alta': 'critica'}
+
+    @staticmethod
+    def tickets_incumplidos(ahora=None):
+        """Tickets con el reloj del SLA corriendo, vencidos y aún no escalados"""
+        return Ticket.objects.filter(
+            estado__in=Ticket.ESTADOS_SLA,
+            sla_incumplido=False,
+            fecha_limite_respuesta__lt=ahora or timezone.now(),
+        )
+
+    @staticmethod
+    def _elegir_agente(cargas, agentes, excluir_id=None):
+        """Agente activo con menos carga que aún admite tickets"""
+        candidatos = [
+            agente for agente in agentes
+            if agente.id != excluir_id and cargas[agente.id] < agente.max_tickets_simultaneos
+        ]
+        if not candidatos:
+            return None
+        return min(candidatos, key=lambda agente: cargas[agente.id])
+
+    @classmethod
+    def escalar(cls, lote=500, ahora=None, reasignar=None):
+        """
+        Escala un lote de incumplimientos en una transacción: sube la prioridad,
+        reasigna los tickets sin agente o sin primera respuesta al agente con menos
+        carga, registra un evento 'sla_incumplido' por ticket y encola un único
+        lote de notificaciones. Retorna (tickets_escalados, cantidad_reasignados)
+        """
+        from audit.models import Evento
+
+        ahora = ahora or timezone.now()
+        if reasignar is None:
+            reasignar = settings.TICKET_SETTINGS.get('SLA_REASSIGN_ON_BREACH', True)
+
+        with transaction.atomic():
+            # skip_locked: dos ejecuciones solapadas no escalan el mismo ticket
+            tickets = list(
+                cls.tickets_incumplidos(ahora)
+                .select_for_update(skip_locked=True, of=('self',))
+                .select_related('agente', 'cliente')
+                .order_by('fecha_limite_respuesta')[:lote]
+            )
+            if not tickets:
+                return [], 0
+
+            agentes = list(User.objects.agentes_disponibles()) if reasignar else []
+            cargas = {agente.id: agente.tickets_activos for agente in agentes}
+            agentes_por_id = {agente.id: agente for agente in agentes}
+
+            eventos = []
+            reasignados = 0
+            for ticket in tickets:
+                prioridad_anterior = ticket.prioridad
+                agente_anterior = ticket.agente
+                fecha_limite = ticket.fecha_limite_respuesta
+
+                ticket.prioridad = cls.ESCALADO_PRIORIDAD.get(ticket.prioridad, ticket.prioridad)
+                ticket.sla_incumplido = True
+                ticket.fecha_limite_respuesta = ticket.calcular_fecha_limite_respuesta()
+                ticket.updated_at = ahora
+
+                necesita_agente = (
+                    ticket.agente_id is None
+                    or ticket.agente_id not in agentes_por_id
+                    or not ticket.fecha_primera_respuesta
+                )
+                if reasignar and necesita_agente:
+                    nuevo_agente = cls._elegir_agente(cargas, agentes, excluir_id=ticket.agente_id)
+                    if nuevo_agente:
+                        if ticket.agente_id in cargas:
+                            cargas[ticket.agente_id] -= 1
+                        cargas[nuevo_agente.id] += 1
+                        ticket.agente = nuevo_agente
+                        ticket.fecha_asignacion = ahora
+                        reasignados += 1
+
+                eventos.append(Evento(
+                    ticket_id=ticket.id,
+                    tipo='sla_incumplido',
+                    descripcion=f'SLA de respuesta incumplido (prioridad {prioridad_anterior} → {ticket.prioridad})',
+                    datos_json={
+                        'fecha_limite': fecha_limite.isoformat(),
+                        'prioridad_anterior': prioridad_anterior,
+                        'prioridad_nueva': ticket.prioridad,
+                        'agente_anterior': str(agente_anterior.id) if agente_anterior else None,
+                        'agente_nuevo': str(ticket.agente_id) if ticket.agente_id else None,
+                    },
+                    actor=None
+                ))
+
+            Ticket.objects.bulk_update(
+                tickets,
+                ['prioridad', 'sla_incumplido', 'fecha_limite_respuesta', 'agente',
+                 'fecha_asignacion', 'updated_at'],
+                batch_size=200
+            )
+            Evento.objects.bulk_create(eventos, batch_size=200)
+            DashboardService.invalidar_tickets(tickets)
+
+            NotificacionService.encolar(NotificacionService.notificar_sla_incumplidos, tickets)
+
+        logger.warning(f"SLA incumplido: {len(tickets)} tickets escalados, {reasignados} reasignados")
+        return tickets, reasignados
+
+
+class DetectorDuplicados:
+    """
+    Detección de reclamos que reutilizan una factura o un número de serie ya reclamados.
+    Usa los campos normalizados e indexados, por lo que cada búsqueda es O(log n)
+    """
+
+    @staticmethod
+    def buscar(ticket, limite=10):
+        """
+        Tickets previos (no rechazados) que coinciden con el número de serie, o con la
+        factura cuando alguno de los dos no tiene serie: una misma factura puede
+        cubrir varios productos con series distintas
+        """
+        condicion = Q()
+        if ticket.serie_normalizada:
+            condicion |= Q(serie_normalizada=ticket.serie_normalizada)
+            if ticket.factura_normalizada:
+                condicion |= Q(factura_normalizada=ticket.factura_normalizada, serie_normalizada='')
+        elif ticket.factura_normalizada:
+            condicion |= Q(factura_normalizada=ticket.factura_normalizada)
+
+        if not condicion:
+            return []
+
+        return list(
+            Ticket.objects.filter(condicion)
+            .exclude(estado='rechazado')
+            .exclude(pk=ticket.pk)
+            .order_by('created_at')
+            .values('id', 'cliente_id', 'estado', 'factura_normalizada', 'serie_normalizada')[:limite]
+        )
+
+    @staticmethod
+    def registrar(ticket, duplicados):
+        """Deja constancia en la auditoría para la revisión de posibles fraudes"""
+        from audit.models import Evento
+
+        Evento.objects.create(
+            ticket_id=ticket.id,
+            tipo='posible_duplicado',
+            descripcion=f'Factura o número de serie ya reclamados en {len(duplicados)} ticket(s)',
+            datos_json={
+                'tickets': [str(duplicado['id']) for duplicado in duplicados],
+                'coincide_serie': any(
+                    ticket.serie_normalizada and duplicado['serie_normalizada'] == ticket.serie_normalizada
+                    for duplicado in duplicados
+                ),
+                'otros_clientes': sorted({
+                    str(duplicado['cliente_id']) for duplicado in duplicados
+                    if duplicado['cliente_id'] != ticket.cliente_id
+                }),
+            },
+            actor=None
+        )
+        logger.warning(f"Posible reclamo duplicado en el ticket {ticket.id}: {len(duplicados)} coincidencias")
+
+    @staticmethod
+    def coincidencias(ticket):
+        """Tickets previos con la misma factura o serie, para mostrar en la revisión"""
+        ids = [duplicado['id'] for duplicado in DetectorDuplicados.buscar(ticket, limite=50)]
+        return Ticket.objects.filter(id__in=ids).select_related('cliente').order_by('created_at')
+
+
+class ContadoresTicketService:
+    """
+    Contadores desnormalizados del ticket (comentarios, comentarios públicos, adjuntos
+    y última actividad). Se actualizan con F() en una sola sentencia para que las altas
+    concurrentes no se pisen; reparar() los recalcula desde las tablas de origen.
+    Toda actualización fija updated_at: la API los expone y sus ETag y el filtro
+    modificado_desde dependen de esa columna
+    """
+
+    @staticmethod
+    def _sumar(campo, cantidad):
+        if cantidad >= 0:
+            return F(campo) + cantidad
+        return Greatest(F(campo) + cantidad, Value(0))
+
+    @classmethod
+    def registrar_comentarios(cls, ticket_ids, cantidad=1, publicos=None, actividad=True):
+        """
+        Suma (o resta) comentarios a los tickets indicados; publicos es la parte
+        de la cantidad que corresponde a comentarios públicos (por defecto todos)
+        """
+        publicos = cantidad if publicos is None else publicos
+        ahora = timezone.now()
+        cambios = {'num_comentarios': cls._sumar('num_comentarios', cantidad), 'updated_at': ahora}
+        if publicos:
+            cambios['num_comentarios_publicos'] = cls._sumar('num_comentarios_publicos', publicos)
+        if actividad and cantidad > 0:
+            cambios['ultima_actividad_at'] = ahora
+        return Ticket.objects.filter(id__in=ticket_ids).update(**cambios)
+
+    @classmethod
+    def guardar_con_comentario(cls, ticket, publico):
+        """
+        Guarda los cambios pendientes del ticket y suma un comentario nuevo en el mismo
+        UPDATE. En memoria los contadores quedan con el valor leído más el incremento
+        """
+        incrementos = {'num_comentarios': 1}
+        if publico:
+            incrementos['num_comentarios_publicos'] = 1
+        previos = {campo: getattr(ticket, campo) for campo in incrementos}
+
+        for campo, cantidad in incrementos.items():
+            setattr(ticket, campo, cls._sumar(campo, cantidad))
+        ticket.ultima_actividad_at = timezone.now()
+        try:
+            ticket.save()
+        except Exception:
+            for campo, valor in previos.items():
+                setattr(ticket, campo, valor)
+            raise
+
+        for campo, cantidad in incrementos.items():
+            setattr(ticket, campo, previos[campo] + cantidad)
+        ticket._guardar_originales(list(incrementos))
+
+    @classmethod
+    def registrar_cambio_visibilidad(cls, ticket_id, publico):
+        """Un comentario pasó a ser público (publico=True) o dejó de serlo"""
+        return Ticket.objects.filter(id=ticket_id).update(
+            num_comentarios_publicos=cls._sumar('num_comentarios_publicos', 1 if publico else -1),
+            updated_at=timezone.now(),
+        )
+
+    @classmethod
+    def registrar_adjuntos(cls, ticket_id, cantidad=1):
+        """Suma (o resta) adjuntos al ticket"""
+        ahora = timezone.now()
+        cambios = {'num_adjuntos': cls._sumar('num_adjuntos', cantidad), 'updated_at': ahora}
+        if cantidad > 0:
+            cambios['ultima_actividad_at'] = ahora
+        return Ticket.objects.filter(id=ticket_id).update(**cambios)
+
+    @staticmethod
+    def conteos_reales():
+        """Anotaciones con los valores calculados desde Comentario y Adjunto"""
+        from attachments.models import Adjunto
+
+        def contar(queryset, campo):
+            return Coalesce(
+                Subquery(queryset.values(campo).annotate(total=Count('id')).values('total')[:1]),
+                Value(0),
+            )
+
+        comentarios = Comentario.objects.filter(ticket=OuterRef('pk'))
+        adjuntos_ticket = Adjunto.objects.filter(tipo_objeto='ticket', objeto_id=OuterRef('pk'))
+        adjuntos_comentarios = Adjunto.objects.filter(
+            tipo_objeto='comentario',
+            objeto_id__in=Comentario.objects.filter(ticket=OuterRef(OuterRef('pk'))).values('id'),
+        )
+
+        def ultima(queryset):
+            return Coalesce(
+                Subquery(queryset.order_by('-created_at').values('created_at')[:1]),
+                F('created_at'),
+            )
+
+        return {
+            'real_comentarios': contar(comentarios, 'ticket'),
+            'real_comentarios_publicos': contar(comentarios.filter(visibilidad='publico'), 'ticket'),
+            'real_adjuntos': contar(adjuntos_ticket, 'tipo_objeto') + contar(adjuntos_comentarios, 'tipo_objeto'),
+            'real_ultima_actividad': Greatest(
+                F('created_at'), ultima(comentarios), ultima(adjuntos_ticket), ultima(adjuntos_comentarios)
+            ),
+        }
+
+    @classmethod
+    def reparar(cls, lote=500, dry_run=False):
+        """
+        Recorre los tickets por lotes de id y corrige los que tienen contadores
+        distintos a los reales. Retorna (revisados, corregidos)
+        """
+        revisados = 0
+        corregidos = 0
+        ultimo_id = None
+
+        while True:
+            tickets = Ticket.objects.order_by('id')
+            if ultimo_id is not None:
+                tickets = tickets.filter(id__gt=ultimo_id)
+            ids = list(tickets.values_list('id', flat=True)[:lote])
+            if not ids:
+                break
+            ultimo_id = ids[-1]
+            revisados += len(ids)
+
+            desfasados = list(
+                Ticket.objects.filter(id__in=ids)
+                .annotate(**cls.conteos_reales())
+                .filter(
+                    ~Q(num_comentarios=F('real_comentarios'))
+                    | ~Q(num_comentarios_publicos=F('real_comentarios_publicos'))
+                    | ~Q(num_adjuntos=F('real_adjuntos'))
+                    | Q(ultima_actividad_at__isnull=True)
+                    # Ticket.save fija ultima_actividad_at microsegundos antes de que auto_now_add
+                    # selle created_at: sin margen todo ticket recién creado parecería desfasado
+                    | Q(ultima_actividad_at__lt=F('real_ultima_actividad') - timedelta(seconds=1))
+                )
+                .values('id', 'real_comentarios', 'real_comentarios_publicos', 'real_adjuntos', 'real_ultima_actividad')
+            )
+            corregidos += len(desfasados)
+            if dry_run or not desfasados:
+                continue
+
+            ahora = timezone.now()
+            Ticket.objects.bulk_update(
+                [
+                    Ticket(
+                        id=fila['id'],
+                        num_comentarios=fila['real_comentarios'],
+                        num_comentarios_publicos=fila['real_comentarios_publicos'],
+                        num_adjuntos=fila['real_adjuntos'],
+                        ultima_actividad_at=fila['real_ultima_actividad'],
+                        updated_at=ahora,
+                    )
+                    for fila in desfasados
+                ],
+                ['num_comentarios', 'num_comentarios_publicos', 'num_adjuntos', 'ultima_actividad_at', 'updated_at'],
+            )
+
+        return revisados, corregidos
+
+
 class ValidadorGarantia:
     """Servicio para validar garantías automáticamente"""
     
+    # La vigencia de los tickets cerrados o rechazados queda como estaba al cerrarse
+    ESTADOS_FINALES = ('cerrado', 'rechazado')
+
     @staticmethod
     def validar_garantia(ticket):
         """
         Valida si un ticket tiene garantía vigente
+        Solo guarda el ticket si la vigencia o el vencimiento cambiaron
         """
         try:
             if not ticket.fecha_compra or not ticket.categoria:
@@ -297,21 +1026,58 @@ class ValidadorGarantia:
             dias_transcurridos = (timezone.now().date() - ticket.fecha_compra).days
             dias_garantia = ticket.categoria.dias_garantia_defecto
             
-            if dias_transcurridos <= dias_garantia:
-                ticket.garantia_vigente = True
-                ticket.fecha_vencimiento_garantia = ticket.fecha_compra + timedelta(days=dias_garantia)
-                ticket.save()
+            vigente = dias_transcurridos <= dias_garantia
+            vencimiento = ticket.fecha_compra + timedelta(days=dias_garantia)
+            if (ticket.garantia_vigente, ticket.fecha_vencimiento_garantia) != (vigente, vencimiento):
+                ticket.garantia_vigente = vigente
+                ticket.fecha_vencimiento_garantia = vencimiento
+                ticket.save(update_fields=['garantia_vigente', 'fecha_vencimiento_garantia', 'updated_at'])
+
+            if vigente:
                 return True, f"Garantía vigente. Vence el {ticket.fecha_vencimiento_garantia.strftime('%d/%m/%Y')}"
             else:
-                ticket.garantia_vigente = False
-                ticket.fecha_vencimiento_garantia = ticket.fecha_compra + timedelta(days=dias_garantia)
-                ticket.save()
                 dias_vencida = dias_transcurridos - dias_garantia
                 return False, f"Garantía vencida hace {dias_vencida} días"
                 
         except Exception as e:
             logger.error(f"Error al validar garantía del ticket {ticket.id}: {str(e)}")
             return False, "Error al validar la garantía"
+
+    @classmethod
+    def recalcular_categoria(cls, categoria, hoy=None):
+        """
+        Recalcula vencimiento y vigencia de todos los tickets abiertos de la categoría
+        con una sola sentencia UPDATE. Retorna la cantidad de tickets actualizados
+        """
+        hoy = hoy or timezone.now().date()
+        dias = timedelta(days=categoria.dias_garantia_defecto)
+
+        return Ticket.objects.filter(
+            categoria=categoria, fecha_compra__isnull=False
+        ).exclude(estado__in=cls.ESTADOS_FINALES).update(
+            fecha_vencimiento_garantia=F('fecha_compra') + dias,
+            garantia_vigente=Case(When(fecha_compra__gte=hoy - dias, then=Value(True)), default=Value(False)),
+            updated_at=timezone.now(),
+        )
+
+    @classmethod
+    def recalcular_vigencias(cls, hoy=None):
+        """
+        Cambio de día: actualiza garantia_vigente solo en los tickets abiertos cuyo valor
+        quedó desfasado respecto al vencimiento ya guardado. Retorna (vencidas, reactivadas)
+        """
+        hoy = hoy or timezone.now().date()
+        abiertos = Ticket.objects.exclude(estado__in=cls.ESTADOS_FINALES)
+        ahora = timezone.now()
+
+        vencidas = abiertos.filter(
+            garantia_vigente=True, fecha_vencimiento_garantia__lt=hoy
+        ).update(garantia_vigente=False, updated_at=ahora)
+        reactivadas = abiertos.filter(
+            garantia_vigente=False, fecha_vencimiento_garantia__gte=hoy
+        ).update(garantia_vigente=True, updated_at=ahora)
+
+        return vencidas, reactivadas
     
     @staticmethod
     def validar_documentos_requeridos(ticket):
@@ -372,6 +1138,14 @@ class ValidadorGarantia:
 
 class MetricasService:
     """Servicio para generar métricas y reportes"""
+
+    @staticmethod
+    def filtro_vencidos(ahora=None):
+        """
+        Condición equivalente a Ticket.esta_vencido para filtrar en la base de datos
+        """
+        ahora = ahora or timezone.now()
+        return Q(fecha_limite_respuesta__lt=ahora) & ~Q(estado__in=['cerrado', 'rechazado'])
     
     @staticmethod
     def obtener_metricas_generales(fecha_inicio=None, fecha_fin=None):
@@ -405,13 +1179,13 @@ class MetricasService:
         tickets_con_respuesta = tickets_periodo.exclude(tiempo_respuesta_horas__isnull=True)
         if tickets_con_respuesta.exists():
             metricas['tiempo_promedio_respuesta'] = tickets_con_respuesta.aggregate(
-                promedio=models.Avg('tiempo_respuesta_horas')
+                promedio=Avg('tiempo_respuesta_horas')
             )['promedio'] or 0
         
         tickets_resueltos = tickets_periodo.exclude(tiempo_resolucion_horas__isnull=True)
         if tickets_resueltos.exists():
             metricas['tiempo_promedio_resolucion'] = tickets_resueltos.aggregate(
-                promedio=models.Avg('tiempo_resolucion_horas')
+                promedio=Avg('tiempo_resolucion_horas')
             )['promedio'] or 0
         
         # Contar tickets vencidos
@@ -441,7 +1215,7 @@ class MetricasService:
             metricas_agente = {
                 'agente': agente,
                 'total_tickets': tickets_agente.count(),
-                'tickets_activos': tickets_agente.activos().count(),
+                'tickets_activos': tickets_agente.exclude(estado__in=['cerrado', 'rechazado']).count(),
                 'tickets_resueltos': tickets_agente.filter(estado='resuelto').count(),
                 'tickets_cerrados': tickets_agente.filter(estado='cerrado').count(),
                 'tiempo_promedio_respuesta': 0,
@@ -452,15 +1226,151 @@ class MetricasService:
             tickets_con_respuesta = tickets_agente.exclude(tiempo_respuesta_horas__isnull=True)
             if tickets_con_respuesta.exists():
                 metricas_agente['tiempo_promedio_respuesta'] = tickets_con_respuesta.aggregate(
-                    promedio=models.Avg('tiempo_respuesta_horas')
+                    promedio=Avg('tiempo_respuesta_horas')
                 )['promedio'] or 0
             
             tickets_resueltos = tickets_agente.exclude(tiempo_resolucion_horas__isnull=True)
             if tickets_resueltos.exists():
                 metricas_agente['tiempo_promedio_resolucion'] = tickets_resueltos.aggregate(
-                    promedio=models.Avg('tiempo_resolucion_horas')
+                    promedio=Avg('tiempo_resolucion_horas')
                 )['promedio'] or 0
             
             metricas_agentes.append(metricas_agente)
         
-        return metricas_agentes
\ No newline at end of file
+        return metricas_agentes
+
+class DashboardService:
+    """
+    Indicadores de los dashboards con caché de vida corta.
+    Las piezas de equipo (sin asignar, carga por agente, totales globales) se calculan
+    una vez y se comparten entre todos los usuarios; las personales se guardan por usuario.
+    Las personales llevan la etiqueta del usuario; los cambios de tickets invalidan
+    solo las etiquetas afectadas (ver tickets/signals.py)
+    """
+
+    ETIQUETA_EQUIPO = 'dashboard:equipo'
+    ETIQUETA_USUARIOS = 'dashboard:usuarios'
+    # Campos de Ticket de los que depende algún indicador
+    CAMPOS_RELEVANTES = frozenset({
+        'estado', 'prioridad', 'cliente', 'agente', 'tecnico', 'fecha_limite_respuesta',
+    })
+    ESTADOS_ABIERTOS_CLIENTE = ['abierto', 'en_revision', 'aceptado', 'en_reparacion']
+
+    @classmethod
+    def _personal(cls, nombre, usuario, calcular):
+        return obtener_o_calcular(
+            f'dashboard:{nombre}:{usuario.pk}',
+            calcular,
+            settings.TICKET_SETTINGS.get('DASHBOARD_CACHE_USER_SECONDS', 30),
+            etiquetas=(etiqueta_usuario(usuario.pk),),
+        )
+
+    @classmethod
+    def _compartido(cls, nombre, calcular):
+        return obtener_o_calcular(
+            f'dashboard:{nombre}',
+            calcular,
+            settings.TICKET_SETTINGS.get('DASHBOARD_CACHE_TEAM_SECONDS', 60),
+            etiquetas=(cls.ETIQUETA_EQUIPO, cls.ETIQUETA_USUARIOS),
+        )
+
+    @classmethod
+    def indicadores_cliente(cls, usuario):
+        def calcular():
+            return Ticket.objects.filter(cliente=usuario).aggregate(
+                total_tickets=Count('id'),
+                tickets_abiertos=Count('id', filter=Q(estado__in=cls.ESTADOS_ABIERTOS_CLIENTE)),
+                tickets_resueltos=Count('id', filter=Q(estado='resuelto')),
+                tickets_cerrados=Count('id', filter=Q(estado='cerrado')),
+                tickets_vencidos=Count('id', filter=MetricasService.filtro_vencidos()),
+            )
+        return cls._personal('cliente', usuario, calcular)
+
+    @classmethod
+    def indicadores_soporte(cls, usuario):
+        def calcular():
+            return Ticket.objects.filter(agente=usuario).aggregate(
+                tickets_asignados=Count('id'),
+                tickets_activos=Count('id', filter=~Q(estado__in=['cerrado', 'rechazado'])),
+                tickets_vencidos=Count('id', filter=MetricasService.filtro_vencidos()),
+            )
+        return cls._personal('soporte', usuario, calcular)
+
+    @classmethod
+    def indicadores_tecnico(cls, usuario):
+        def calcular():
+            return Ticket.objects.filter(tecnico=usuario).aggregate(
+                tickets_en_reparacion=Count('id', filter=Q(estado='en_reparacion')),
+                tickets_completados=Count('id', filter=Q(estado='resuelto')),
+                tickets_urgentes=Count('id', filter=Q(prioridad__in=['alta', 'critica'], estado='en_reparacion')),
+            )
+        return cls._personal('tecnico', usuario, calcular)
+
+    @classmethod
+    def resumen_equipo(cls):
+        """Tickets sin asignar y carga por agente y técnico, compartido por todo el equipo"""
+        def calcular():
+            return {
+                'tickets_sin_asignar': Ticket.objects.sin_asignar().count(),
+                'estadisticas_carga': BalanceadorCarga.obtener_estadisticas_carga(),
+            }
+        return cls._compartido('equipo', calcular)
+
+    @classmethod
+    def resumen_global(cls):
+        """Totales de usuarios y tickets del dashboard de superadministración"""
+        def calcular():
+            datos = Ticket.objects.aggregate(
+                total_tickets=Count('id'),
+                tickets_abiertos=Count('id', filter=Q(estado='abierto')),
+                tickets_resueltos=Count('id', filter=Q(estado='resuelto')),
+                tickets_vencidos=Count('id', filter=MetricasService.filtro_vencidos()),
+            )
+            datos.update(User.objects.aggregate(
+                total_usuarios=Count('id'),
+                total_clientes=Count('id', filter=Q(rol='cliente', estado='activo')),
+                total_empleados=Count('id', filter=Q(rol='empleado', estado='activo')),
+            ))
+            return datos
+        return cls._compartido('global', calcular)
+
+    @classmethod
+    def indicadores(cls, usuario):
+        """Indicadores del dashboard según el rol del usuario; None si su rol no tiene dashboard"""
+        if usuario.es_cliente():
+            return dict(cls.indicadores_cliente(usuario))
+        if usuario.es_soporte():
+            datos = dict(cls.indicadores_soporte(usuario))
+            datos['tickets_sin_asignar'] = cls.resumen_equipo()['tickets_sin_asignar']
+            return datos
+        if usuario.es_soporte_tecnico():
+            return dict(cls.indicadores_tecnico(usuario))
+        if usuario.es_superadmin():
+            return {
+                clave: valor for clave, valor in cls.resumen_global().items()
+                if clave in ('total_tickets', 'tickets_abiertos', 'tickets_resueltos',
+                             'tickets_vencidos', 'total_usuarios')
+            }
+        return None
+
+    @classmethod
+    def invalidar_tickets(cls, tickets):
+        """
+        Invalida, tras el commit, los indicadores de equipo y los de cada cliente, agente
+        y técnico implicado (también el agente o técnico anterior si cambió)
+        """
+        etiquetas = [cls.ETIQUETA_EQUIPO]
+        usuarios = set()
+        for ticket in tickets:
+            for campo in ('cliente_id', 'agente_id', 'tecnico_id'):
+                usuarios.add(getattr(ticket, campo))
+                usuarios.add(ticket.valor_original(campo))
+        usuarios.discard(None)
+        etiquetas.extend(etiqueta_usuario(usuario_id) for usuario_id in usuarios)
+        transaction.on_commit(lambda: invalidar(*etiquetas))
+
+    @classmethod
+    def invalidar_usuario(cls, usuario):
+        """Altas, bajas o cambios de un usuario: su caché, los totales de usuarios y la carga del equipo"""
+        etiquetas = (cls.ETIQUETA_USUARIOS, etiqueta_usuario(usuario.pk))
+        transaction.on_commit(lambda: invalidar(*etiquetas))
@@ -0,0 +1,83 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from attachments.models import Adjunto
+from .models import Comentario, Ticket
+from .services import ContadoresTicketService, DashboardService
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=Comentario)
+def contar_comentario(sender, instance, created, **kwargs):
+    """
+    Mantiene los contadores de comentarios del ticket
+    """
+    if created:
+        # Comentario.save los suma en el UPDATE del ticket; aquí solo los que no pasan por
+        # save(), como los cargados desde fixtures
+        if not getattr(instance, '_contado_en_ticket', False):
+            ContadoresTicketService.registrar_comentarios(
+                [instance.ticket_id], publicos=1 if instance.visibilidad == 'publico' else 0
+            )
+    else:
+        original = getattr(instance, '_visibilidad_original', None)
+        if original and (original == 'publico') != (instance.visibilidad == 'publico'):
+            ContadoresTicketService.registrar_cambio_visibilidad(
+                instance.ticket_id, instance.visibilidad == 'publico'
+            )
+    instance._visibilidad_original = instance.visibilidad
+
+
+@receiver(post_delete, sender=Comentario)
+def descontar_comentario(sender, instance, **kwargs):
+    ContadoresTicketService.registrar_comentarios(
+        [instance.ticket_id], cantidad=-1, publicos=-1 if instance.visibilidad == 'publico' else 0
+    )
+
+
+@receiver(post_save, sender=Adjunto)
+def contar_adjunto(sender, instance, created, **kwargs):
+    """
+    Mantiene el contador de adjuntos del ticket (los de sus comentarios incluidos)
+    """
+    if created:
+        ticket_id = instance.get_ticket_id()
+        if ticket_id:
+            ContadoresTicketService.registrar_adjuntos(ticket_id)
+
+
+@receiver(post_delete, sender=Adjunto)
+def descontar_adjunto(sender, instance, **kwargs):
+    ticket_id = instance.get_ticket_id()
+    if ticket_id:
+        ContadoresTicketService.registrar_adjuntos(ticket_id, -1)
+
+
+@receiver(post_save, sender=Ticket)
+def invalidar_cache_ticket(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Invalida los indicadores de dashboard que dependen del ticket; los guardados que
+    solo tocan contadores o fechas de actividad no afectan a ninguno
+    """
+    if created or update_fields is None or DashboardService.CAMPOS_RELEVANTES & set(update_fields):
+        DashboardService.invalidar_tickets([instance])
+
+
+@receiver(post_delete, sender=Ticket)
+def invalidar_cache_ticket_eliminado(sender, instance, **kwargs):
+    DashboardService.invalidar_tickets([instance])
+
+
+@receiver(post_save, sender=User)
+def invalidar_cache_usuario(sender, instance, created, update_fields=None, **kwargs):
+    # Cada inicio de sesión guarda last_login: no cambia nada de lo que está en caché
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    DashboardService.invalidar_usuario(instance)
+
+
+@receiver(post_delete, sender=User)
+def invalidar_cache_usuario_eliminado(sender, instance, **kwargs):
+    DashboardService.invalidar_usuario(instance)
@@ -1,3 +1,720 @@
-from django.test import TestCase
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest import skipUnless
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from attachments.models import Adjunto
+from attachments.services import ReconciliacionAlmacenamientoService
+from audit.models import Evento
+from .datos_sinteticos import GeneradorDatosSinteticos
+
+from .models import Categoria, Comentario, Ticket, orden_listado
+from .services import (
+    CambioEstadoMasivoService, CambioEstadoService, CierreAutomaticoService, ContadoresTicketService,
+    DashboardService, DetectorDuplicados, MonitorSLAService, ValidadorGarantia,
+)
+
+User = get_user_model()
+
+
+@skipUnless(connection.vendor == 'sqlite', 'El plan de ejecución se interpreta con el formato de SQLite')
+class PlanListadosTicketsTest(TestCase):
+    """Los listados de tickets deben resolverse con índices, sin recorrer la tabla completa"""
+
+    # "SCAN tickets_ticket" sin "USING ... INDEX" indica un recorrido completo de la tabla
+    RECORRIDO_COMPLETO = re.compile(r'SCAN tickets_ticket(?! USING (COVERING )?INDEX)\b')
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.cliente = User.objects.create_user('cliente_plan', password='x', rol='cliente')
+        cls.empleado = User.objects.create_user('empleado_plan', password='x', rol='empleado')
+        cls.soporte = User.objects.create_user('soporte_plan', password='x', rol='soporte')
+        cls.tecnico = User.objects.create_user('tecnico_plan', password='x', rol='soporte_tecnico')
+
+    def assertUsaIndice(self, queryset, descripcion):
+        plan = queryset.explain()
+        with self.subTest(descripcion):
+            self.assertIn('INDEX', plan, f'{descripcion}: el plan no usa ningún índice\n{plan}')
+            self.assertIsNone(
+                self.RECORRIDO_COMPLETO.search(plan),
+                f'{descripcion}: recorre tickets_ticket completo\n{plan}',
+            )
+
+    def listado(self, usuario, orden, **filtros):
+        """Misma consulta que arma listar_tickets"""
+        return (
+            Ticket.objects.visibles_para(usuario)
+            .filter(**filtros)
+            .select_related('cliente', 'agente', 'categoria')
+            .order_by(*orden_listado(orden))
+        )
+
+    def test_listado_por_rol(self):
+        for usuario in (self.cliente, self.empleado):
+            for orden, _ in Ticket.ORDENES_LISTADO:
+                self.assertUsaIndice(self.listado(usuario, orden), f'{usuario.rol} / {orden}')
+
+        # Sin filtro de rol el índice solo sirve para las ordenaciones por fecha
+        for orden in ('reciente', 'actividad'):
+            self.assertUsaIndice(self.listado(self.soporte, orden), f'soporte / {orden}')
+
+    def test_listado_filtrado_por_estado(self):
+        for usuario in (self.cliente, self.soporte):
+            self.assertUsaIndice(
+                self.listado(usuario, 'reciente', estado='abierto'),
+                f'{usuario.rol} / estado',
+            )
+
+    def test_tickets_sin_asignar(self):
+        tickets = Ticket.objects.filter(
+            agente__isnull=True,
+            tecnico__isnull=True,
+            estado='abierto'
+        ).select_related('cliente', 'categoria').order_by('-created_at')
+        self.assertUsaIndice(tickets, 'tickets_sin_asignar')
+        self.assertIn('tickets_sin_asignar_idx', tickets.explain())
+        self.assertUsaIndice(Ticket.objects.sin_asignar(), 'TicketManager.sin_asignar')
+
+    def test_dashboards(self):
+        self.assertUsaIndice(
+            Ticket.objects.asignados_a(self.soporte).order_by('-created_at'),
+            'dashboard soporte',
+        )
+        self.assertUsaIndice(
+            Ticket.objects.filter(tecnico=self.tecnico).order_by('-updated_at'),
+            'dashboard técnico',
+        )
+
+
+class ApiTicketsCondicionalTest(TestCase):
+    """Los cambios que alteran la página devuelta deben invalidar el ETag de la API"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.cliente = User.objects.create_user('cliente_api', password='x', rol='cliente')
+        cls.categoria = Categoria.objects.create(nombre='Categoría API')
+        cls.ticket = Ticket.objects.create(
+            numero_factura='F-API-1', asunto='Asunto', descripcion='Descripción',
+            categoria=cls.categoria, cliente=cls.cliente,
+        )
+
+    def setUp(self):
+        self.client.force_login(self.cliente)
+        self.url = reverse('tickets:api_tickets') + '?fields=id,num_comentarios_publicos'
+
+    def consultar(self, etag=None):
+        cabeceras = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        return self.client.get(self.url, **cabeceras)
+
+    def test_comentario_nuevo_cambia_etag(self):
+        inicial = self.consultar()
+        self.assertEqual(inicial.json()['resultados'][0]['num_comentarios_publicos'], 0)
+        self.assertEqual(self.consultar(inicial['ETag']).status_code, 304)
+
+        Comentario.objects.create(ticket=self.ticket, autor=self.cliente, texto='Hola')
+
+        respuesta = self.consultar(inicial['ETag'])
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertNotEqual(respuesta['ETag'], inicial['ETag'])
+        self.assertEqual(respuesta.json()['resultados'][0]['num_comentarios_publicos'], 1)
+
+    def test_cambio_de_visibilidad_cambia_etag(self):
+        comentario = Comentario.objects.create(ticket=self.ticket, autor=self.cliente, texto='Hola')
+        inicial = self.consultar()
+
+        comentario.visibilidad = 'privado'
+        comentario.save()
+
+        respuesta = self.consultar(inicial['ETag'])
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.json()['resultados'][0]['num_comentarios_publicos'], 0)
+
+    def test_renombrar_categoria_cambia_etag(self):
+        self.url = reverse('tickets:api_tickets') + '?fields=id,categoria'
+        inicial = self.consultar()
+        self.assertEqual(self.consultar(inicial['ETag']).status_code, 304)
+
+        self.categoria.nombre = 'Categoría renombrada'
+        self.categoria.save()
+
+        respuesta = self.consultar(inicial['ETag'])
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.json()['resultados'][0]['categoria'], 'Categoría renombrada')
+
+    def test_sin_cambios_no_consulta_la_pagina(self):
+        inicial = self.consultar()
+        self.assertIn('Last-Modified', inicial)
+
+        # Usuario y el agregado del validador; la página no se consulta
+        with self.assertNumQueries(2):
+            respuesta = self.consultar(inicial['ETag'])
+        self.assertEqual(respuesta.status_code, 304)
+
+        respuesta = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=inicial['Last-Modified'])
+        self.assertEqual(respuesta.status_code, 304)
+
+    def test_categoria_que_no_es_uuid(self):
+        for valor in ('1', 'abc'):
+            respuesta = self.client.get(reverse('tickets:api_tickets'), {'categoria': valor})
+            self.assertEqual(respuesta.status_code, 400)
+
+        respuesta = self.client.get(reverse('tickets:api_tickets'), {'categoria': str(self.categoria.id)})
+        self.assertEqual(len(respuesta.json()['resultados']), 1)
+
+
+class CambioEstadoMasivoTest(TestCase):
+    """El cambio masivo debe dejar los mismos campos derivados que Ticket.save()"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.cliente = User.objects.create_user('cliente_masivo', password='x', rol='cliente')
+        cls.admin = User.objects.create_user('admin_masivo', password='x', rol='superadmin')
+        cls.categoria = Categoria.objects.create(nombre='Categoría masiva')
+
+    def crear_ticket(self, numero):
+        return Ticket.objects.create(
+            numero_factura=f'F-MASIVO-{numero}', asunto='Asunto', descripcion='Descripción',
+            categoria=self.categoria, cliente=self.cliente,
+        )
+
+    def test_resolver_calcula_tiempos(self):
+        ticket = self.crear_ticket(1)
+        CambioEstadoMasivoService.cambiar_estados([ticket.id], 'resuelto', self.admin)
+
+        ticket.refresh_from_db()
+        self.assertIsNotNone(ticket.fecha_resolucion)
+        self.assertEqual(ticket.tiempo_respuesta_horas, 0)
+        self.assertEqual(ticket.tiempo_resolucion_horas, 0)
+
+    def test_cerrar_fija_fecha_resolucion(self):
+        ticket = self.crear_ticket(2)
+        CambioEstadoMasivoService.cambiar_estados([ticket.id], 'cerrado', self.admin)
+
+        ticket.refresh_from_db()
+        self.assertIsNotNone(ticket.closed_at)
+        self.assertEqual(ticket.fecha_resolucion, ticket.closed_at)
+        self.assertEqual(ticket.tiempo_resolucion_horas, 0)
+
+
+class CambioEstadoVistaTest(TestCase):
+    """La vista asíncrona de cambio de estado aplica el servicio y redirige al detalle"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.cliente = User.objects.create_user('cliente_vista_estado', password='x', rol='cliente')
+        cls.admin = User.objects.create_user('admin_vista_estado', password='x', rol='superadmin')
+        cls.ticket = Ticket.objects.create(
+            numero_factura='F-VISTA-1', asunto='Asunto', descripcion='Descripción',
+            categoria=Categoria.objects.create(nombre='Categoría vista'), cliente=cls.cliente,
+        )
+
+    def setUp(self):
+        self.url = reverse('tickets:cambiar_estado', args=[self.ticket.id])
+
+    async def test_cambia_el_estado_y_deja_comentario(self):
+        await self.async_client.aforce_login(self.admin)
+
+        respuesta = await self.async_client.post(self.url, {'estado': 'en_revision', 'motivo': 'Revisión'})
+
+        self.assertRedirects(
+            respuesta, reverse('tickets:detalle_ticket', args=[self.ticket.id]), fetch_redirect_response=False,
+        )
+        ticket = await Ticket.objects.aget(id=self.ticket.id)
+        self.assertEqual(ticket.estado, 'en_revision')
+        self.assertEqual(ticket.num_comentarios, 1)
+        self.assertTrue(await Comentario.objects.filter(ticket=ticket, texto__contains='Motivo: Revisión').aexists())
+
+    async def test_estado_invalido_no_cambia_nada(self):
+        await self.async_client.aforce_login(self.admin)
+
+        await self.async_client.post(self.url, {'estado': 'inventado'})
+
+        self.assertEqual((await Ticket.objects.aget(id=self.ticket.id)).estado, 'abierto')
+
+    async def test_cliente_no_puede_cambiar_el_estado(self):
+        await self.async_client.aforce_login(self.cliente)
+
+        await self.async_client.post(self.url, {'estado': 'cerrado'})
+
+        self.assertEqual((await Ticket.objects.aget(id=self.ticket.id)).estado, 'abierto')
+
+
+class CierreAutomaticoTest(TestCase):
+    """El cierre programado solo toca los tickets inactivos y lo hace por lotes"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.cliente = User.objects.create_user('cliente_cierre', password='x', rol='cliente')
+        cls.admin = User.objects.create_user('admin_cierre', password='x', rol='superadmin')
+        cls.categoria = Categoria.objects.create(nombre='Categoría cierre')
+
+    def crear_ticket(self, numero, estado, dias):
+        """Ticket en `estado` sin cambios desde hace `dias` días"""
+        ticket = Ticket.objects.create(
+            numero_factura=f'F-CIERRE-{numero}', asunto='Asunto', descripcion='Descripción',
+            categoria=self.categoria, cliente=self.cliente,
+        )
+        hace = timezone.now() - timedelta(days=dias)
+        Ticket.objects.filter(id=ticket.id).update(
+            estado=estado, created_at=hace - timedelta(days=1), updated_at=hace,
+            fecha_resolucion=hace if estado == 'resuelto' else None,
+        )
+        return ticket
+
+    def ids(self, tickets):
+        return set(tickets.values_list('id', flat=True))
+
+    def test_selecciona_solo_los_tickets_inactivos(self):
+        resuelto_viejo = self.crear_ticket(1, 'resuelto', 10)
+        self.crear_ticket(2, 'resuelto', 2)
+        espera_vieja = self.crear_ticket(3, 'en_espera_cliente', 20)
+        respondido = self.crear_ticket(4, 'en_espera_cliente', 20)
+        self.crear_ticket(5, 'abierto', 30)
+        Comentario.objects.create(ticket=respondido, autor=self.cliente, texto='Sigo esperando')
+        Ticket.objects.filter(id=respondido.id).update(updated_at=timezone.now() - timedelta(days=20))
+
+        self.assertEqual(self.ids(CierreAutomaticoService.tickets_resueltos_vencidos(7)), {resuelto_viejo.id})
+        self.assertEqual(self.ids(CierreAutomaticoService.tickets_en_espera_vencidos(15)), {espera_vieja.id})
+
+    def test_comando_cierra_y_es_idempotente(self):
+        vencidos = [self.crear_ticket(numero, 'resuelto', 10) for numero in range(3)]
+        reciente = self.crear_ticket(9, 'resuelto', 1)
+
+        salida = StringIO()
+        call_command('cerrar_tickets_inactivos', stdout=salida)
+        call_command('cerrar_tickets_inactivos', stdout=salida)
+
+        self.assertIn('✓ Tickets resueltos cerrados: 3', salida.getvalue())
+        self.assertIn('✓ Tickets resueltos cerrados: 0', salida.getvalue())
+        self.assertEqual(self.ids(Ticket.objects.filter(estado='cerrado')), {ticket.id for ticket in vencidos})
+        self.assertEqual(Ticket.objects.get(id=reciente.id).estado, 'resuelto')
+
+    def test_consultas_no_dependen_de_la_cantidad(self):
+        def cerrar(cantidad, inicio):
+            for numero in range(inicio, inicio + cantidad):
+                self.crear_ticket(numero, 'resuelto', 10)
+            with CaptureQueriesContext(connection) as consultas:
+                cerrados, _ = CierreAutomaticoService.cerrar(
+                    CierreAutomaticoService.tickets_resueltos_vencidos(7), self.admin, 'Cierre automático',
+                )
+            self.assertEqual(cerrados, cantidad)
+            return len(consultas)
+
+        self.assertEqual(cerrar(2, 0), cerrar(8, 10))
+
+
+class MonitorSLATest(TestCase):
+    """El monitor de SLA escala cada incumplimiento una sola vez"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.cliente = User.objects.create_user('cliente_sla', password='x', rol='cliente')
+        cls.agente = User.objects.create_user('agente_sla', password='x', rol='soporte')
+        cls.categoria = Categoria.objects.create(nombre='Categoría SLA')
+
+    def crear_ticket(self, numero, vencido=True):
+        ticket = Ticket.objects.create(
+            numero_factura=f'F-SLA-{numero}', asunto='Asunto', descripcion='Descripción',
+            categoria=self.categoria, cliente=self.cliente,
+        )
+        if vencido:
+            Ticket.objects.filter(id=ticket.id).update(fecha_limite_respuesta=timezone.now() - timedelta(hours=1))
+        return ticket
+
+    def test_escala_y_reasigna_una_sola_vez(self):
+        vencido = self.crear_ticket(1)
+        a_tiempo = self.crear_ticket(2, vencido=False)
+
+        escalados, reasignados = MonitorSLAService.escalar()
+
+        self.assertEqual([ticket.id for ticket in escalados], [vencido.id])
+        self.assertEqual(reasignados, 1)
+        vencido.refresh_from_db()
+        self.assertTrue(vencido.sla_incumplido)
+        self.assertEqual(vencido.prioridad, 'alta')
+        self.assertEqual(vencido.agente_id, self.agente.id)
+        self.assertGreater(vencido.fecha_limite_respuesta, timezone.now())
+        self.assertFalse(Ticket.objects.get(id=a_tiempo.id).sla_incumplido)
+
+        self.assertEqual(MonitorSLAService.escalar(), ([], 0))
+        self.assertEqual(Evento.objects.filter(ticket_id=vencido.id, tipo='sla_incumplido').count(), 1)
+
+    def test_sin_reasignar_conserva_el_agente(self):
+        ticket = self.crear_ticket(1)
+
+        salida = StringIO()
+        call_command('monitor_sla', '--sin-reasignar', stdout=salida)
+        call_command('monitor_sla', stdout=salida)
+
+        self.assertIn('⟳ Tickets escalados: 1 (reasignados: 0)', salida.getvalue())
+        self.assertIn('✓ Sin incumplimientos nuevos de SLA', salida.getvalue())
+        self.assertIsNone(Ticket.objects.get(id=ticket.id).agente_id)
+
+    def test_consultas_no_dependen_de_la_cantidad(self):
+        def escalar(cantidad, inicio):
+            for numero in range(inicio, inicio + cantidad):
+                self.crear_ticket(numero)
+            with CaptureQueriesContext(connection) as consultas:
+                escalados, _ = MonitorSLAService.escalar(reasignar=False)
+            self.assertEqual(len(escalados), cantidad)
+            return len(consultas)
+
+        self.assertEqual(escalar(2, 0), escalar(8, 10))
+
+
+class ValidadorGarantiaTest(TestCase):
+    """Las vigencias de garantía se recalculan con UPDATE masivos"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.cliente = User.objects.create_user('cliente_garantia', password='x', rol='cliente')
+        cls.categoria = Categoria.objects.create(nombre='Categoría garantía', dias_garantia_defecto=365)
+        cls.compra = timezone.now().date() - timedelta(days=200)
+        cls.abiertos = [cls.crear_ticket(numero) for numero in range(3)]
+        cls.cerrado = cls.crear_ticket(9)
+        Ticket.objects.filter(id=cls.cerrado.id).update(estado='cerrado')
+
+    @classmethod
+    def crear_ticket(cls, numero):
+        return Ticket.objects.create(
+            numero_factura=f'F-GARANTIA-{numero}', asunto='Asunto', descripcion='Descripción',
+            categoria=cls.categoria, cliente=cls.cliente, fecha_compra=cls.compra,
+        )
+
+    def test_cambio_de_dias_recalcula_la_categoria_en_un_update(self):
+        categoria = Categoria.objects.get(id=self.categoria.id)
+        categoria.dias_garantia_defecto = 100
+
+        with self.assertNumQueries(2):
+            categoria.save()
+
+        for ticket in Ticket.objects.filter(id__in=[ticket.id for ticket in self.abiertos]):
+            self.assertFalse(ticket.garantia_vigente)
+            self.assertEqual(ticket.fecha_vencimiento_garantia, self.compra + timedelta(days=100))
+        cerrado = Ticket.objects.get(id=self.cerrado.id)
+        self.assertTrue(cerrado.garantia_vigente)
+        self.assertEqual(cerrado.fecha_vencimiento_garantia, self.compra + timedelta(days=365))
+
+    def test_otros_cambios_de_categoria_no_tocan_los_tickets(self):
+        categoria = Categoria.objects.get(id=self.categoria.id)
+        categoria.nombre = 'Categoría renombrada'
+
+        with self.assertNumQueries(1):
+            categoria.save()
+
+    def test_validar_sin_cambios_no_escribe(self):
+        ticket = Ticket.objects.select_related('categoria').get(id=self.abiertos[0].id)
+
+        with self.assertNumQueries(0):
+            vigente, _ = ValidadorGarantia.validar_garantia(ticket)
+
+        self.assertTrue(vigente)
+
+    def test_cambio_de_dia_vence_las_garantias(self):
+        salida = StringIO()
+        call_command('recalcular_garantias', stdout=salida)
+        self.assertIn('✓ Garantías vencidas: 0', salida.getvalue())
+
+        vencidas, reactivadas = ValidadorGarantia.recalcular_vigencias(hoy=self.compra + timedelta(days=366))
+
+        self.assertEqual((vencidas, reactivadas), (len(self.abiertos), 0))
+        self.assertTrue(Ticket.objects.get(id=self.cerrado.id).garantia_vigente)
+
+
+class DetectorDuplicadosTest(TestCase):
+    """Los reclamos con una factura o serie ya reclamadas se marcan al crearse"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.cliente = User.objects.create_user('cliente_duplicado', password='x', rol='cliente')
+        cls.otro_cliente = User.objects.create_user('otro_duplicado', password='x', rol='cliente')
+        cls.categoria = Categoria.objects.create(nombre='Categoría duplicados')
+        cls.original = cls.crear_ticket(cls.cliente, 'FAC-2024/001')
+
+    @classmethod
+    def crear_ticket(cls, cliente, factura, serie=None):
+        return Ticket.objects.create(
+            numero_factura=factura, numero_serie=serie, asunto='Asunto', descripcion='Descripción',
+            categoria=cls.categoria, cliente=cliente,
+        )
+
+    def test_factura_repetida_con_otro_formato(self):
+        ticket = self.crear_ticket(self.otro_cliente, 'fac 2024 001')
+
+        self.assertTrue(ticket.posible_duplicado)
+        self.assertFalse(Ticket.objects.get(id=self.original.id).posible_duplicado)
+        evento = Evento.objects.get(ticket_id=ticket.id, tipo='posible_duplicado')
+        self.assertEqual(evento.datos_json['tickets'], [str(self.original.id)])
+        self.assertEqual(evento.datos_json['otros_clientes'], [str(self.cliente.id)])
+        self.assertEqual(list(DetectorDuplicados.coincidencias(ticket)), [self.original])
+
+    def test_misma_serie_con_otra_factura(self):
+        self.crear_ticket(self.cliente, 'FAC-SERIE-1', 'sn-0001')
+
+        ticket = self.crear_ticket(self.cliente, 'FAC-SERIE-2', 'SN 0001')
+
+        self.assertTrue(ticket.posible_duplicado)
+        self.assertTrue(Evento.objects.get(ticket_id=ticket.id, tipo='posible_duplicado').datos_json['coincide_serie'])
+
+    def test_factura_con_varios_productos_no_es_duplicado(self):
+        self.crear_ticket(self.cliente, 'FAC-VARIOS', 'SN-A')
+
+        ticket = self.crear_ticket(self.cliente, 'FAC-VARIOS', 'SN-B')
+
+        self.assertFalse(ticket.posible_duplicado)
+        self.assertFalse(Evento.objects.filter(ticket_id=ticket.id, tipo='posible_duplicado').exists())
+
+    def test_ignora_los_reclamos_rechazados(self):
+        Ticket.objects.filter(id=self.original.id).update(estado='rechazado')
+
+        self.assertFalse(self.crear_ticket(self.otro_cliente, 'FAC-2024-001').posible_duplicado)
+
+    def test_busqueda_en_una_consulta(self):
+        ticket = Ticket(numero_factura='FAC2024001', factura_normalizada='FAC2024001', cliente=self.otro_cliente)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(len(DetectorDuplicados.buscar(ticket)), 1)
+
+
+class ContadoresTicketTest(TestCase):
+    """Contadores desnormalizados de comentarios y su reparación por lotes"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.cliente = User.objects.create_user('cliente_contadores', password='x', rol='cliente')
+        cls.categoria = Categoria.objects.create(nombre='Categoría contadores')
+
+    def crear_ticket(self, numero):
+        return Ticket.objects.create(
+            numero_factura=f'F-CONTADOR-{numero}', asunto='Asunto', descripcion='Descripción',
+            categoria=self.categoria, cliente=self.cliente,
+        )
+
+    def contadores(self, ticket):
+        ticket.refresh_from_db()
+        return ticket.num_comentarios, ticket.num_comentarios_publicos
+
+    def test_altas_bajas_y_cambios_de_visibilidad(self):
+        ticket = self.crear_ticket(1)
+        publico = Comentario.objects.create(ticket=ticket, autor=self.cliente, texto='Público')
+        privado = Comentario.objects.create(ticket=ticket, autor=self.cliente, texto='Privado', visibilidad='privado')
+        self.assertEqual(self.contadores(ticket), (2, 1))
+
+        privado.visibilidad = 'publico'
+        privado.save()
+        self.assertEqual(self.contadores(ticket), (2, 2))
+
+        publico.delete()
+        self.assertEqual(self.contadores(ticket), (1, 1))
+
+    def test_reparar_corrige_solo_los_desfasados(self):
+        ticket = self.crear_ticket(1)
+        self.crear_ticket(2)
+        Comentario.objects.create(ticket=ticket, autor=self.cliente, texto='Hola')
+        Ticket.objects.filter(id=ticket.id).update(num_comentarios=7, num_comentarios_publicos=0)
+
+        self.assertEqual(ContadoresTicketService.reparar(dry_run=True), (2, 1))
+        self.assertEqual(self.contadores(ticket), (7, 0))
+
+        self.assertEqual(ContadoresTicketService.reparar(lote=1), (2, 1))
+        self.assertEqual(self.contadores(ticket), (1, 1))
+
+        salida = StringIO()
+        call_command('reparar_contadores', stdout=salida)
+        self.assertIn('✓ Todos los contadores están al día', salida.getvalue())
+
+    def test_consultas_por_lote_no_por_ticket(self):
+        def reparar(cantidad, inicio):
+            tickets = [self.crear_ticket(numero) for numero in range(inicio, inicio + cantidad)]
+            Ticket.objects.filter(id__in=[ticket.id for ticket in tickets]).update(num_comentarios=3)
+            with CaptureQueriesContext(connection) as consultas:
+                _, corregidos = ContadoresTicketService.reparar()
+            self.assertEqual(corregidos, cantidad)
+            return len(consultas)
+
+        self.assertEqual(reparar(2, 0), reparar(8, 10))
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class DashboardCacheTest(TestCase):
+    """Los indicadores se sirven de la caché y solo se invalidan los de los usuarios afectados"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.cliente = User.objects.create_user('cliente_panel', password='x', rol='cliente')
+        cls.otro_cliente = User.objects.create_user('otro_panel', password='x', rol='cliente')
+        cls.categoria = Categoria.objects.create(nombre='Categoría panel')
+
+    def setUp(self):
+        cache.clear()
+
+    def crear_ticket(self, cliente, numero):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Ticket.objects.create(
+                numero_factura=f'F-PANEL-{numero}', asunto='Asunto', descripcion='Descripción',
+                categoria=self.categoria, cliente=cliente,
+            )
+
+    def test_segunda_lectura_sin_consultas(self):
+        self.assertEqual(DashboardService.indicadores(self.cliente)['total_tickets'], 0)
+
+        with self.assertNumQueries(0):
+            DashboardService.indicadores(self.cliente)
+
+    def test_un_ticket_nuevo_invalida_solo_a_su_cliente(self):
+        DashboardService.indicadores(self.cliente)
+        DashboardService.indicadores(self.otro_cliente)
+
+        self.crear_ticket(self.cliente, 1)
+
+        self.assertEqual(DashboardService.indicadores(self.cliente)['total_tickets'], 1)
+        with self.assertNumQueries(0):
+            DashboardService.indicadores(self.otro_cliente)
+
+    def test_cambios_sin_efecto_en_los_indicadores_no_invalidan(self):
+        ticket = self.crear_ticket(self.cliente, 1)
+        DashboardService.indicadores(self.cliente)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Comentario.objects.create(ticket=ticket, autor=self.cliente, texto='Hola')
+            self.client.force_login(self.cliente)
+
+        with self.assertNumQueries(0):
+            DashboardService.indicadores(self.cliente)
+
+
+class GuardadoTicketTest(TestCase):
+    """save() solo escribe las columnas modificadas y sus derivados"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.cliente = User.objects.create_user('cliente_guardado', password='x', rol='cliente')
+        cls.admin = User.objects.create_user('admin_guardado', password='x', rol='superadmin')
+        cls.ticket_id = Ticket.objects.create(
+            numero_factura='F-GUARDADO-1', asunto='Asunto', descripcion='Descripción',
+            categoria=Categoria.objects.create(nombre='Categoría guardado'), cliente=cls.cliente,
+        ).id
+
+    def setUp(self):
+        self.ticket = Ticket.objects.get(id=self.ticket_id)
+
+    def updates(self, consultas):
+        return [consulta['sql'] for consulta in consultas if consulta['sql'].startswith('UPDATE')]
+
+    def test_sin_cambios_no_consulta(self):
+        with self.assertNumQueries(0):
+            self.ticket.save()
+
+    def test_un_campo_escribe_solo_ese_campo(self):
+        self.ticket.asunto = 'Otro asunto'
+        with CaptureQueriesContext(connection) as consultas:
+            self.ticket.save()
+        self.assertEqual(len(consultas), 1)
+        self.assertNotIn('"descripcion"', consultas[0]['sql'])
+        self.assertIn('"asunto"', consultas[0]['sql'])
+
+    def test_cambio_de_origen_escribe_el_derivado(self):
+        self.ticket.prioridad = 'critica'
+        with CaptureQueriesContext(connection) as consultas:
+            self.ticket.save()
+        self.assertEqual(len(consultas), 1)
+        self.assertIn('"fecha_limite_respuesta"', consultas[0]['sql'])
+
+    def test_update_fields_explicito_incluye_derivados(self):
+        limite = self.ticket.fecha_limite_respuesta
+        self.ticket.prioridad = 'critica'
+        self.ticket.save(update_fields=['prioridad'])
+
+        self.assertNotEqual(Ticket.objects.get(id=self.ticket_id).fecha_limite_respuesta, limite)
+
+    def test_resolver_escribe_el_ticket_una_vez(self):
+        with CaptureQueriesContext(connection) as consultas:
+            CambioEstadoService.resolver(self.ticket, 'Solucionado', self.admin)
+        self.assertEqual(len([sql for sql in self.updates(consultas) if 'tickets_ticket' in sql]), 1)
+
+        ticket = Ticket.objects.get(id=self.ticket_id)
+        self.assertEqual(ticket.estado, 'resuelto')
+        self.assertEqual((ticket.num_comentarios, ticket.num_comentarios_publicos), (1, 1))
+        self.assertEqual(self.ticket.num_comentarios, 1)
+        self.assertIsNotNone(ticket.fecha_primera_respuesta)
+
+
+class DatosSinteticosTest(TestCase):
+    """La generación masiva conserva la historia y no comparte borrados de archivos"""
+
+    def setUp(self):
+        directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directorio, ignore_errors=True)
+        ajustes = override_settings(MEDIA_ROOT=directorio)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+    def generar(self):
+        generador = GeneradorDatosSinteticos(semilla=1, fraccion_adjuntos=1.0)
+        return generador.generar(tickets=30, clientes=5, agentes=2, tecnicos=1)
+
+    def test_respeta_las_fechas_historicas(self):
+        totales = self.generar()
+
+        self.assertEqual(Ticket.objects.count(), totales['tickets'])
+        self.assertEqual(Comentario.objects.count(), totales['comentarios'])
+        # auto_now_add no pisa las fechas generadas
+        self.assertTrue(Ticket.objects.filter(created_at__lt=timezone.now() - timedelta(days=2)).exists())
+
+    def test_borrar_un_adjunto_conserva_el_archivo_compartido(self):
+        self.generar()
+        adjunto = Adjunto.objects.first()
+        ruta = adjunto.archivo.path
+        self.assertTrue(adjunto.tiene_archivo_compartido())
+
+        adjunto.delete()
+
+        self.assertTrue(os.path.exists(ruta))
+        # La reconciliación no los da por perdidos (están fuera de sus directorios)
+        self.assertEqual(list(ReconciliacionAlmacenamientoService.recorrer_registros()), [])
+
+
+class MedirRendimientoTest(SimpleTestCase):
+    """Ejecución mínima del benchmark y formato de su informe JSON"""
+
+    def test_informe_con_todos_los_escenarios(self):
+        directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directorio, ignore_errors=True)
+        salida = os.path.join(directorio, 'informe.json')
+
+        # En otro proceso: el comando crea y destruye su propia base de datos de pruebas
+        proceso = subprocess.run(
+            [
+                sys.executable, 'manage.py', 'medir_rendimiento', '--tickets', '20', '--clientes', '3',
+                '--agentes', '2', '--tecnicos', '1', '--repeticiones', '2', '--calentamiento', '0',
+                '--salida', salida,
+            ],
+            cwd=settings.BASE_DIR, capture_output=True, text=True, timeout=300,
+        )
+        self.assertEqual(proceso.returncode, 0, proceso.stderr)
+
+        with open(salida, encoding='utf-8') as archivo:
+            informe = json.load(archivo)
+        self.assertEqual(informe['datos']['tickets'], 20)
+        for nombre, medida in informe['escenarios'].items():
+            self.assertNotIn('error', medida, nombre)
+            self.assertLessEqual(medida['p50_ms'], medida['p95_ms'])
+            self.assertIsInstance(medida['consultas'], int)
+        self.assertGreater(informe['escenarios']['listar_tickets']['consultas'], 0)
 
-# Create your tests here.
\ No newline at end of file
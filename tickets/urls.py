@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import api, views
 
 app_name = "tickets"
 
@@ -10,6 +10,15 @@ urlpatterns = [
       
     # Lista de tickets sin asignar  
     path("sin-asignar/", views.tickets_sin_asignar, name="tickets_sin_asignar"),  
+
+    # API JSON de solo lectura (antes de la ruta genérica <str:ticket_id>)
+    path("api/tickets/", api.api_tickets, name="api_tickets"),
+    path("api/tickets/<uuid:ticket_id>/comentarios/", api.api_comentarios, name="api_comentarios"),
+    path("api/tickets/<uuid:ticket_id>/adjuntos/", api.api_adjuntos, name="api_adjuntos"),
+    path("api/tickets/estado/", api.api_cambiar_estado_masivo, name="api_cambiar_estado_masivo"),
+
+    # Cambio de estado masivo desde el listado
+    path("estado/masivo/", views.cambiar_estado_masivo, name="cambiar_estado_masivo"),
   
     path("<str:ticket_id>/", views.detalle_ticket, name="detalle_ticket"),  
     path("<str:ticket_id>/comentarios/agregar/", views.agregar_comentario, name="agregar_comentario"),  
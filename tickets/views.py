@@ -1,16 +1,48 @@
-from django.shortcuts import render, redirect, get_object_or_404
+from asgiref.sync import sync_to_async
+from django.shortcuts import render, redirect, get_object_or_404, aget_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import HttpResponseForbidden, JsonResponse
+from django.http import HttpResponseForbidden, JsonResponse, QueryDict
+from django.urls import reverse
 from django.core.paginator import Paginator
 from django.db.models import Q, Count
 from django.utils import timezone
 from django.core.exceptions import ValidationError
 
-from .models import Ticket, Categoria, Comentario
+from .models import Ticket, Categoria, Comentario, filtro_identificador, orden_listado
 from .forms import TicketForm, ComentarioForm, AsignarTicketForm
 from attachments.models import Adjunto
 from attachments.forms import AdjuntoMultipleForm
+from attachments.services import IngestaAdjuntosService
+from .services import CambioEstadoService, CambioEstadoMasivoService, DetectorDuplicados
+
+
+def _filtrar_tickets(tickets, parametros):
+    """Aplica los filtros del listado (búsqueda, estado, prioridad, categoría)"""
+    busqueda = parametros.get('busqueda', '').strip()
+    estado_filtro = parametros.get('estado', '').strip()
+    prioridad_filtro = parametros.get('prioridad', '').strip()
+    categoria_filtro = parametros.get('categoria', '').strip()
+
+    if busqueda:
+        # Factura y serie por prefijo sobre las columnas normalizadas (usa el índice)
+        tickets = tickets.filter(
+            filtro_identificador('factura_normalizada', busqueda, prefijo=True) |
+            filtro_identificador('serie_normalizada', busqueda, prefijo=True) |
+            Q(asunto__icontains=busqueda) |
+            Q(descripcion__icontains=busqueda)
+        )
+
+    if estado_filtro:
+        tickets = tickets.filter(estado=estado_filtro)
+
+    if prioridad_filtro:
+        tickets = tickets.filter(prioridad=prioridad_filtro)
+
+    if categoria_filtro:
+        tickets = tickets.filter(categoria_id=categoria_filtro)
+
+    return tickets
 
 
 @login_required
@@ -23,36 +55,20 @@ def listar_tickets(request):
     usuario = request.user
 
     # Filtros base según el rol
-    if usuario.es_cliente():
-        tickets = Ticket.objects.filter(cliente=usuario)
-    elif usuario.es_empleado():
-        tickets = Ticket.objects.filter(Q(agente=usuario) | Q(agente__isnull=True))
-    else:  # superadmin
-        tickets = Ticket.objects.all()
+    tickets = Ticket.objects.visibles_para(usuario)
 
     # Filtros GET
     busqueda = request.GET.get('busqueda', '').strip()
     estado_filtro = request.GET.get('estado', '').strip()
     prioridad_filtro = request.GET.get('prioridad', '').strip()
     categoria_filtro = request.GET.get('categoria', '').strip()
+    orden = request.GET.get('orden', '').strip()
+    if orden not in dict(Ticket.ORDENES_LISTADO):
+        orden = 'reciente'
 
-    if busqueda:
-        tickets = tickets.filter(
-            Q(numero_factura__icontains=busqueda) |
-            Q(asunto__icontains=busqueda) |
-            Q(descripcion__icontains=busqueda)
-        )
+    tickets = _filtrar_tickets(tickets, request.GET)
 
-    if estado_filtro:
-        tickets = tickets.filter(estado=estado_filtro)
-
-    if prioridad_filtro:
-        tickets = tickets.filter(prioridad=prioridad_filtro)
-
-    if categoria_filtro:
-        tickets = tickets.filter(categoria_id=categoria_filtro)
-
-    tickets = tickets.select_related("cliente", "agente", "categoria").order_by('-created_at')
+    tickets = tickets.select_related("cliente", "agente", "categoria").order_by(*orden_listado(orden))
 
     # Paginación
     paginator = Paginator(tickets, 15)
@@ -65,9 +81,12 @@ def listar_tickets(request):
         'estado_filtro': estado_filtro,
         'prioridad_filtro': prioridad_filtro,
         'categoria_filtro': categoria_filtro,
+        'orden': orden,
+        'ordenes': Ticket.ORDENES_LISTADO,
         'estados': getattr(Ticket, 'ESTADOS', ()),
         'prioridades': getattr(Ticket, 'PRIORIDADES', ()),
         'categorias': Categoria.objects.activas() if hasattr(Categoria.objects, "activas") else Categoria.objects.all(),
+        'filtros_actuales': request.GET.urlencode(),
     }
     return render(request, 'tickets/listar_tickets.html', context)
 
@@ -96,32 +115,26 @@ def crear_ticket(request):
 
                 # Adjuntos múltiples (campo input name="archivos" en el form)
                 archivos = request.FILES.getlist('archivos')
-                archivos_guardados = 0
                 logger.info(f"Archivos recibidos: {len(archivos)}")
 
-                for archivo in archivos:
-                    try:
-                        if not archivo or not hasattr(archivo, 'name'):
-                            logger.warning("Archivo vacío o inválido ignorado")
-                            continue
-
-                        adjunto = Adjunto(
-                            objeto_id=str(ticket.id),  # asegurar string si tu modelo Adjunto lo espera
-                            tipo_objeto='ticket',
-                            archivo=archivo,
-                            nombre_original=archivo.name,
-                            subido_por=request.user,
-                            es_publico=True
-                        )
-                        adjunto.save()
-                        archivos_guardados += 1
-                        logger.info(f"Adjunto guardado: {adjunto.nombre_original}")
-                    except ValidationError as e:
-                        logger.error(f"Validación adjunto {archivo.name}: {e}")
-                        messages.warning(request, f"Archivo {archivo.name} no válido: {e}")
-                    except Exception as e:
-                        logger.exception(f"Error al guardar archivo {getattr(archivo, 'name', '(sin nombre)')}")
-                        messages.warning(request, f"No se pudo guardar el archivo {getattr(archivo, 'name', '(sin nombre)')}: {e}")
+                try:
+                    adjuntos, errores = IngestaAdjuntosService.ingerir(
+                        archivos,
+                        tipo_objeto='ticket',
+                        objeto_id=ticket.id,
+                        ticket_id=ticket.id,
+                        usuario=request.user,
+                        es_publico=True,
+                    )
+                except Exception as e:
+                    logger.exception("Error al guardar los archivos adjuntos")
+                    messages.warning(request, f"No se pudieron guardar los archivos adjuntos: {e}")
+                    adjuntos, errores = [], []
+                archivos_guardados = len(adjuntos)
+
+                for nombre, error in errores:
+                    logger.error(f"Validación adjunto {nombre}: {error}")
+                    messages.warning(request, f"Archivo {nombre} no válido: {error}")
 
                 if archivos_guardados > 0:
                     messages.success(request, f'Ticket creado exitosamente con {archivos_guardados} archivo(s) adjunto(s).')
@@ -172,10 +185,12 @@ def detalle_ticket(request, ticket_id):
     context = {  
         'ticket': ticket,  
         'comentarios': comentarios,  
+        'total_comentarios': ticket.num_comentarios_publicos if request.user.es_cliente() else ticket.num_comentarios,
         'adjuntos': adjuntos,  
         'comentario_form': comentario_form,  
         'adjunto_form': adjunto_form,  
         'asignar_form': asignar_form,  
+        'duplicados': DetectorDuplicados.coincidencias(ticket) if ticket.posible_duplicado and request.user.puede_gestionar_tickets() else None,
         'puede_editar': ticket.puede_ser_editado_por(request.user),  
     }  
     return render(request, 'tickets/detalle_ticket.html', context)  
@@ -209,14 +224,15 @@ def agregar_comentario(request, ticket_id):
               
             # Procesar archivos adjuntos si existen  
             archivos = request.FILES.getlist('archivos')  
-            for archivo in archivos:  
-                Adjunto.objects.create(  
-                    archivo=archivo,  
-                    nombre_original=archivo.name,  
-                    tipo_objeto='comentario',  
-                    objeto_id=str(comentario.id),  
-                    subido_por=request.user  
-                )  
+            _, errores = IngestaAdjuntosService.ingerir(  
+                archivos,  
+                tipo_objeto='comentario',  
+                objeto_id=comentario.id,  
+                ticket_id=ticket.id,  
+                usuario=request.user  
+            )  
+            for nombre, error in errores:  
+                messages.warning(request, f"Archivo {nombre} no válido: {error}")  
               
             messages.success(request, "Comentario agregado exitosamente.")  
             return redirect('tickets:detalle_ticket', ticket_id=ticket_id)  
@@ -240,69 +256,98 @@ def agregar_adjuntos(request, ticket_id):
     if request.method == 'POST':  
         archivos = request.FILES.getlist('archivos')  
         if archivos:  
-            for archivo in archivos:  
-                Adjunto.objects.create(  
-                    archivo=archivo,  
-                    nombre_original=archivo.name,  
-                    tipo_objeto='ticket',  
-                    objeto_id=str(ticket.id),  
-                    subido_por=request.user  
-                )  
-            messages.success(request, f"{len(archivos)} archivo(s) agregado(s) exitosamente.")  
-        else:  
-            messages.warning(request, "No se seleccionaron archivos.")  
-      
-    return redirect('tickets:detalle_ticket', ticket_id=ticket_id)  
-  
-  
-@login_required  
-def cambiar_estado(request, ticket_id):  
-    """  
-    Cambiar el estado del ticket.  
-    """  
-    ticket = get_object_or_404(Ticket, id=ticket_id)  
-      
-    if not request.user.puede_gestionar_tickets():  
-        messages.error(request, "No tienes permisos para cambiar el estado del ticket.")  
-        return redirect('tickets:detalle_ticket', ticket_id=ticket_id)  
-      
-    if request.method == 'POST':  
-        nuevo_estado = request.POST.get('estado')  
-        motivo = request.POST.get('motivo', '')  
-          
-        if nuevo_estado in dict(Ticket.ESTADOS):  
-            estado_anterior = ticket.get_estado_display()  
-            ticket.estado = nuevo_estado  
-              
-            # Actualizar fechas según el estado  
-            if nuevo_estado == 'resuelto' and not ticket.fecha_resolucion:  
-                ticket.fecha_resolucion = timezone.now()  
-            elif nuevo_estado == 'cerrado' and not ticket.closed_at:  
-                ticket.closed_at = timezone.now()  
-            elif nuevo_estado == 'rechazado':  
-                ticket.motivo_rechazo = motivo  
-              
-            ticket.save()  
-              
-            # Crear comentario automático del cambio de estado  
-            texto_comentario = f"Estado cambiado de '{estado_anterior}' a '{ticket.get_estado_display()}'"  
-            if motivo:  
-                texto_comentario += f"\n\nMotivo: {motivo}"  
-              
-            Comentario.objects.create(  
-                ticket=ticket,  
-                autor=request.user,  
-                texto=texto_comentario,  
-                visibilidad='publico'  
+            adjuntos, errores = IngestaAdjuntosService.ingerir(  
+                archivos,  
+                tipo_objeto='ticket',  
+                objeto_id=ticket.id,  
+                ticket_id=ticket.id,  
+                usuario=request.user  
             )  
-              
-            messages.success(request, f"Estado actualizado a '{ticket.get_estado_display()}'.")  
+            for nombre, error in errores:  
+                messages.warning(request, f"Archivo {nombre} no válido: {error}")  
+            if adjuntos:  
+                messages.success(request, f"{len(adjuntos)} archivo(s) agregado(s) exitosamente.")  
         else:  
-            messages.error(request, "Estado inválido.")  
+            messages.warning(request, "No se seleccionaron archivos.")  
       
     return redirect('tickets:detalle_ticket', ticket_id=ticket_id)  
   
   
+@login_required
+async def cambiar_estado(request, ticket_id):
+    """
+    Cambiar el estado del ticket.
+    Asíncrona: el correo de notificación se envía en segundo plano.
+    """
+    usuario = await request.auser()
+    ticket = await aget_object_or_404(Ticket, id=ticket_id)
+
+    if not usuario.puede_gestionar_tickets():
+        messages.error(request, "No tienes permisos para cambiar el estado del ticket.")
+        return redirect('tickets:detalle_ticket', ticket_id=ticket_id)
+
+    if request.method == 'POST':
+        nuevo_estado = request.POST.get('estado')
+        motivo = request.POST.get('motivo', '')
+
+        if nuevo_estado in dict(Ticket.ESTADOS):
+            await sync_to_async(CambioEstadoService.cambiar_estado)(ticket, nuevo_estado, usuario, motivo)
+            messages.success(request, f"Estado actualizado a '{ticket.get_estado_display()}'.")
+        else:
+            messages.error(request, "Estado inválido.")
+
+    return redirect('tickets:detalle_ticket', ticket_id=ticket_id)
+
+
+@login_required
+async def cambiar_estado_masivo(request):
+    """
+    Cambiar el estado de varios tickets en una sola petición.
+    Recibe los tickets marcados o, con seleccion=filtro, todos los que
+    coinciden con los filtros del listado.
+    """
+    usuario = await request.auser()
+    destino = reverse('tickets:listar_tickets')
+    filtros = request.POST.get('filtros', '')
+    if filtros:
+        destino = f"{destino}?{filtros}"
+
+    if request.method != 'POST':
+        return redirect(destino)
+
+    if not usuario.puede_gestionar_tickets():
+        messages.error(request, "No tienes permisos para cambiar el estado de los tickets.")
+        return redirect(destino)
+
+    nuevo_estado = request.POST.get('estado')
+    motivo = request.POST.get('motivo', '')
+
+    if request.POST.get('seleccion') == 'filtro':
+        tickets = _filtrar_tickets(Ticket.objects.visibles_para(usuario), QueryDict(filtros))
+        ticket_ids = [ticket_id async for ticket_id in tickets.values_list('id', flat=True)]
+    else:
+        ticket_ids = request.POST.getlist('tickets')
+
+    if not ticket_ids:
+        messages.warning(request, "No se seleccionó ningún ticket.")
+        return redirect(destino)
+
+    try:
+        actualizados, rechazados = await sync_to_async(CambioEstadoMasivoService.cambiar_estados)(
+            ticket_ids, nuevo_estado, usuario, motivo
+        )
+    except ValueError as e:
+        messages.error(request, str(e))
+        return redirect(destino)
+
+    if actualizados:
+        messages.success(request, f"{len(actualizados)} ticket(s) actualizados.")
+    if rechazados:
+        messages.warning(request, f"{len(rechazados)} ticket(s) sin cambios: {rechazados[0][1]}.")
+
+    return redirect(destino)
+
+
 @login_required  
 def asignar_personal(request, ticket_id):  
     """  
@@ -335,38 +380,28 @@ def asignar_personal(request, ticket_id):
     return redirect('tickets:detalle_ticket', ticket_id=ticket_id)  
   
   
-@login_required  
-def resolver_ticket(request, ticket_id):  
-    """  
-    Marcar ticket como resuelto con descripción de resolución.  
-    """  
-    ticket = get_object_or_404(Ticket, id=ticket_id)  
-      
-    if not request.user.puede_gestionar_tickets():  
-        messages.error(request, "No tienes permisos para resolver tickets.")  
-        return redirect('tickets:detalle_ticket', ticket_id=ticket_id)  
-      
-    if request.method == 'POST':  
-        resolucion = request.POST.get('resolucion', '')  
-          
-        if resolucion:  
-            ticket.estado = 'resuelto'  
-            ticket.fecha_resolucion = timezone.now()  
-            ticket.save()  
-              
-            # Crear comentario con la resolución  
-            Comentario.objects.create(  
-                ticket=ticket,  
-                autor=request.user,  
-                texto=f"**TICKET RESUELTO**\n\n{resolucion}",  
-                visibilidad='publico',  
-                resuelve_ticket=True  
-            )  
-              
-            messages.success(request, "Ticket marcado como resuelto.")  
-        else:  
-            messages.error(request, "Debes proporcionar una descripción de la resolución.")  
-      
+@login_required
+async def resolver_ticket(request, ticket_id):
+    """
+    Marcar ticket como resuelto con descripción de resolución.
+    Asíncrona: el correo de notificación se envía en segundo plano.
+    """
+    usuario = await request.auser()
+    ticket = await aget_object_or_404(Ticket, id=ticket_id)
+
+    if not usuario.puede_gestionar_tickets():
+        messages.error(request, "No tienes permisos para resolver tickets.")
+        return redirect('tickets:detalle_ticket', ticket_id=ticket_id)
+
+    if request.method == 'POST':
+        resolucion = request.POST.get('resolucion', '')
+
+        if resolucion:
+            await sync_to_async(CambioEstadoService.resolver)(ticket, resolucion, usuario)
+            messages.success(request, "Ticket marcado como resuelto.")
+        else:
+            messages.error(request, "Debes proporcionar una descripción de la resolución.")
+
     return redirect('tickets:detalle_ticket', ticket_id=ticket_id)
 
 @login_required